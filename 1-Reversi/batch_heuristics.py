@@ -0,0 +1,122 @@
+import numpy as np
+
+from heuristics import ADJACENT_PENALTY
+from heuristics import CornerCaptivity
+
+
+# Directions in which discs can be flanked
+DIRECTIONS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)]
+
+
+def boards_to_array(boards, height=8, width=8):
+    """Converts a list of boards (`dict` or `BitBoard`) to an N x height x width array.
+
+    Black ('X') discs are stored as +1, White ('O') discs as -1 and empty squares as 0.
+    """
+    positions = np.zeros((len(boards), height, width), dtype=np.int8)
+    for i, board in enumerate(boards):
+        for (x, y), disc in board.items():
+            positions[i, x - 1, y - 1] = 1 if disc == 'X' else -1
+    return positions
+
+
+def bitboards_to_array(black, white, height=8, width=8):
+    """Converts packed bitboards (two arrays of up to 64-bit masks, see `bitboard.py`) to an N x 8 x 8 array."""
+    if height * width > 64:
+        raise ValueError("Packed bitboards only hold up to 64 squares")
+
+    def unpack(masks):
+        masks = np.asarray(masks, dtype=np.uint64).reshape(-1, 1)
+        bits = np.unpackbits(masks.astype('<u8').view(np.uint8), axis=1, bitorder='little')
+        return bits[:, :height * width].reshape(-1, height, width).astype(np.int8)
+
+    return unpack(black) - unpack(white)
+
+
+def as_array(positions, height=8, width=8):
+    """Returns the positions as an N x height x width array (arrays are returned unchanged)."""
+    if isinstance(positions, np.ndarray):
+        return positions
+    return boards_to_array(positions, height, width)
+
+
+def player_sign(player):
+    return 1 if player == 'X' else -1
+
+
+def shift(discs, dx, dy):
+    """Shifts N x height x width boolean arrays one square in direction (dx, dy), filling with False."""
+    _, height, width = discs.shape
+    shifted = np.zeros_like(discs)
+    shifted[:, max(dx, 0):height + min(dx, 0), max(dy, 0):width + min(dy, 0)] = \
+        discs[:, max(-dx, 0):height - max(dx, 0), max(-dy, 0):width - max(dy, 0)]
+    return shifted
+
+
+def valid_moves(positions, player):
+    """Returns an N x height x width boolean array of the squares where `player` can flank the opponent."""
+    sign = player_sign(player)
+    own = positions == sign
+    opponent = positions == -sign
+    empty = positions == 0
+    moves = np.zeros_like(own)
+    for dx, dy in DIRECTIONS:
+        flank = shift(own, dx, dy) & opponent
+        for _ in range(max(positions.shape[1:]) - 3):
+            flank |= shift(flank, dx, dy) & opponent
+        moves |= shift(flank, dx, dy) & empty
+    return moves
+
+
+def corner_captivity_scores(positions, player, height=8, width=8):
+    """Vectorized `CornerCaptivity.get_score`."""
+    positions = as_array(positions, height, width)
+    discs = positions.astype(np.float64) * player_sign(player)
+    total = np.zeros(len(positions))
+    for (cx, cy), adjacent_locs in CornerCaptivity(*positions.shape[1:]).corners.items():
+        in_corner = discs[:, cx - 1, cy - 1]
+        adjacent = sum(discs[:, x - 1, y - 1] for (x, y) in adjacent_locs) * -ADJACENT_PENALTY
+        score = np.where(in_corner != 0, 100.0 * in_corner, adjacent) * 0.25
+        total += np.round(score)
+    return total
+
+
+def coin_parity_scores(positions, player, height=8, width=8):
+    """Vectorized `CoinParity.get_score` (0 for empty boards)."""
+    positions = as_array(positions, height, width)
+    discs = positions.reshape(len(positions), -1) * player_sign(player)
+    difference = discs.sum(axis=1, dtype=np.float64)
+    count = np.count_nonzero(discs, axis=1)
+    return np.divide(100 * difference, count, out=np.zeros(len(positions)), where=count != 0)
+
+
+def mobility_scores(positions, player, height=8, width=8):
+    """Vectorized `Mobility.get_score`."""
+    positions = as_array(positions, height, width)
+    opponent = 'O' if player == 'X' else 'X'
+    player_moves = valid_moves(positions, player).reshape(len(positions), -1).sum(axis=1)
+    opponent_moves = valid_moves(positions, opponent).reshape(len(positions), -1).sum(axis=1)
+    total = player_moves + opponent_moves
+    return np.divide(100.0 * (player_moves - opponent_moves), total,
+                     out=np.zeros(len(positions)), where=total != 0)
+
+
+def heuristic_scores(positions, player, height=8, width=8):
+    """Returns an N x 3 array of the corner captivity, mobility and coin parity scores."""
+    positions = as_array(positions, height, width)
+    return np.stack([corner_captivity_scores(positions, player),
+                     mobility_scores(positions, player),
+                     coin_parity_scores(positions, player)], axis=1)
+
+
+def utility_scores(positions, player, weights=(0.7, 0.2, 0.1), height=8, width=8):
+    """Vectorized `Reversi.compute_utility` (heuristic evaluation) for boards where `player` has just moved.
+
+    As in `compute_utility`, boards where the opponent has no valid move score
+    +100 if `player` is Black and -100 otherwise.
+    """
+    positions = as_array(positions, height, width)
+    opponent = 'O' if player == 'X' else 'X'
+    scores = heuristic_scores(positions, player) @ np.asarray(weights, dtype=np.float64)
+    opponent_moves = valid_moves(positions, opponent).reshape(len(positions), -1).any(axis=1)
+    return np.where(opponent_moves, scores, 100.0 if player == 'X' else -100.0)
@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from bitboard import as_bitboard
+from game import Reversi
+from heuristics import CoinParity
+from heuristics import CornerCaptivity
+from heuristics import Mobility
+from patterns import PatternEvaluator
+import search
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'benchmark_baseline.json')
+TOLERANCE = 0.2         # Largest accepted drop of relative throughput (fraction of the baseline)
+MIN_TIME = 0.02         # Seconds each round of a benchmark runs for at least
+ROUNDS = 20             # Rounds per benchmark
+MIN_ROUNDS = 5          # Rounds per benchmark when they take more than MAX_TIME seconds in all
+MAX_TIME = 2.0
+
+# Corpus: positions reached by random games (seeded) after these numbers of moves
+PHASES = {'opening': 6, 'midgame': 30, 'endgame': 52}
+POSITIONS_PER_PHASE = 8
+DIRECTIONS = ((0, 1), (1, 0), (1, -1), (1, 1))  # The directions scanned by `flank_opponent`
+
+
+def corpus(backend='dict', seed=2019):
+    """Returns {phase: [states]} of the fixed benchmark positions (Othello, 8 x 8)."""
+    game = Reversi(is_othello=True, opponent_difficulty=3, backend=backend)
+    rng = random.Random(seed)
+    positions = {}
+    for phase, plies in PHASES.items():
+        positions[phase] = []
+        while len(positions[phase]) < POSITIONS_PER_PHASE:
+            state = game.initial
+            for _ in range(plies):
+                if not state.moves:
+                    break
+                state = game.result(state, rng.choice(state.moves))
+            if state.moves:
+                positions[phase].append(state)
+    return positions
+
+
+def calibration():
+    """A fixed pure Python workload (no code of the game) that the benchmarks are timed against."""
+    squares = {}
+    for x in range(1, 9):
+        for y in range(1, 9):
+            squares[x, y] = (x * 7 + y * 13) % 5
+    total = 0
+    for (x, y), value in sorted(squares.items(), key=lambda item: item[1]):
+        if squares.get((x + 1, y)) == value:
+            total += x * y
+    return total
+
+
+def benchmarks():
+    """Returns {name: (function, operations per call)} of the benchmarks.
+
+    Each function runs the hot path once over the whole corpus (or one phase of it).
+    """
+    dict_game = Reversi(is_othello=True, opponent_difficulty=3, backend='dict')
+    bit_game = Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard')
+    packed_game = Reversi(is_othello=True, opponent_difficulty=3, backend='packed')
+    dict_positions = corpus('dict')
+    dict_states = [state for states in dict_positions.values() for state in states]
+    packed_positions = corpus('packed')
+    packed_states = [state for states in packed_positions.values() for state in states]
+    bit_boards = [as_bitboard(state.board) for state in dict_states]
+    moves = [(state, move) for state in dict_states for move in state.moves]
+    packed_moves = [(state, move) for state in packed_states for move in state.moves]
+    corner_captivity, mobility, coin_parity = CornerCaptivity(), Mobility(), CoinParity()
+    evaluator = PatternEvaluator()
+
+    def valid_moves_dict():
+        for state in dict_states:
+            dict_game.get_valid_moves(state.board, state.to_move)
+
+    def valid_moves_bitboard():
+        for board, state in zip(bit_boards, dict_states):
+            bit_game.get_valid_moves(board, state.to_move)
+
+    def flank_opponent():
+        for state, move in moves:
+            for direction in DIRECTIONS:
+                Reversi.flank_opponent(state.board, move, state.to_move, direction)
+
+    def result_dict():
+        for state, move in moves:
+            dict_game.result(state, move)
+
+    def result_packed():
+        for state, move in packed_moves:
+            packed_game.result(state, move)
+
+    def corner_captivity_score():
+        for state in dict_states:
+            corner_captivity.get_score(state.board, state.to_move)
+
+    def mobility_score():
+        for state in dict_states:
+            mobility.get_score(dict_game, state.board, state.to_move)
+        dict_game.is_initial = False
+
+    def coin_parity_score():
+        for state in dict_states:
+            coin_parity.get_score(state.board, state.to_move)
+
+    def pattern_score():
+        for state in dict_states:
+            evaluator.score(state.board, state.to_move)
+
+    def alphabeta(states, d):
+        def run():
+            for state in states:
+                search.alphabeta_search(None, state, packed_game, d=d, make_unmake=True)
+        return run
+
+    def alphabeta_dict(states, d, make_unmake):
+        def run():
+            for state in states:
+                search.alphabeta_search(None, state, dict_game, d=d, make_unmake=make_unmake)
+        return run
+
+    suite = {'get_valid_moves[dict]': (valid_moves_dict, len(dict_states)),
+             'get_valid_moves[bitboard]': (valid_moves_bitboard, len(dict_states)),
+             'flank_opponent': (flank_opponent, len(moves) * len(DIRECTIONS)),
+             'result[dict]': (result_dict, len(moves)),
+             'result[packed]': (result_packed, len(packed_moves)),
+             'CornerCaptivity.get_score': (corner_captivity_score, len(dict_states)),
+             'Mobility.get_score': (mobility_score, len(dict_states)),
+             'CoinParity.get_score': (coin_parity_score, len(dict_states)),
+             'PatternEvaluator.score': (pattern_score, len(dict_states))}
+    for phase, states in packed_positions.items():
+        for d in (2, 3):
+            suite['alphabeta_search[d=%d,%s]' % (d, phase)] = (alphabeta(states, d), len(states))
+    # Making and undoing moves in place against copying states with `result`, on the 'dict' backend
+    midgame_states = dict_positions['midgame']
+    for make_unmake, mode in ((True, 'make_unmake'), (False, 'result')):
+        suite['alphabeta_search[d=2,dict,%s]' % mode] = (alphabeta_dict(midgame_states, 2, make_unmake),
+                                                         len(midgame_states))
+    return suite
+
+
+def throughput(function, operations, min_time):
+    """Returns the operations per second of `function` run for at least `min_time` seconds."""
+    calls = 0
+    start_time = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start_time
+        if elapsed >= min_time:
+            return calls * operations / elapsed
+
+
+def measure(function, operations, min_time=MIN_TIME, rounds=ROUNDS, max_time=MAX_TIME):
+    """Returns {'ops_per_second', 'relative', 'peak_kib'} of a benchmark.
+
+    The benchmark runs `rounds` rounds of at least `min_time` seconds each (no more than
+    `MIN_ROUNDS` if they take over `max_time` seconds), each one followed by a run of
+    `calibration` for as long. `ops_per_second` is the best throughput of the rounds, and
+    `relative` the median ratio of the throughputs of the benchmark and the calibration:
+    it does not depend on the speed of the machine, or on other processes slowing it down
+    during the run, so it is what the baseline is compared on. The memory allocated is
+    measured with `tracemalloc` on one separate call, as the peak size of the memory
+    blocks allocated during the call.
+    """
+    best = 0.0
+    ratios = []
+    start_time = time.perf_counter()
+    for done in range(1, rounds + 1):
+        round_start = time.perf_counter()
+        ops_per_second = throughput(function, operations, min_time)
+        # Calibrated over as long a time as the round, right after it
+        reference = throughput(calibration, 1, time.perf_counter() - round_start)
+        best = max(best, ops_per_second)
+        ratios.append(ops_per_second / reference)
+        if done >= MIN_ROUNDS and time.perf_counter() - start_time > max_time:
+            break
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'ops_per_second': best, 'relative': statistics.median(ratios), 'peak_kib': peak / 1024}
+
+
+def run_benchmarks(pattern=None, min_time=MIN_TIME, rounds=ROUNDS):
+    """Runs the benchmarks whose name contains `pattern` (all by default) and returns their results by name."""
+    results = {}
+    for name, (function, operations) in benchmarks().items():
+        if pattern is None or pattern in name:
+            results[name] = measure(function, operations, min_time, rounds)
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Returns the regressions: the (name, result, baseline result) of the benchmarks whose relative
+    throughput is lower than the baseline's by more than `tolerance` (benchmarks missing from the
+    baseline are not compared)."""
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is not None and result['relative'] < (1 - tolerance) * expected['relative']:
+            regressions.append((name, result, expected))
+    return regressions
+
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as baseline_file:
+        return json.load(baseline_file)['benchmarks']
+
+
+def save_baseline(results, path=BASELINE_FILE):
+    with open(path, 'w') as baseline_file:
+        json.dump({'python': sys.version.split()[0], 'benchmarks': results}, baseline_file, indent=2, sort_keys=True)
+
+
+def report(results, baseline):
+    lines = ["%-38s %12s %10s %10s %8s %10s" % ('benchmark', 'ops/s', 'relative', 'baseline', 'change',
+                                               'peak KiB')]
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            lines.append("%-38s %12.1f %10.4g %10s %8s %10.2f" % (name, result['ops_per_second'], result['relative'],
+                                                                  '-', '-', result['peak_kib']))
+        else:
+            change = result['relative'] / expected['relative'] - 1
+            lines.append("%-38s %12.1f %10.4g %10.4g %+7.1f%% %10.2f" % (
+                name, result['ops_per_second'], result['relative'], expected['relative'], 100 * change,
+                result['peak_kib']))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Runs the micro-benchmarks of the Reversi hot paths. Throughputs are compared with the "
+                    "baseline relative to a calibration workload timed alongside them; after an intended "
+                    "change of performance (or of the Python version), re-baseline with --save.")
+    parser.add_argument('--filter', default=None, help="only run the benchmarks whose name contains this text")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline file to compare with (or to save)")
+    parser.add_argument('--save', action='store_true', help="save the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help="largest accepted relative throughput drop, as a fraction of the baseline")
+    parser.add_argument('--min-time', type=float, default=MIN_TIME, help="seconds per benchmark round")
+    args = parser.parse_args()
+    results = run_benchmarks(args.filter, args.min_time)
+    baseline = load_baseline(args.baseline)
+    print(report(results, baseline))
+    if args.save:
+        # Benchmarks left out by --filter keep their baseline
+        save_baseline({**baseline, **results}, args.baseline)
+        print("Saved the baseline to %s" % args.baseline)
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    for name, result, expected in regressions:
+        print("REGRESSION %s: %.4g relative throughput, baseline %.4g" % (name, result['relative'],
+                                                                          expected['relative']))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
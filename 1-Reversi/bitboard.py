@@ -0,0 +1,198 @@
+from collections.abc import Mapping
+from functools import lru_cache
+
+
+class Geometry:
+    """Precomputed shift amounts and wrap-around masks for a board of a given size.
+
+    Squares are numbered row-major, i.e. square (x, y) is stored in bit
+    (x - 1) * width + (y - 1). Ascending bit order therefore matches the scan
+    order used by `Reversi.get_valid_moves`.
+    """
+
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.size = height * width
+        self.full = (1 << self.size) - 1
+        first_col = 0
+        last_col = 0
+        for row in range(height):
+            first_col |= 1 << (row * width)
+            last_col |= 1 << (row * width + width - 1)
+        # Each direction is stored as (shift amount, mask of squares allowed to move)
+        self.directions = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                if dx == 0 and dy == 0:
+                    continue
+                mask = self.full
+                if dy == 1:
+                    mask &= ~last_col
+                elif dy == -1:
+                    mask &= ~first_col
+                self.directions.append((dx * width + dy, mask))
+        self.max_run = max(height, width) - 2
+        self.coordinates = [self.square(index) for index in range(self.size)]
+
+    def index(self, move):
+        x, y = move
+        return (x - 1) * self.width + (y - 1)
+
+    def square(self, index):
+        return index // self.width + 1, index % self.width + 1
+
+    def bit(self, move):
+        return 1 << self.index(move)
+
+    def shift(self, bb, amount, mask):
+        if amount > 0:
+            return ((bb & mask) << amount) & self.full
+        return (bb & mask) >> -amount
+
+    def squares(self, bb):
+        """Returns the coordinates of all set bits in ascending (scan) order."""
+        coordinates = self.coordinates
+        squares = []
+        while bb:
+            lsb = bb & -bb
+            squares.append(coordinates[lsb.bit_length() - 1])
+            bb ^= lsb
+        return squares
+
+    def get_moves(self, own, opponent):
+        """Returns a bitmask of all squares where `own` can flank `opponent` discs."""
+        empty = ~(own | opponent) & self.full
+        moves = 0
+        for amount, mask in self.directions:
+            flank = self.shift(own, amount, mask) & opponent
+            for _ in range(self.max_run - 1):
+                flank |= self.shift(flank, amount, mask) & opponent
+            moves |= self.shift(flank, amount, mask) & empty
+        return moves
+
+    def get_flips(self, own, opponent, move_bit):
+        """Returns a bitmask of the opponent discs flanked by placing a disc on `move_bit`."""
+        flips = 0
+        for amount, mask in self.directions:
+            line = 0
+            probe = self.shift(move_bit, amount, mask)
+            while probe & opponent:
+                line |= probe
+                probe = self.shift(probe, amount, mask)
+            if probe & own:
+                flips |= line
+        return flips
+
+
+@lru_cache(maxsize=None)
+def get_geometry(height=8, width=8):
+    return Geometry(height, width)
+
+
+def popcount(bb):
+    return bin(bb).count('1')
+
+
+class BitBoard(Mapping):
+    """Board representation using one integer bitmask per player.
+
+    Behaves like the read-only `dict` of (x, y) -> 'X'/'O' used by the rest of
+    the program, so the heuristics and the GUI work unchanged with either backend.
+    """
+
+    __slots__ = ('black', 'white', 'geometry')
+
+    def __init__(self, black=0, white=0, height=8, width=8, geometry=None):
+        self.black = black
+        self.white = white
+        self.geometry = geometry or get_geometry(height, width)
+
+    @classmethod
+    def from_dict(cls, board, height=8, width=8):
+        geometry = get_geometry(height, width)
+        black = white = 0
+        for move, disc in board.items():
+            if disc == 'X':
+                black |= geometry.bit(move)
+            elif disc == 'O':
+                white |= geometry.bit(move)
+        return cls(black, white, geometry=geometry)
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def discs(self, player):
+        """Returns the (own, opponent) bitmasks from `player`'s point of view."""
+        if player == 'X':
+            return self.black, self.white
+        return self.white, self.black
+
+    def copy(self):
+        return BitBoard(self.black, self.white, geometry=self.geometry)
+
+    def play(self, move, player, flip=True):
+        """Returns a new board with `player`'s disc placed on `move` (and flanked discs flipped)."""
+        geometry = self.geometry
+        move_bit = geometry.bit(move)
+        own, opponent = self.discs(player)
+        flips = geometry.get_flips(own, opponent, move_bit) if flip else 0
+        own |= move_bit | flips
+        opponent &= ~flips
+        if player == 'X':
+            return BitBoard(own, opponent, geometry=geometry)
+        return BitBoard(opponent, own, geometry=geometry)
+
+    def __getitem__(self, move):
+        disc = self.get(move)
+        if disc is None:
+            raise KeyError(move)
+        return disc
+
+    def __setitem__(self, move, disc):
+        bit = self.geometry.bit(move)
+        self.black &= ~bit
+        self.white &= ~bit
+        if disc == 'X':
+            self.black |= bit
+        elif disc == 'O':
+            self.white |= bit
+
+    def get(self, move, default=None):
+        x, y = move
+        if not (1 <= x <= self.geometry.height and 1 <= y <= self.geometry.width):
+            return default
+        bit = self.geometry.bit(move)
+        if self.black & bit:
+            return 'X'
+        if self.white & bit:
+            return 'O'
+        return default
+
+    def __contains__(self, move):
+        return self.get(move) is not None
+
+    def __iter__(self):
+        return iter(self.geometry.squares(self.black | self.white))
+
+    def __len__(self):
+        return popcount(self.black | self.white)
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return ['X'] * popcount(self.black) + ['O'] * popcount(self.white)
+
+    def items(self):
+        return [(move, self[move]) for move in self]
+
+    def __repr__(self):
+        return 'BitBoard(%r)' % self.to_dict()
+
+
+def as_bitboard(board, height=8, width=8):
+    """Returns `board` unchanged if it already is a `BitBoard`, otherwise converts it."""
+    if isinstance(board, BitBoard):
+        return board
+    return BitBoard.from_dict(board, height, width)
@@ -0,0 +1,155 @@
+import argparse
+import mmap
+import os
+import struct
+
+from bitboard import get_geometry
+from game import Reversi
+import search
+
+
+DEFAULT_BOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'opening_book.bin')
+
+# File layout: header, then records sorted by position key
+MAGIC = b'RVBK'
+VERSION = 1
+HEADER = struct.Struct('<4sHBBI')   # magic, version, height, width, number of records
+RECORD = struct.Struct('<QBBf')     # Zobrist key, move (square index), search depth, score
+
+
+class OpeningBook:
+    """Read-only opening book, memory-mapped from a file written by `BookBuilder`.
+
+    Records are fixed-size and sorted by the Zobrist key of the position, so a lookup
+    is a binary search directly on the mapped file: nothing is parsed when the book
+    is opened, and only the pages touched by lookups are read from disk.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.height, self.width, self.size = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not an opening book (version %d)" % (path, VERSION))
+        self.geometry = get_geometry(self.height, self.width)
+
+    @classmethod
+    def open_default(cls):
+        """Returns the book shipped in `assets/`, or None if it has not been built."""
+        if not os.path.exists(DEFAULT_BOOK):
+            return None
+        return cls(DEFAULT_BOOK)
+
+    def __len__(self):
+        return self.size
+
+    def record(self, index):
+        return RECORD.unpack_from(self.data, HEADER.size + index * RECORD.size)
+
+    def find(self, key):
+        """Returns the (key, move index, depth, score) record of a position key, or None."""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            record = self.record(middle)
+            if record[0] < key:
+                low = middle + 1
+            elif record[0] > key:
+                high = middle
+            else:
+                return record
+        return None
+
+    def covers(self, game):
+        """Returns True if the book was built for the board size of `game`."""
+        return (self.height, self.width) == (game.height, game.width)
+
+    def lookup(self, state):
+        """Returns the book move for a state, or None if the position is not in the book."""
+        record = self.find(state.key)
+        if record is None:
+            return None
+        move = self.geometry.square(record[1])
+        # Guard against hash collisions
+        return move if move in state.moves else None
+
+    def records(self):
+        for index in range(self.size):
+            yield self.record(index)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BookBuilder:
+    """Generates opening book lines offline with `search.alphabeta_search`.
+
+    Starting from a position, the best move of every position is searched and stored, and
+    the `branching` best moves are followed to build lines of `plies` moves. An existing
+    book can be loaded and deepened: a position is only searched again if it was stored
+    with a shallower search depth.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.geometry = get_geometry(game.height, game.width)
+        self.entries = {}
+
+    def load(self, path):
+        with OpeningBook(path) as book:
+            for key, move, depth, score in book.records():
+                self.entries[key] = (move, depth, score)
+
+    def add_lines(self, state, plies, branching=2, d=4):
+        """Adds the best moves of `state` and its successors up to `plies` moves deep."""
+        if plies == 0 or self.game.terminal_test(state):
+            return
+        entry = self.entries.get(state.key)
+        scores = {}
+        if entry is None or entry[1] < d:
+            move = search.alphabeta_search(None, state, self.game, d=d, scores=scores,
+                                           ordering=search.MoveOrderer(height=self.game.height, width=self.game.width),
+                                           make_unmake=True)
+            self.entries[state.key] = (self.geometry.index(move), d, scores[move])
+        if scores:
+            moves = sorted(scores, key=scores.get, reverse=True)
+        else:
+            moves = [self.geometry.square(entry[0])] + \
+                    [move for move in state.moves if self.geometry.index(move) != entry[0]]
+        for move in moves[:branching]:
+            self.add_lines(self.game.result(state, move), plies - 1, branching, d)
+
+    def save(self, path):
+        with open(path, 'wb') as book_file:
+            book_file.write(HEADER.pack(MAGIC, VERSION, self.game.height, self.game.width, len(self.entries)))
+            for key in sorted(self.entries):
+                move, depth, score = self.entries[key]
+                book_file.write(RECORD.pack(key, move, depth, score))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds (or deepens) the Othello opening book.")
+    parser.add_argument('--output', default=DEFAULT_BOOK, help="book file to write")
+    parser.add_argument('--plies', type=int, default=6, help="length of the book lines")
+    parser.add_argument('--branching', type=int, default=2, help="number of best moves followed per position")
+    parser.add_argument('--depth', type=int, default=4, help="alpha-beta search depth")
+    parser.add_argument('--deepen', action='store_true', help="extend the existing book instead of replacing it")
+    args = parser.parse_args()
+    game = Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard')
+    builder = BookBuilder(game)
+    if args.deepen and os.path.exists(args.output):
+        builder.load(args.output)
+    builder.add_lines(game.initial, args.plies, args.branching, args.depth)
+    builder.save(args.output)
+    print("Wrote %d positions to %s" % (len(builder.entries), args.output))
+
+
+if __name__ == '__main__':
+    main()
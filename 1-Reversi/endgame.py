@@ -0,0 +1,174 @@
+import time
+
+from bitboard import as_bitboard
+from bitboard import popcount
+from search import SearchTimeout
+
+
+ENDGAME_EMPTIES = 12    # Solve positions exactly from this many empty squares
+
+
+class EndgameSolver:
+    """Exact solver for the last empty squares of a game.
+
+    The game tree is searched to the end (negamax with alpha-beta pruning) directly on
+    the bitboards of `bitboard.py`, scoring final positions by disc differential. As in
+    `Reversi.terminal_test`, the game ends as soon as the player to move has no valid
+    move (there is no pass).
+
+    Moves are ordered by:
+    *  Fastest-first: moves leaving the opponent the fewest replies, while more than
+       `fastest_first_empties` squares are empty;
+    *  Parity: moves in board quadrants with an odd number of empty squares first.
+    The last three empty squares are solved by dedicated routines that test the empty
+    squares directly instead of generating moves.
+
+    `alphabeta_search` switches to the solver for positions with at most `empties`
+    empty squares; `stats` reports the nodes searched and time taken by the last solve.
+    A solve given a `should_stop` function raises `SearchTimeout` as soon as it returns True.
+    """
+
+    def __init__(self, game, empties=ENDGAME_EMPTIES, fastest_first_empties=6):
+        self.game = game
+        self.empties = empties
+        self.fastest_first_empties = fastest_first_empties
+        self.geometry = None
+        self.quadrants = []
+        self.nodes = 0
+        self.solve_time = 0.0
+        self.should_stop = None
+
+    def set_geometry(self, geometry):
+        if geometry is self.geometry:
+            return
+        self.geometry = geometry
+        half_height, half_width = geometry.height // 2, geometry.width // 2
+        self.quadrants = [0, 0, 0, 0]
+        for index in range(geometry.size):
+            row, col = divmod(index, geometry.width)
+            self.quadrants[2 * (row >= half_height) + (col >= half_width)] |= 1 << index
+
+    def applies(self, state):
+        """Returns True if the state is close enough to the end of the game to be solved."""
+        if self.game.is_initial and not self.game.is_othello:
+            return False
+        return self.game.height * self.game.width - len(state.board) <= self.empties
+
+    def final_score(self, own, opponent):
+        """Returns the disc differential of a finished game (as counted by `Reversi.calc_score`)."""
+        return popcount(own) - popcount(opponent)
+
+    def solve_last_1(self, own, opponent, empty_bit):
+        self.nodes += 1
+        flips = popcount(self.geometry.get_flips(own, opponent, empty_bit))
+        return popcount(own) - popcount(opponent) + (2 * flips + 1 if flips else 0)
+
+    def solve_few(self, own, opponent, empty_bits, alpha, beta):
+        """Solves positions with two or three empty squares by trying each empty square."""
+        if len(empty_bits) == 1:
+            return self.solve_last_1(own, opponent, empty_bits[0])
+        self.nodes += 1
+        get_flips = self.geometry.get_flips
+        best = None
+        for bit in empty_bits:
+            flips = get_flips(own, opponent, bit)
+            if not flips:
+                continue
+            rest = [other for other in empty_bits if other != bit]
+            v = -self.solve_few(opponent & ~flips, own | flips | bit, rest, -beta, -alpha)
+            if best is None or v > best:
+                best = v
+                if v >= beta:
+                    return v
+                alpha = max(alpha, v)
+        if best is None:
+            return self.final_score(own, opponent)
+        return best
+
+    def ordered_moves(self, own, opponent, moves, empties):
+        """Returns the moves (as bits) in the order they should be searched."""
+        geometry = self.geometry
+        empty = ~(own | opponent) & geometry.full
+        odd_quadrants = 0
+        for quadrant in self.quadrants:
+            if popcount(empty & quadrant) % 2:
+                odd_quadrants |= quadrant
+        move_bits = []
+        while moves:
+            bit = moves & -moves
+            move_bits.append(bit)
+            moves ^= bit
+        if empties > self.fastest_first_empties:
+            def key(bit):
+                flips = geometry.get_flips(own, opponent, bit)
+                replies = popcount(geometry.get_moves(opponent & ~flips, own | flips | bit))
+                return replies, not bit & odd_quadrants
+        else:
+            def key(bit):
+                return not bit & odd_quadrants
+        move_bits.sort(key=key)
+        return move_bits
+
+    def negamax(self, own, opponent, alpha, beta, empties):
+        """Returns the exact final disc differential for the player owning `own`, to move."""
+        geometry = self.geometry
+        if empties <= 3:
+            empty = ~(own | opponent) & geometry.full
+            empty_bits = []
+            while empty:
+                bit = empty & -empty
+                empty_bits.append(bit)
+                empty ^= bit
+            if not empty_bits:
+                return self.final_score(own, opponent)
+            return self.solve_few(own, opponent, empty_bits, alpha, beta)
+        self.nodes += 1
+        if self.should_stop is not None and self.should_stop():
+            raise SearchTimeout
+        moves = geometry.get_moves(own, opponent)
+        if not moves:
+            return self.final_score(own, opponent)
+        best = float('-infinity')
+        for bit in self.ordered_moves(own, opponent, moves, empties):
+            flips = geometry.get_flips(own, opponent, bit)
+            v = -self.negamax(opponent & ~flips, own | flips | bit, -beta, -alpha, empties - 1)
+            if v > best:
+                best = v
+                if v >= beta:
+                    return v
+                alpha = max(alpha, v)
+        return best
+
+    def solve(self, state, should_stop=None):
+        """Returns (best move, final disc differential for the player to move) of a state.
+
+        The move is None if the game is over (the player to move has no valid move).
+        """
+        start_time = time.time()
+        self.nodes = 0
+        self.should_stop = should_stop
+        board = as_bitboard(state.board, self.game.height, self.game.width)
+        self.set_geometry(board.geometry)
+        geometry = self.geometry
+        own, opponent = board.discs(state.to_move)
+        empties = geometry.size - popcount(own | opponent)
+        best_move, best = None, float('-infinity')
+        moves = geometry.get_moves(own, opponent)
+        if not moves:
+            best = self.final_score(own, opponent)
+        try:
+            for bit in self.ordered_moves(own, opponent, moves, empties):
+                flips = geometry.get_flips(own, opponent, bit)
+                v = -self.negamax(opponent & ~flips, own | flips | bit, -geometry.size,
+                                  -max(best, -geometry.size), empties - 1)
+                if v > best:
+                    best = v
+                    best_move = geometry.coordinates[bit.bit_length() - 1]
+        finally:
+            self.solve_time = time.time() - start_time
+        return best_move, best
+
+    def stats(self):
+        return {'nodes': self.nodes,
+                'solve_time': self.solve_time,
+                'nodes_per_second': self.nodes / self.solve_time if self.solve_time else 0.0}
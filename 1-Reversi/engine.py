@@ -0,0 +1,135 @@
+import argparse
+from collections import namedtuple
+import math
+import sys
+import time
+
+
+# The engine modules are imported when a position is first analysed, so that the command
+# line starts (and fails on bad arguments) without loading them.
+
+EMPTY_SQUARES = '.-'
+EVALUATIONS = ('patterns', 'heuristics')
+DEPTH = 6                   # Search depth when no budget is given
+
+# Result of `analyse`: `score` is for the side to move (the final disc differential if `exact`),
+# or None if the time limit ran out before the first search depth was completed
+Analysis = namedtuple('Analysis', 'move, score, depth, nodes, seconds, exact')
+
+
+def parse_position(position, height=None, width=None):
+    """Parses a position string and returns (board, player to move, height, width).
+
+    The string lists the squares row by row ('X' for Black, 'O' for White, '.' or '-' for
+    an empty square; whitespace is ignored) followed by the player to move, e.g. the
+    Othello starting position is '...........................OX......XO........................... X'.
+    Boards are square unless `height` and `width` are given.
+    """
+    characters = ''.join(position.split()).upper()
+    if not characters or characters[-1] not in 'XO':
+        raise ValueError("The position must end with the player to move (X or O)")
+    squares, to_move = characters[:-1], characters[-1]
+    if height is None or width is None:
+        height = width = math.isqrt(len(squares))
+    if height * width != len(squares):
+        raise ValueError("The position has %d squares, not %d x %d" % (len(squares), height, width))
+    board = {}
+    for index, square in enumerate(squares):
+        if square in 'XO':
+            board[index // width + 1, index % width + 1] = square
+        elif square not in EMPTY_SQUARES:
+            raise ValueError("Invalid square %r in the position" % square)
+    return board, to_move, height, width
+
+
+def format_position(board, to_move, height=8, width=8):
+    """Returns the position string of a board (the inverse of `parse_position`)."""
+    return ''.join(board.get((x, y), '.') for x in range(1, height + 1) for y in range(1, width + 1)) \
+        + ' ' + to_move
+
+
+def load_position(position, height=None, width=None, backend='packed'):
+    """Returns the (game, state) of a position string.
+
+    Positions with fewer than four discs are in the opening phase of the classic rules
+    (the centre squares are filled first); others are played with the standard rules.
+    """
+    from game import Reversi
+
+    board, to_move, height, width = parse_position(position, height, width)
+    game = Reversi(is_othello=False, player_side=to_move, opponent_difficulty=3, height=height, width=width,
+                   board=board, moves_made=len(board), backend=backend)
+    return game, game.initial
+
+
+def analyse(position, depth=None, time_limit=None, evaluation='patterns', endgame=True, height=None, width=None):
+    """Returns the `Analysis` of the best move of a position string, or None if the game is over.
+
+    The position is searched to `depth` plies, or by iterative deepening for `time_limit`
+    seconds (up to `depth` plies if given) with `alphabeta_search`, evaluating positions
+    with the pattern tables or the `compute_utility` heuristics. With `endgame`, positions
+    with few empty squares are solved exactly.
+    """
+    from endgame import EndgameSolver
+    import search
+
+    start_time = time.time()
+    game, state = load_position(position, height, width)
+    if not state.moves:
+        return None
+    solver = EndgameSolver(game) if endgame else None
+    if solver is not None and solver.applies(state):
+        move, score = solver.solve(state)
+        return Analysis(move, score, game.height * game.width - len(state.board), solver.nodes,
+                        time.time() - start_time, True)
+    eval_fn = None
+    if evaluation == 'patterns':
+        from patterns import PatternEvaluator
+        eval_fn = PatternEvaluator(game.height, game.width).eval_fn(game, state.to_move)
+    if depth is None:
+        depth = game.height * game.width if time_limit is not None else DEPTH
+    stats = search.SearchStats()
+    move = search.alphabeta_search(None, state, game, d=depth, eval_fn=eval_fn, time_limit=time_limit,
+                                   ordering=search.MoveOrderer(height=game.height, width=game.width),
+                                   make_unmake=True, endgame=solver, stats=stats)
+    iteration = stats.iterations[-1] if stats.iterations else {'depth': 0, 'value': None}
+    return Analysis(move, iteration['value'], iteration['depth'], stats.nodes, time.time() - start_time, False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Prints the best move and score of Reversi positions, without the GUI. "
+                    "Each output line is 'row col score' (or 'game over' if the player to move has no valid move); "
+                    "the score is '?' if the time limit ran out before the first search depth was completed.")
+    parser.add_argument('positions', nargs='*',
+                        help="position strings (the squares row by row with X, O and '.', then the player to move); "
+                             "read one per line from the standard input if none is given")
+    parser.add_argument('--depth', type=int, default=None, help="search depth (default: %d, or unlimited with --time)"
+                                                                % DEPTH)
+    parser.add_argument('--time', type=float, default=None, help="search time limit in seconds")
+    parser.add_argument('--evaluation', choices=EVALUATIONS, default='patterns', help="evaluation function")
+    parser.add_argument('--no-endgame', action='store_true', help="do not solve the last empty squares exactly")
+    parser.add_argument('--height', type=int, default=None, help="board height (default: square board)")
+    parser.add_argument('--width', type=int, default=None, help="board width (default: square board)")
+    parser.add_argument('--verbose', action='store_true', help="also print the depth, nodes and time of each search")
+    args = parser.parse_args(argv)
+    positions = args.positions or (line for line in sys.stdin if line.strip())
+    for position in positions:
+        try:
+            analysis = analyse(position, args.depth, args.time, args.evaluation, not args.no_endgame,
+                               args.height, args.width)
+        except ValueError as error:
+            parser.exit(2, "%s: error: %s\n" % (parser.prog, error))
+        if analysis is None:
+            print("game over")
+            continue
+        score = '?' if analysis.score is None else '%g' % analysis.score
+        line = "%d %d %s" % (analysis.move + (score,))
+        if args.verbose:
+            line += "  (%s depth %d, %d nodes, %.3fs)" % ('exact' if analysis.exact else 'search', analysis.depth,
+                                                         analysis.nodes, analysis.seconds)
+        print(line, flush=True)
+
+
+if __name__ == '__main__':
+    main()
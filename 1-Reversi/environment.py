@@ -1,9 +1,10 @@
-import sys
 import random
+import threading
 from functools import partial
 import time
 
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.core.window import Window
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.gridlayout import GridLayout
@@ -12,13 +13,16 @@ from kivy.uix.label import Label
 from kivy.uix.button import Button
 from kivy.uix.togglebutton import ToggleButton
 from kivy.uix.image import Image
+from kivy.uix.progressbar import ProgressBar
 from kivy.graphics import Rectangle
-# TODO: Display progress bar and popup while AI makes move
-# from kivy.uix.popup import Popup
-# from kivy.uix.progressbar import ProgressBar
 
+from book import OpeningBook
+from endgame import EndgameSolver
 from game import Reversi
+from mcts import MCTS
+from patterns import PatternEvaluator
 import search
+from transposition import TranspositionTable
 
 
 class Board(App):
@@ -41,10 +45,18 @@ class Board(App):
                               color=(0,0,0,1))
     black_label = Label(text="Black: ", color=(0,0,0,1))
     white_label = Label(text="White: ", color=(0,0,0,1))
+    progress_bar = ProgressBar(max=1, value=0, opacity=0)
     buttons = {}
-    game = Reversi(is_othello=True, opponent_type="human", opponent_difficulty=0)
+    game = Reversi(is_othello=True, opponent_type="human", opponent_difficulty=0, backend="packed")
     state = game.initial
     moves_made = 0
+    transposition_table = TranspositionTable()
+    move_orderer = search.MoveOrderer()
+    ai_thinking = False
+    opening_book = OpeningBook.open_default()
+    pattern_evaluator = PatternEvaluator()
+    mcts = None
+    search_cancelled = None
     
     #----------------------------------------------------------------------------------------------
     # Initialisation Functions:
@@ -57,16 +69,27 @@ class Board(App):
         instance.text = "Restart game"
         instance.unbind(on_press=self.start_game)
         instance.bind(on_press=self.restart_game)
-        Window.size = (1100, 600)
+        self.resize_window()
         if self.game.opponent_type == "computer" and self.game.is_othello and self.game.player_side == 'O':
             self.make_move_ai()
 
-    def restart_game(self, instance=None):
-        """Reinitialises parameters for a new game."""
+    def restart_game(self, instance=None, height=None, width=None):
+        """Reinitialises parameters for a new game, on a board of the given size (the current one by default)."""
+        self.cancel_move_ai()
+        height = height or self.game.height
+        width = width or self.game.width
+        resized = (height, width) != (self.game.height, self.game.width)
         self.game = Reversi(is_othello=self.game.is_othello, player_side=self.game.player_side,
-                            opponent_type=self.game.opponent_type, opponent_difficulty=self.game.opponent_difficulty)
+                            opponent_type=self.game.opponent_type, opponent_difficulty=self.game.opponent_difficulty,
+                            height=height, width=width, backend=self.game.backend)
         self.state = self.game.initial
         self.game.moves_made = 0
+        # A cancelled search may still be unwinding, so it keeps its own table and orderer
+        self.transposition_table = TranspositionTable()
+        self.move_orderer = search.MoveOrderer(height=height, width=width)
+        if resized:
+            self.pattern_evaluator = PatternEvaluator(height, width)
+            self.build_board()
         self.update_score()
         self.refresh_board()
         # Opponent goes first if player chose White (Othello)
@@ -96,14 +119,17 @@ class Board(App):
         self.difficulty_states = StackLayout()
         self.difficulty_states.allow_no_selection = False
         self.difficulty_states.add_widget(
-            ToggleButton(text="Easy", group="difficulty", state="down", size_hint=(.33, .7),
+            ToggleButton(text="Easy", group="difficulty", state="down", size_hint=(.25, .7),
                          on_press=lambda x: self.game.set_opponent_difficulty(1)))
         self.difficulty_states.add_widget(
-            ToggleButton(text="Medium", group="difficulty", size_hint=(.33, .7),
+            ToggleButton(text="Medium", group="difficulty", size_hint=(.25, .7),
                          on_press=lambda x: self.game.set_opponent_difficulty(2)))
         self.difficulty_states.add_widget(
-            ToggleButton(text="Hard", group="difficulty", size_hint=(.33, .7),
+            ToggleButton(text="Hard", group="difficulty", size_hint=(.25, .7),
                          on_press=lambda x: self.game.set_opponent_difficulty(3)))
+        self.difficulty_states.add_widget(
+            ToggleButton(text="MCTS", group="difficulty", size_hint=(.25, .7),
+                         on_press=lambda x: self.game.set_opponent_difficulty(4)))
         self.select_difficulty.add_widget(self.difficulty_states)
         self.menu_layout.add_widget(self.select_difficulty)
         self.ai_toggle_selected = True
@@ -118,6 +144,10 @@ class Board(App):
         self.game.set_initial_sides(player_side)
         self.restart_game()
 
+    def init_board_size(self, size):
+        """Sets the desired (square) board size and restarts the game."""
+        self.restart_game(height=size, width=size)
+
     #----------------------------------------------------------------------------------------------
     # Logical Functions:
     # The methods required to carry out game logic.                                                                      
@@ -132,33 +162,84 @@ class Board(App):
         self.white_label.text = "White: " + str(current_score['O'])
 
     def make_move_ai(self):
-        """Searches all possible moves and chooses one of them based on Minimax algorithm."""
-        selected_move = sys.maxsize
-        # TODO: Display popup window while AI makes move
-        # self.show_progress_dialog()
+        """Searches all possible moves and chooses one of them based on Minimax algorithm.
+
+        The search runs on a worker thread so that the board keeps rendering and the game
+        can be restarted while the AI is thinking. The selected move is then played on the
+        main thread by `apply_move_ai`. On Hard, the opening book is consulted first.
+        The MCTS difficulty keeps its search tree between the moves of a game.
+        """
         if self.game.opponent_difficulty == 1:
             rand_move = random.randint(0, len(self.state.moves) - 1)
-            selected_move = self.state.moves[rand_move]
-        elif self.game.opponent_difficulty == 2:
-            selected_move = search.alphabeta_search(self, self.state, self.game, d=2)
-        elif self.game.opponent_difficulty == 3:
-            selected_move = search.alphabeta_search(self, self.state, self.game)
-        else:
+            self.apply_move_ai(self.game, self.state, self.state.moves[rand_move])
+            return
+        elif self.game.opponent_difficulty not in (2, 3, 4):
             raise NotImplementedError
+        if self.game.opponent_difficulty == 3 and self.opening_book is not None \
+                and self.opening_book.covers(self.game):
+            book_move = self.opening_book.lookup(self.state)
+            if book_move is not None:
+                self.apply_move_ai(self.game, self.state, book_move)
+                return
+        self.search_cancelled = threading.Event()
+        self.ai_thinking = True
+        self.refresh_board()
+        self.show_dialog()
+        threading.Thread(target=self.search_move_ai,
+                         args=(self.game, self.state, self.transposition_table, self.move_orderer,
+                               self.search_cancelled),
+                         daemon=True).start()
+
+    def search_move_ai(self, game, state, table, ordering, stop_event):
+        """Runs the AI search (on a worker thread) and schedules the selected move on the main thread."""
+        if game.opponent_difficulty == 2:
+            selected_move = search.alphabeta_search(self, state, game, d=2,
+                                                    table=table,
+                                                    ordering=ordering,
+                                                    make_unmake=True,
+                                                    stop_event=stop_event)
+        elif game.opponent_difficulty == 4:
+            if self.mcts is None or self.mcts.game is not game:
+                self.mcts = MCTS(game, time_limit=search.TIME_LIMIT)
+            selected_move = self.mcts.search(state, progress=self.update_progress, stop_event=stop_event)
+        else:
+            selected_move = search.alphabeta_search(self, state, game,
+                                                    d=game.height * game.width,
+                                                    eval_fn=self.pattern_evaluator.eval_fn(game, state.to_move),
+                                                    time_limit=search.TIME_LIMIT,
+                                                    table=table,
+                                                    ordering=ordering,
+                                                    make_unmake=True,
+                                                    stop_event=stop_event,
+                                                    endgame=EndgameSolver(game))
+        if not stop_event.is_set():
+            Clock.schedule_once(partial(self.apply_move_ai, game, state, selected_move))
+
+    def apply_move_ai(self, game, state, selected_move, *args):
+        """Plays the move selected by the AI, unless the game has been restarted in the meantime."""
+        if game is not self.game or state is not self.state:
+            return
+        self.ai_thinking = False
+        self.dismiss_dialog()
         self.game.moves_made += 1
-        # TODO: Dismiss popup window after AI makes move
-        # self.popup_window.dismiss()
         self.state = self.game.result(self.state, selected_move)
         self.update_score()
         self.refresh_board()
         if self.game.terminal_test(self.state):
             self.end_game()
 
+    def cancel_move_ai(self):
+        """Stops the AI search if one is running."""
+        if self.search_cancelled is not None:
+            self.search_cancelled.set()
+        self.ai_thinking = False
+        self.dismiss_dialog()
+
     def make_move_human(self, move, instance):
         """Places disc on board if the desired move is valid then gives next move to opponent."""
         button_clicked = self.buttons[move]
-        if button_clicked.state == 'disabled':
-            # Ignore invalid moves
+        if button_clicked.state == 'disabled' or self.ai_thinking:
+            # Ignore invalid moves, and moves made while the AI is thinking
             return
         self.game.moves_made += 1
         self.state = self.game.result(self.state, move)
@@ -185,7 +266,7 @@ class Board(App):
                     button.background_disabled_normal = "assets/images/game/black0.png" \
                     if self.state.board.get((row, col)) == 'X' \
                     else "assets/images/game/white0.png"
-                elif (row, col) in self.state.moves:
+                elif (row, col) in self.state.moves and not self.ai_thinking:
                     button.disabled = False
                     button.background_normal = "assets/images/game/possible_move.png"
                 else:
@@ -193,20 +274,70 @@ class Board(App):
                     button.background_disabled_normal = "assets/images/game/empty.png"
                 self.buttons[(row, col)] = button
     
-    # TODO: Display progress bar while AI makes move
-    def update_progress(self, value):
-        """Updates progress bar."""
-        pass
+    def update_progress(self, value, depth=None, nodes=None):
+        """Updates progress bar. Called by the search from its worker thread."""
+        Clock.schedule_once(partial(self.draw_progress, value, depth, nodes))
+
+    def draw_progress(self, value, depth, nodes, *args):
+        """Shows the search progress (fraction done, depth reached and nodes searched)."""
+        if not self.ai_thinking:
+            return
+        self.progress_bar.value = value
+        if depth is None:
+            # Monte Carlo Tree Search
+            self.information_label.text = "Computer is thinking...\n\nPlayouts: " + str(nodes)
+            return
+        self.information_label.text = "Computer is thinking...\n\n" \
+                                      "Depth: " + str(depth) + "\nNodes searched: " + str(nodes)
 
     def show_dialog(self):
-        """Displays window with progress bar."""
-        pass
+        """Displays progress bar."""
+        self.progress_bar.value = 0
+        self.progress_bar.opacity = 1
+        self.information_label.text = "Computer is thinking...\n\n"
+
+    def dismiss_dialog(self):
+        """Hides progress bar."""
+        self.progress_bar.opacity = 0
+
+    def build_board(self):
+        """Creates the buttons of the board squares, replacing those of the previous board size."""
+        self.game_layout.clear_widgets()
+        self.game_layout.rows = self.game.height
+        self.game_layout.cols = self.game.width
+        self.buttons = {}
+        for row in range(1, self.game.height + 1):
+            for col in range(1, self.game.width + 1):
+                if (row, col) in self.state.board:
+                    button = Button(size=(65, 65), disabled=True,
+                        background_disabled_normal="assets/images/game/black0.png"
+                        if self.state.board.get((row, col)) == 'X'
+                        else "assets/images/game/white0.png",
+                        on_press=partial(self.make_move_human, (row, col)))
+                elif (row, col) in self.state.moves:
+                    button = Button(size=(65, 65), disabled=False,
+                        background_normal="assets/images/game/possible_move.png",
+                        on_press=partial(self.make_move_human, (row, col)))
+                else:
+                    button = Button(size=(65, 65), disabled=True,
+                        background_disabled_normal="assets/images/game/empty.png",
+                        on_press=partial(self.make_move_human, (row, col)))
+                self.buttons[(row, col)] = button
+                self.game_layout.add_widget(self.buttons[(row, col)])
+        if self.game_layout.size_hint_x:
+            self.resize_window()
+
+    def resize_window(self):
+        """Fits the window to the board, shrinking the squares of larger boards to keep its height."""
+        square_size = min(75, 600 // self.game.height)
+        Window.size = (500 + square_size * self.game.width, 600)
 
     def build(self):
         """The main entry point into Reversi program.
 
         Builds the scene elements and game board based on the selected configuration:
         *           side:    Desired colour of player's discs (i.e. White or Black)
+        *     board size:    Number of rows and columns of the board (8, 10 or 12)
         *  opponent type:    Who the player wants to play against (i.e. Human or Computer)
 
         Returns
@@ -234,6 +365,14 @@ class Board(App):
             ToggleButton(text="White", group="side", size_hint=(.5, .7),
                          on_press=lambda x: self.init_player_side('O')))
         self.menu_layout.add_widget(side_states)
+        ### Choosing board size
+        size_states = StackLayout()
+        for size in (8, 10, 12):
+            size_states.add_widget(
+                ToggleButton(text="%d x %d" % (size, size), group="size", size_hint=(.33, .7),
+                             state="down" if size == self.game.height else "normal",
+                             on_press=lambda x, size=size: self.init_board_size(size)))
+        self.menu_layout.add_widget(size_states)
         ### Choosing opponent type
         opponent_states = StackLayout()
         opponent_states.add_widget(
@@ -257,25 +396,9 @@ class Board(App):
         self.menu_layout.add_widget(self.scores_layout)
 
         self.menu_layout.add_widget(self.information_label)
+        self.menu_layout.add_widget(self.progress_bar)
         self.menu_layout.add_widget(Button(text="Start game", size_hint=(1, 1), on_press=self.start_game))
-        for row in range(1, self.game.height + 1):
-            for col in range(1, self.game.width + 1):
-                if (row, col) in self.state.board:
-                    button = Button(size=(65, 65), disabled=True,
-                        background_disabled_normal="assets/images/game/black0.png"
-                        if self.state.board.get((row, col)) == 'X'
-                        else "assets/images/game/white0.png",
-                        on_press=partial(self.make_move_human, (row, col)))
-                elif (row, col) in self.state.moves:
-                    button = Button(size=(65, 65), disabled=False,
-                        background_normal="assets/images/game/possible_move.png",
-                        on_press=partial(self.make_move_human, (row, col)))
-                else:
-                    button = Button(size=(65, 65), disabled=True,
-                        background_disabled_normal="assets/images/game/empty.png",
-                        on_press=partial(self.make_move_human, (row, col)))
-                self.buttons[(row, col)] = button
-                self.game_layout.add_widget(self.buttons[(row, col)])
+        self.build_board()
         self.main_layout.add_widget(self.menu_layout)
         self.main_layout.add_widget(self.game_layout)
         return self.main_layout
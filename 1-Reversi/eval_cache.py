@@ -0,0 +1,139 @@
+from collections import OrderedDict
+import hashlib
+import mmap
+import os
+import struct
+
+
+# File layout: header, then records sorted by position key
+MAGIC = b'RVEC'
+VERSION = 1
+HEADER = struct.Struct('<4sHIQ')    # magic, version, number of records, evaluation signature
+RECORD = struct.Struct('<Qd')       # Zobrist key, utility
+
+
+def game_signature(game):
+    """Returns a 64-bit fingerprint of the settings that `Reversi.compute_utility` depends on."""
+    settings = repr((game.height, game.width, game.opponent_difficulty, game.weights))
+    return int.from_bytes(hashlib.blake2b(settings.encode(), digest_size=8).digest(), 'little')
+
+
+class EvaluationCache:
+    """Cache of position evaluations keyed by Zobrist key, bounded in memory with LRU eviction.
+
+    The cache can be written to a snapshot file with `snapshot` and memory-mapped back with
+    `load`, e.g. by a later run or by other processes: the snapshot's records are sorted by
+    key and searched in place, so loading it takes no time however large it is, and the
+    processes mapping the same file share its pages. Positions evaluated since the snapshot
+    are held in memory (the `max_entries` most recently used ones).
+
+    The evaluations depend on the game settings (heuristic weights, difficulty), which are
+    recorded in the snapshot as `signature`: a snapshot of different settings is refused.
+    """
+
+    def __init__(self, max_entries=2**20, signature=0):
+        self.max_entries = max_entries
+        self.signature = signature
+        self.entries = OrderedDict()
+        self.file = None
+        self.data = None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def for_game(cls, game, path=None, max_entries=2**20):
+        """Returns a cache for the evaluations of `game`, loading the snapshot at `path` if it exists."""
+        cache = cls(max_entries, game_signature(game))
+        if path is not None and os.path.exists(path):
+            cache.load(path)
+        return cache
+
+    def __len__(self):
+        return len(self.entries) + self.size
+
+    def load(self, path):
+        """Memory-maps a snapshot written by `snapshot`, replacing any snapshot loaded before."""
+        self.unload()
+        snapshot_file = open(path, 'rb')
+        data = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, size, signature = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION or signature != self.signature:
+            data.close()
+            snapshot_file.close()
+            raise ValueError("%s is not an evaluation cache for these settings" % path)
+        self.file, self.data, self.size = snapshot_file, data, size
+
+    def unload(self):
+        if self.data is not None:
+            self.data.close()
+            self.file.close()
+        self.file = self.data = None
+        self.size = 0
+
+    def record(self, index):
+        return RECORD.unpack_from(self.data, HEADER.size + index * RECORD.size)
+
+    def find(self, key):
+        """Returns the utility of `key` in the snapshot, or None."""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            record_key, utility = self.record(middle)
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                return utility
+        return None
+
+    def lookup(self, key):
+        """Returns the cached utility of the position `key`, or None."""
+        utility = self.entries.get(key)
+        if utility is not None:
+            self.entries.move_to_end(key)
+        elif self.size:
+            utility = self.find(key)
+        if utility is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return utility
+
+    def store(self, key, utility):
+        self.entries[key] = utility
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def snapshot(self, path):
+        """Writes the snapshot loaded (if any) and the entries in memory to `path`, and loads it.
+
+        The file is replaced atomically, so processes still mapping the old snapshot are not disturbed.
+        """
+        records = dict(self.record(index) for index in range(self.size))
+        records.update(self.entries)
+        temporary_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(temporary_path, 'wb') as snapshot_file:
+            snapshot_file.write(HEADER.pack(MAGIC, VERSION, len(records), self.signature))
+            for key in sorted(records):
+                snapshot_file.write(RECORD.pack(key, records[key]))
+        self.unload()
+        os.replace(temporary_path, path)
+        self.load(path)
+        self.entries.clear()
+
+    def close(self):
+        self.unload()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries),
+                'snapshot_entries': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions}
@@ -1,14 +1,247 @@
 from collections import namedtuple
 from collections import Counter
-
+from functools import lru_cache
+import os
+
+from bitboard import BitBoard
+from bitboard import as_bitboard
+from bitboard import get_geometry
+from bitboard import popcount
+from heuristics import ADJACENT_PENALTY
 from heuristics import CornerCaptivity
 from heuristics import CoinParity
 from heuristics import Mobility
+from transposition import ZobristHasher
 
 
-GameState = namedtuple('GameState', 'to_move, utility, board, moves')
+GameState = namedtuple('GameState', 'to_move, utility, board, moves, key', defaults=(None,))
+HEURISTIC_WEIGHTS = (0.7, 0.2, 0.1)     # Corner captivity, mobility and coin parity weights
+WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'weights.json')
 board = {}
 
+# Directions in which discs can be flanked
+DIRECTIONS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)]
+
+
+@lru_cache(maxsize=None)
+def get_rays(height=8, width=8):
+    """Returns {square: rays} where each ray lists the squares from `square` (excluded) to the edge of the board in one direction."""
+    rays = {}
+    for x in range(1, height + 1):
+        for y in range(1, width + 1):
+            square_rays = []
+            for dx, dy in DIRECTIONS:
+                ray = []
+                ray_x, ray_y = x + dx, y + dy
+                while 1 <= ray_x <= height and 1 <= ray_y <= width:
+                    ray.append((ray_x, ray_y))
+                    ray_x, ray_y = ray_x + dx, ray_y + dy
+                if len(ray) >= 2:
+                    square_rays.append(tuple(ray))
+            rays[x, y] = tuple(square_rays)
+    return rays
+
+
+@lru_cache(maxsize=None)
+def get_neighbours(height=8, width=8):
+    """Returns {square: adjacent squares}."""
+    return {(x, y): tuple((x + dx, y + dy) for dx, dy in DIRECTIONS
+                          if 1 <= x + dx <= height and 1 <= y + dy <= width)
+            for x in range(1, height + 1) for y in range(1, width + 1)}
+
+
+class FrontierBoard(dict):
+    """The `dict` board of the 'dict' backend, which also keeps its frontier up to date.
+
+    The frontier is the set of empty squares adjacent to at least one disc: the only
+    squares where a move can be valid. It is updated incrementally as discs are placed
+    and removed, so move generation only has to test these squares.
+    """
+
+    __slots__ = ('frontier', 'neighbours')
+
+    def __init__(self, board=(), height=8, width=8):
+        super().__init__(board)
+        self.neighbours = get_neighbours(height, width)
+        self.frontier = {square for move in self for square in self.neighbours.get(move, ())
+                         if square not in self}
+
+    def __setitem__(self, move, disc):
+        if move not in self:
+            self.frontier.discard(move)
+            self.frontier.update(square for square in self.neighbours[move] if square not in self)
+        super().__setitem__(move, disc)
+
+    def __delitem__(self, move):
+        super().__delitem__(move)
+        neighbours = self.neighbours
+        if any(square in self for square in neighbours[move]):
+            self.frontier.add(move)
+        for square in neighbours[move]:
+            if square in self.frontier and not any(adjacent in self for adjacent in neighbours[square]):
+                self.frontier.discard(square)
+
+    def place(self, move, disc, added):
+        """Places a disc on an empty square, like `self[move] = disc`, for `remove` to undo.
+
+        The squares added to the frontier are appended to the `added` list, and whether
+        `move` was in the frontier is returned.
+        """
+        frontier = self.frontier
+        was_frontier = move in frontier
+        frontier.discard(move)
+        for square in self.neighbours[move]:
+            if square not in self and square not in frontier:
+                frontier.add(square)
+                added.append(square)
+        dict.__setitem__(self, move, disc)
+        return was_frontier
+
+    def remove(self, move, added, was_frontier):
+        """Removes the disc placed with `place`, restoring the frontier without recomputing it."""
+        dict.__delitem__(self, move)
+        self.frontier.difference_update(added)
+        if was_frontier:
+            self.frontier.add(move)
+
+    def copy(self):
+        board = FrontierBoard.__new__(FrontierBoard)
+        dict.update(board, self)
+        board.neighbours = self.neighbours
+        board.frontier = set(self.frontier)
+        return board
+
+    def update(self, other=(), **kwargs):
+        for move, disc in dict(other, **kwargs).items():
+            self[move] = disc
+
+    def __reduce__(self):
+        height, width = max(self.neighbours)
+        return FrontierBoard, (dict(self), height, width)
+
+
+class MoveRecord:
+    """What `Reversi.make_move` changed on a `MutableState`, kept for `Reversi.undo_move`.
+
+    Records are reused by later moves at the same depth, so their lists are cleared
+    and refilled instead of being allocated at every node.
+    """
+
+    __slots__ = ('move', 'changes', 'added', 'was_frontier', 'moves', 'utility', 'key', 'next_moves')
+
+    def __init__(self):
+        self.changes = []           # The discs flipped ('dict') or the previous bitmasks
+        self.added = []             # The squares added to the frontier ('dict')
+        self.next_moves = []        # The moves of the state after the move ('dict')
+
+
+class MutableState:
+    """A `GameState` that is updated in place by `Reversi.make_move` and `Reversi.undo_move`.
+
+    The board is owned by the state, and every move made is recorded on `stack`
+    (the first `depth` `MoveRecord`s, which are reused as moves are made and undone)
+    so it can be undone.
+    """
+
+    __slots__ = ('to_move', 'utility', 'board', 'moves', 'key', 'stack', 'depth')
+
+    def __init__(self, state):
+        self.to_move = state.to_move
+        self.utility = state.utility
+        self.board = state.board.copy()
+        self.moves = state.moves
+        self.key = state.key
+        self.stack = []
+        self.depth = 0
+
+    def push(self):
+        """Returns the `MoveRecord` of the next move made."""
+        if self.depth == len(self.stack):
+            self.stack.append(MoveRecord())
+        record = self.stack[self.depth]
+        self.depth += 1
+        return record
+
+    def pop(self):
+        """Returns the `MoveRecord` of the last move made."""
+        self.depth -= 1
+        return self.stack[self.depth]
+
+    def to_game_state(self):
+        """Returns an immutable snapshot of the current state."""
+        return GameState(to_move=self.to_move, utility=self.utility, board=self.board.copy(),
+                         moves=list(self.moves), key=self.key)
+
+
+def load_weights(path=WEIGHTS_FILE):
+    """Loads the per-phase heuristic weights written by `tuning.py`.
+
+    Returns a tuple of (max discs on the board, corner captivity, mobility, coin parity,
+    adjacent penalty) phases, sorted by number of discs, which can be given to `Reversi`
+    as its `weights`.
+    """
+    import json     # Only imported when needed, to keep `import game` fast for command line use
+
+    with open(path) as weights_file:
+        phases = json.load(weights_file)['phases']
+    return tuple(sorted((phase['max_discs'], *phase['weights'], phase['adjacent_penalty']) for phase in phases))
+
+
+class PackedState:
+    """A compact `GameState` used by the 'packed' backend.
+
+    The board is kept as the two bitmasks of a `BitBoard` and the valid moves as a
+    bitmask, in a fixed set of slots, instead of a board object and a list of moves.
+    `board` and `moves` are rebuilt on access, so code reading a `GameState` (the
+    heuristics, the GUI) works unchanged.
+    """
+
+    __slots__ = ('to_move', 'utility', 'black', 'white', 'move_mask', 'key', 'geometry')
+
+    def __init__(self, to_move, utility, black, white, move_mask, key=None, geometry=None):
+        self.to_move = to_move
+        self.utility = utility
+        self.black = black
+        self.white = white
+        self.move_mask = move_mask
+        self.key = key
+        self.geometry = geometry or get_geometry(8, 8)
+
+    @classmethod
+    def from_state(cls, state, height=8, width=8):
+        """Packs a `GameState` (with a `dict` or `BitBoard` board)."""
+        board = as_bitboard(state.board, height, width)
+        geometry = board.geometry
+        move_mask = 0
+        for move in state.moves:
+            move_mask |= geometry.bit(move)
+        return cls(state.to_move, state.utility, board.black, board.white, move_mask, state.key, geometry)
+
+    def to_game_state(self):
+        """Returns the equivalent `GameState` with a `dict` board."""
+        return GameState(to_move=self.to_move, utility=self.utility, board=self.board.to_dict(),
+                         moves=self.moves, key=self.key)
+
+    @property
+    def board(self):
+        return BitBoard(self.black, self.white, geometry=self.geometry)
+
+    @property
+    def moves(self):
+        return self.geometry.squares(self.move_mask)
+
+    def __eq__(self, other):
+        return isinstance(other, PackedState) and \
+            (self.to_move, self.black, self.white, self.move_mask) == \
+            (other.to_move, other.black, other.white, other.move_mask)
+
+    def __hash__(self):
+        return hash((self.to_move, self.black, self.white))
+
+    def __repr__(self):
+        return 'PackedState(to_move=%r, utility=%r, board=%r, moves=%r)' % (
+            self.to_move, self.utility, self.board.to_dict(), self.moves)
+
 
 class Game:
     """
@@ -71,14 +304,23 @@ class Reversi(Game):
     *  Valid move checking;
     *  Disc flipping;
     *  Score calculation.
+
+    Three board backends are supported and produce identical moves and results:
+    *  'dict':     `dict` of (x, y) -> 'X'/'O' (default);
+    *  'bitboard': one integer bitmask per player with shift-and-mask move generation;
+    *  'packed':   as 'bitboard', with states stored as `PackedState`s.
     """
 
     def __init__(self, is_othello=False, player_side='X', opponent_type='human',
-                 opponent_difficulty=0, is_initial=False, height=8, width=8, board={}, moves_made=0):
+                 opponent_difficulty=0, is_initial=False, height=8, width=8, board={}, moves_made=0,
+                 backend='dict', weights=HEURISTIC_WEIGHTS, eval_cache=None):
         """Initialises the game board with or without the default (Othello) starting pieces."""
         board = board
         self.height = height
         self.width = width
+        if backend not in ('dict', 'bitboard', 'packed'):
+            raise ValueError("Unknown board backend: %r" % backend)
+        self.backend = backend
         self.is_othello = is_othello
         self.player_side = player_side
         self.opponent_side = 'O' if self.player_side == 'X' else 'X'
@@ -87,22 +329,41 @@ class Reversi(Game):
         self.is_initial = is_initial
         self.moves_made = moves_made
         if self.is_othello:
-            board = self.put_initial_discs()
+            board = self.put_initial_discs(self.height, self.width)
         elif self.moves_made > 3:
             self.is_initial = False
         else:
             self.is_initial = True
+        if self.backend != 'dict':
+            board = as_bitboard(board, self.height, self.width)
+        else:
+            board = FrontierBoard(board, self.height, self.width)
+        self.zobrist = ZobristHasher(self.height, self.width)
+        # Heuristics used by `compute_utility`, weighted by (corner, mobility, parity) `weights`
+        # or by the game phase weights of `load_weights`
+        self.weights = weights
+        self.phases = weights if weights and isinstance(weights[0], (tuple, list)) else None
+        # Optional `EvaluationCache` of the utilities computed, by position key
+        self.eval_cache = eval_cache
+        self.corner_captivity = CornerCaptivity(self.height, self.width)
+        self.mobility = Mobility()
+        self.coin_parity = CoinParity()
+        to_move = 'X' if self.is_othello else self.player_side
         self.initial = GameState(
-            to_move='X' if self.is_othello else self.player_side,
+            to_move=to_move,
             utility=0, 
             board=board, 
-            moves=self.get_valid_moves(board, 'X' if self.is_othello else self.player_side))
+            moves=self.get_valid_moves(board, to_move),
+            key=self.zobrist.hash_board(board, to_move))
+        if self.backend == 'packed':
+            self.initial = PackedState.from_state(self.initial, self.height, self.width)
 
     @staticmethod
-    def put_initial_discs():
+    def put_initial_discs(height=8, width=8):
         """Resets the board representation with Othello opening moves."""
-        black_discs = dict.fromkeys([(4, 5), (5, 4)], 'X')
-        white_discs = dict.fromkeys([(4, 4), (5, 5)], 'O')
+        x, y = height // 2, width // 2
+        black_discs = dict.fromkeys([(x, y + 1), (x + 1, y)], 'X')
+        white_discs = dict.fromkeys([(x, y), (x + 1, y + 1)], 'O')
         board = {**black_discs, **white_discs}
         return board
 
@@ -124,7 +385,7 @@ class Reversi(Game):
         """Removes all discs from board and initialises starting moves."""
         self.board = {}
         if self.is_othello:
-            self.put_initial_discs()
+            self.put_initial_discs(self.height, self.width)
         self.initial = GameState(
             to_move='X' if self.is_othello else self.player_side, 
             utility=0, 
@@ -136,14 +397,13 @@ class Reversi(Game):
             board=board, 
             moves=self.get_valid_moves(board, 'X' if self.is_othello else self.player_side))
 
-    @staticmethod
-    def is_on_board(x_coordinate, y_coordinate):
-        return 1 <= x_coordinate <= 8 and 1 <= y_coordinate <= 8
+    def is_on_board(self, x_coordinate, y_coordinate):
+        return 1 <= x_coordinate <= self.height and 1 <= y_coordinate <= self.width
     
     @staticmethod
-    def is_in_centre(move):
+    def is_in_centre(move, height=8, width=8):
         x, y = move
-        return 4 <= x <= 5 and 4 <= y <= 5
+        return height // 2 <= x <= height // 2 + 1 and width // 2 <= y <= width // 2 + 1
 
     @staticmethod
     def flank_opponent(board, move, player, direction):
@@ -179,21 +439,62 @@ class Reversi(Game):
         """
 
         if self.is_initial and not self.is_othello:
-            return self.is_in_centre(move)
+            return self.is_in_centre(move, self.height, self.width)
+        elif self.backend != 'dict':
+            board = as_bitboard(board, self.height, self.width)
+            own, opponent = board.discs(player)
+            geometry = board.geometry
+            return geometry.squares(geometry.get_flips(own, opponent, geometry.bit(move)))
         else:
-            return self.flank_opponent(board, move, player, (0, 1)) \
-                 + self.flank_opponent(board, move, player, (1, 0)) \
-                 + self.flank_opponent(board, move, player, (1, -1)) \
-                 + self.flank_opponent(board, move, player, (1, 1))
+            opponent = 'O' if player == 'X' else 'X'
+            flipped = []
+            for ray in get_rays(self.height, self.width)[move]:
+                flank_positions = []
+                for square in ray:
+                    disc = board.get(square)
+                    if disc != opponent:
+                        if disc == player:
+                            flipped += flank_positions
+                        break
+                    flank_positions.append(square)
+            return flipped
+
+    def can_flank(self, board, move, player, rays):
+        """Returns True if a disc of `player` on `move` would flank at least one opponent disc."""
+        for ray in rays[move]:
+            disc = board.get(ray[0])
+            if disc is None or disc == player:
+                continue
+            for square in ray[1:]:
+                disc = board.get(square)
+                if disc == player:
+                    return True
+                if disc is None:
+                    break
+        return False
 
     def get_valid_moves(self, board, player):
         """Searches the board for possible valid moves and returns a list of their coordinates."""
-        return [(x, y) for x in range(1, self.width + 1)
-                       for y in range(1, self.height + 1)
-                       if (x, y) not in board.keys() 
-                       and self.valid_move(board, (x, y), player)]
+        if self.backend != 'dict' and not (self.is_initial and not self.is_othello):
+            board = as_bitboard(board, self.height, self.width)
+            own, opponent = board.discs(player)
+            return board.geometry.squares(board.geometry.get_moves(own, opponent))
+        if not (self.is_initial and not self.is_othello):
+            # Only the empty squares next to a disc can be valid moves
+            if isinstance(board, FrontierBoard):
+                frontier = board.frontier
+            else:
+                frontier = FrontierBoard(board, self.height, self.width).frontier
+            rays = get_rays(self.height, self.width)
+            return [move for move in sorted(frontier) if self.can_flank(board, move, player, rays)]
+        # Initial phase of the classic rules: the empty centre squares
+        return [(x, y) for x in range(self.height // 2, self.height // 2 + 2)
+                       for y in range(self.width // 2, self.width // 2 + 2)
+                       if (x, y) not in board.keys()]
 
     def calc_score(self, board):
+        if isinstance(board, BitBoard):
+            return {'X': popcount(board.black), 'O': popcount(board.white)}
         black_score = Counter(board.values())['X']
         white_score = Counter(board.values())['O']
         return {'X': black_score, 'O': white_score}
@@ -204,39 +505,214 @@ class Reversi(Game):
 
     def result(self, state, move):
         """Returns the state that results from make a move from a state."""
+        if self.backend == 'packed':
+            return self.result_packed(state, move)
         if move not in state.moves:
             return state
         if self.moves_made == 4 and not self.is_othello:
             self.is_initial = False
         opponent = 'X' if state.to_move == 'O' else 'O'
-        board = state.board.copy()
-        # Update position with disc
-        board[move] = state.to_move
-        # Flank all opponent discs captured by player's move
-        if not self.is_initial:
-            for opponent_disc in self.valid_move(board, move, state.to_move):
+        if self.backend == 'bitboard':
+            board = state.board.play(move, state.to_move, flip=not self.is_initial)
+            flipped = board.geometry.squares(state.board.discs(opponent)[0] & ~board.discs(opponent)[0])
+        else:
+            board = state.board.copy()
+            # Update position with disc
+            board[move] = state.to_move
+            # Flank all opponent discs captured by player's move
+            flipped = [] if self.is_initial else self.valid_move(board, move, state.to_move)
+            for opponent_disc in flipped:
                 board[opponent_disc] = state.to_move
         # Get set of possible moves for next player
         valid_moves = self.get_valid_moves(board, opponent)
+        if state.key is None:
+            key = self.zobrist.hash_board(board, opponent)
+        else:
+            key = self.zobrist.update(state.key, move, flipped, state.to_move)
         return GameState(to_move=opponent,
-                         utility=self.compute_utility(board, valid_moves, state.to_move),
+                         utility=None,
                          board=board,
-                         moves=valid_moves)
+                         moves=valid_moves,
+                         key=key)
+
+    def result_packed(self, state, move):
+        """`result` for the 'packed' backend, computed on the bitmasks of a `PackedState`."""
+        geometry = state.geometry
+        move_bit = geometry.bit(move)
+        if not state.move_mask & move_bit:
+            return state
+        if self.moves_made == 4 and not self.is_othello:
+            self.is_initial = False
+        player = state.to_move
+        opponent = 'X' if player == 'O' else 'O'
+        own, opponent_discs = (state.black, state.white) if player == 'X' else (state.white, state.black)
+        flips = 0 if self.is_initial else geometry.get_flips(own, opponent_discs, move_bit)
+        own |= move_bit | flips
+        opponent_discs &= ~flips
+        black, white = (own, opponent_discs) if player == 'X' else (opponent_discs, own)
+        if self.is_initial and not self.is_othello:
+            move_mask = 0
+            for valid_move in self.get_valid_moves(BitBoard(black, white, geometry=geometry), opponent):
+                move_mask |= geometry.bit(valid_move)
+        else:
+            move_mask = geometry.get_moves(opponent_discs, own)
+        if state.key is None:
+            key = self.zobrist.hash_board(BitBoard(black, white, geometry=geometry), opponent)
+        else:
+            key = self.zobrist.update(state.key, move, geometry.squares(flips), player)
+        return PackedState(opponent, None, black, white, move_mask, key, geometry)
+
+    def encode_state(self, state):
+        """Returns a compact, picklable (black bitmask, white bitmask, player to move) encoding of a state."""
+        board = as_bitboard(state.board, self.height, self.width)
+        return board.black, board.white, state.to_move
+
+    def decode_state(self, encoded_state):
+        """Rebuilds the state encoded with `encode_state` (its utility is evaluated on demand)."""
+        black, white, to_move = encoded_state
+        board = BitBoard(black, white, self.height, self.width)
+        if self.backend == 'dict':
+            board = FrontierBoard(board.to_dict(), self.height, self.width)
+        elif self.backend == 'packed':
+            return PackedState.from_state(GameState(to_move=to_move, utility=None, board=board,
+                                                    moves=self.get_valid_moves(board, to_move),
+                                                    key=self.zobrist.hash_board(board, to_move)))
+        return GameState(to_move=to_move, utility=None, board=board,
+                         moves=self.get_valid_moves(board, to_move),
+                         key=self.zobrist.hash_board(board, to_move))
+
+    def make_move(self, move, state):
+        """Applies a move to a `MutableState` in place and returns it.
+
+        Unlike `result`, no board or state is copied. The change is recorded on the
+        state's stack and is reverted with `undo_move`.
+        """
+        if self.moves_made == 4 and not self.is_othello:
+            self.is_initial = False
+        player = state.to_move
+        opponent = 'X' if player == 'O' else 'O'
+        board = state.board
+        record = state.push()
+        record.move = move
+        record.moves = state.moves
+        record.utility = state.utility
+        record.key = state.key
+        if self.backend != 'dict':
+            # The previous bitmasks are recorded instead of the flipped discs
+            record.changes = (board.black, board.white)
+            geometry = board.geometry
+            own, opponent_discs = board.discs(player)
+            flips = 0 if self.is_initial else geometry.get_flips(own, opponent_discs, geometry.bit(move))
+            own |= geometry.bit(move) | flips
+            opponent_discs &= ~flips
+            if player == 'X':
+                board.black, board.white = own, opponent_discs
+            else:
+                board.black, board.white = opponent_discs, own
+            flipped = geometry.squares(flips)
+            state.moves = self.get_valid_moves(board, opponent)
+        else:
+            flipped = record.changes
+            flipped.clear()
+            record.added.clear()
+            record.was_frontier = board.place(move, player, record.added)
+            if not self.is_initial:
+                self.flip_discs(board, move, player, flipped)
+            if self.is_initial and not self.is_othello:
+                state.moves = self.get_valid_moves(board, opponent)
+            else:
+                # Flipping discs leaves the frontier unchanged, so only the placed disc updated it
+                moves = record.next_moves
+                moves.clear()
+                rays = get_rays(self.height, self.width)
+                can_flank = self.can_flank
+                for square in sorted(board.frontier):
+                    if can_flank(board, square, opponent, rays):
+                        moves.append(square)
+                state.moves = moves
+        state.utility = None
+        if state.key is None:
+            state.key = self.zobrist.hash_board(board, opponent)
+        else:
+            state.key = self.zobrist.update(state.key, move, flipped, player)
+        state.to_move = opponent
+        return state
+
+    def flip_discs(self, board, move, player, flipped):
+        """Flips the discs flanked by the disc of `player` on `move` and appends them to `flipped`."""
+        set_disc = dict.__setitem__
+        for ray in get_rays(self.height, self.width)[move]:
+            disc = board.get(ray[0])
+            if disc is None or disc == player:
+                continue
+            for i in range(1, len(ray)):
+                disc = board.get(ray[i])
+                if disc == player:
+                    for square in ray[:i]:
+                        set_disc(board, square, player)
+                    flipped.extend(ray[:i])
+                    break
+                if disc is None:
+                    break
+
+    def undo_move(self, state):
+        """Reverts the last move made on a `MutableState` with `make_move` and returns it."""
+        record = state.pop()
+        state.moves = record.moves
+        state.utility = record.utility
+        state.key = record.key
+        opponent = state.to_move
+        board = state.board
+        if self.backend != 'dict':
+            board.black, board.white = record.changes
+        else:
+            board.remove(record.move, record.added, record.was_frontier)
+            set_disc = dict.__setitem__
+            for opponent_disc in record.changes:
+                set_disc(board, opponent_disc, opponent)
+        state.to_move = 'X' if opponent == 'O' else 'O'
+        return state
 
     def utility(self, state, player):
-        return state.utility if player == 'X' else -state.utility
+        """Returns the utility of a state, evaluating it first if this has been deferred.
+
+        States returned by `result` and `make_move` leave their utility as None, so only
+        the states whose utility is actually read (e.g. search leaves) are evaluated.
+        If the game has an `eval_cache`, positions evaluated before are looked up in it instead.
+        """
+        utility = state.utility
+        if utility is None:
+            cache = self.eval_cache
+            if cache is not None and state.key is not None and not self.is_initial:
+                utility = cache.lookup(state.key)
+                if utility is None:
+                    utility = self.compute_utility(state.board, state.moves, 'X' if state.to_move == 'O' else 'O')
+                    cache.store(state.key, utility)
+            else:
+                utility = self.compute_utility(state.board, state.moves, 'X' if state.to_move == 'O' else 'O')
+        return utility if player == 'X' else -utility
 
     def terminal_test(self, state):
         return len(state.moves) == 0
 
     def compute_utility(self, board, moves, player):
+        """Evaluates a board for `player`, given the valid moves of the opponent (next to move)."""
         # End of game, return utility
         if len(moves) == 0:
             return 100 if player == 'X' else -100
         elif self.opponent_difficulty == 3 and not self.is_initial:
-            return 0.7 * CornerCaptivity().get_score(board, player) \
-                 + 0.2 * Mobility().get_score(self, board, player)  \
-                 + 0.1 * CoinParity().get_score(board, player)
+            if self.phases is None:
+                corner_weight, mobility_weight, parity_weight = self.weights
+                adjacent_penalty = ADJACENT_PENALTY
+            else:
+                # The phases are given in discs of the 8 x 8 board
+                discs = len(board) * 64 / (self.height * self.width)
+                for max_discs, corner_weight, mobility_weight, parity_weight, adjacent_penalty in self.phases:
+                    if discs <= max_discs:
+                        break
+            return corner_weight * self.corner_captivity.get_score(board, player, adjacent_penalty) \
+                 + mobility_weight * self.mobility.get_score(self, board, player, opponent_moves=moves) \
+                 + parity_weight * self.coin_parity.get_score(board, player)
         else:
             return self.calc_score(board)[player]
 
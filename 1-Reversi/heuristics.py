@@ -1,12 +1,34 @@
 import math
 
 
+ADJACENT_PENALTY = 33.33    # Penalty for a disc next to an empty corner, before the 0.25 corner weight
+
+
+def corners_of(height=8, width=8):
+    """Returns the corners of a board of any size and their three adjacent squares."""
+    corners = {}
+    for x, step_x in ((1, 1), (height, -1)):
+        for y, step_y in ((1, 1), (width, -1)):
+            corners[x, y] = [(x + step_x, y), (x, y + step_y), (x + step_x, y + step_y)]
+    return corners
+
+
 class CornerCaptivity:
     """Evaluates the number of corners and their adjacent squares occupied by a given player.
     Each of the four corners on the board are given equal weight (+25 pts per occupied square).
     Each of the four corners' three adjacent squares have negative weight (-8 pts per occupied square).
     """
 
+    # Corners and their adjacent squares on the standard 8 x 8 board
+    corners = {(1, 1): [(2, 1), (1, 2), (2, 2)],
+               (8, 1): [(7, 1), (8, 2), (7, 2)],
+               (1, 8): [(1, 7), (2, 7), (3, 8)],
+               (8, 8): [(8, 7), (7, 7), (7, 8)]}
+
+    def __init__(self, height=8, width=8):
+        if (height, width) != (8, 8):
+            self.corners = corners_of(height, width)
+
     def disc_value(self, position, player):
         if position not in ['X', 'O']:
             return 0.0
@@ -15,32 +37,29 @@ class CornerCaptivity:
         else:
             return -1.0
 
-    def adjacent_score(self, board, player, adjacent_locs):
+    def adjacent_score(self, board, player, adjacent_locs, adjacent_penalty=ADJACENT_PENALTY):
         """Returns negative score for player-occupied adjacent squares."""
         score = 0.0
         adjacent = [board.get(adjacent_locs[0]), board.get(adjacent_locs[1]), board.get(adjacent_locs[2])]
         for adj in adjacent:
             score += self.disc_value(adj, player)
-        return score * -33.33
+        return score * -adjacent_penalty
 
-    def corner_score(self, board, player, corner, adjacent_locs):
+    def corner_score(self, board, player, corner, adjacent_locs, adjacent_penalty=ADJACENT_PENALTY):
         """Returns weighted score if player is occupying a corner or its adjacent squares."""
         total = 0.0
         in_corner = board.get((corner))
         if in_corner not in ['X', 'O']:
-            total = self.adjacent_score(board, player, adjacent_locs)
+            total = self.adjacent_score(board, player, adjacent_locs, adjacent_penalty)
         else:
             total = 100.0 * self.disc_value(in_corner, player)
         total *= 0.25
         return round(total)
 
-    def get_score(self, board, player):
+    def get_score(self, board, player, adjacent_penalty=ADJACENT_PENALTY):
         """This heuristic evaluates corners captured and gives negative weight to occupied adjacent squares."""
-        c1 = self.corner_score(board, player, (1, 1), [(2, 1), (1, 2), (2, 2)])
-        c2 = self.corner_score(board, player, (8, 1), [(7, 1), (8, 2), (7, 2)])
-        c3 = self.corner_score(board, player, (1, 8), [(1, 7), (2, 7), (3, 8)])
-        c4 = self.corner_score(board, player, (8, 8), [(8, 7), (7, 7), (7, 8)])
-        return c1 + c2 + c3 + c4
+        return sum(self.corner_score(board, player, corner, adjacent_locs, adjacent_penalty)
+                   for corner, adjacent_locs in self.corners.items())
 
 class CoinParity:
     """This heuristic measures the difference in coins between players."""
@@ -51,12 +70,18 @@ class CoinParity:
                      ) / len(board.values())
 class Mobility:
     """This heuristic measures the difference in available moves between players."""
-    def get_score(self, game, board, player):
-        """Returns immediate mobility score."""
+    def get_score(self, game, board, player, opponent_moves=None):
+        """Returns immediate mobility score.
+
+        The opponent's valid moves are only generated if they are not given in `opponent_moves`.
+        """
         game.is_initial = False
         opponent = 'O' if player == 'X' else 'X'
         player_moves = len(game.get_valid_moves(board, player))
-        opponent_moves = len(game.get_valid_moves(board, opponent))
+        if opponent_moves is None:
+            opponent_moves = len(game.get_valid_moves(board, opponent))
+        else:
+            opponent_moves = len(opponent_moves)
         if (player_moves + opponent_moves) != 0:
             return 100 * (player_moves - opponent_moves) / (player_moves + opponent_moves)
         else:
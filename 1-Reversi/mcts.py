@@ -0,0 +1,236 @@
+import math
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import as_bitboard
+from bitboard import popcount
+from parallel_search import decode_game
+from parallel_search import encode_game
+
+
+EXPLORATION = math.sqrt(2)  # UCT exploration constant
+PLAYOUTS = 2000             # Playouts per search when no time limit is given
+PROGRESS_INTERVAL = 100     # Playouts between two progress updates
+
+# Set in each worker process by `init_worker`: set to stop the searches of the workers
+worker_stop_event = None
+
+
+class Node:
+    """A node of the search tree: a state, with the playout results of the player who moved into it."""
+
+    __slots__ = ('state', 'parent', 'move', 'children', 'untried', 'visits', 'wins')
+
+    def __init__(self, state, parent=None, move=None):
+        self.state = state
+        self.parent = parent
+        self.move = move
+        self.children = []
+        self.untried = list(state.moves)
+        self.visits = 0
+        self.wins = 0.0
+
+    def select_child(self, exploration):
+        """Returns the child with the highest UCT value."""
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: child.wins / child.visits
+                   + exploration * math.sqrt(log_visits / child.visits))
+
+
+class MCTS:
+    """Monte Carlo Tree Search (UCT) player.
+
+    The tree is grown with `Reversi.actions`, `result` and `terminal_test`, and each new
+    node is scored by a random playout to the end of the game. Playouts skip the game
+    states and heuristics altogether: they play uniformly random legal moves directly on
+    the bitboards of `bitboard.py` (trying the empty squares in random order until one
+    flips a disc). As in `Reversi`, a game ends as soon as the player to move has no
+    valid move.
+
+    A search runs until `time_limit` seconds have passed, or for `playouts` playouts if
+    no time limit is given, and plays the most visited move. The subtree of the position
+    reached is kept for the next search (tree reuse). With `workers` > 1, as many
+    independent trees are searched in parallel in worker processes (root parallelisation)
+    and their root statistics are summed; setting the `stop_event` of a search stops the
+    workers' trees as well.
+    """
+
+    def __init__(self, game, playouts=PLAYOUTS, time_limit=None, exploration=EXPLORATION, workers=1, seed=None):
+        self.game = game
+        self.playouts = playouts
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.workers = workers
+        self.rng = random.Random(seed)
+        self.root = None
+        self.root_rules = None
+        self.executor = None
+        self.workers_stop_event = None
+        self.playouts_run = 0
+        self.reused_visits = 0
+        self.search_time = 0.0
+
+    def find_root(self, state):
+        """Returns the node of `state` in the tree of the last search (up to two plies down), or a new one."""
+        rules = (self.game.is_othello, self.game.is_initial)
+        if self.root is not None and self.root_rules == rules:
+            candidates = [self.root] + self.root.children \
+                + [grandchild for child in self.root.children for grandchild in child.children]
+            for node in candidates:
+                if node.state.key == state.key and node.state.to_move == state.to_move \
+                        and node.state.board == state.board:
+                    node.parent = None
+                    return node
+        self.root_rules = rules
+        return Node(state)
+
+    def playout(self, state):
+        """Plays random moves from `state` to the end of the game and returns the winner ('X', 'O' or None)."""
+        board = as_bitboard(state.board, self.game.height, self.game.width)
+        geometry = board.geometry
+        get_flips = geometry.get_flips
+        rng = self.rng
+        player = state.to_move
+        own, opponent = board.discs(player)
+        empties = [1 << index for index in range(geometry.size) if not (own | opponent) >> index & 1]
+        if not self.game.is_othello and len(empties) > geometry.size - 4:
+            # Initial phase of the classic rules: the centre squares are filled first
+            x, y = geometry.height // 2, geometry.width // 2
+            centre = [geometry.bit(move) for move in ((x, y), (x, y + 1), (x + 1, y), (x + 1, y + 1))]
+            empty_centre = [bit for bit in centre if not (own | opponent) & bit]
+            rng.shuffle(empty_centre)
+            for bit in empty_centre:
+                own, opponent = opponent, own | bit
+                empties.remove(bit)
+                player = 'O' if player == 'X' else 'X'
+        randrange = rng.randrange
+        count = len(empties)
+        while True:
+            # Try the empty squares in random order until a move flips discs
+            for i in range(count):
+                j = randrange(i, count)
+                empties[i], empties[j] = empties[j], empties[i]
+                bit = empties[i]
+                flips = get_flips(own, opponent, bit)
+                if flips:
+                    break
+            else:
+                break
+            own, opponent = opponent & ~flips, own | bit | flips
+            count -= 1
+            empties[i] = empties[count]
+            player = 'O' if player == 'X' else 'X'
+        difference = popcount(own) - popcount(opponent)
+        if difference == 0:
+            return None
+        return player if difference > 0 else ('O' if player == 'X' else 'X')
+
+    def iterate(self, root):
+        """Runs one selection, expansion, playout and backpropagation from `root`."""
+        game = self.game
+        node = root
+        while not node.untried and node.children:
+            node = node.select_child(self.exploration)
+        if node.untried:
+            move = node.untried.pop(self.rng.randrange(len(node.untried)))
+            child = Node(game.result(node.state, move), node, move)
+            node.children.append(child)
+            node = child
+        if game.terminal_test(node.state):
+            score = game.calc_score(node.state.board)
+            winner = 'X' if score['X'] > score['O'] else 'O' if score['O'] > score['X'] else None
+        else:
+            winner = self.playout(node.state)
+        while node is not None:
+            node.visits += 1
+            if node.parent is not None:
+                mover = node.parent.state.to_move
+                node.wins += 1.0 if winner == mover else 0.5 if winner is None else 0.0
+            node = node.parent
+
+    def grow(self, root, progress=None, stop_event=None):
+        """Grows the tree of `root` within the search budget and returns the number of playouts run."""
+        start_time = time.time()
+        playouts = 0
+        while True:
+            if self.time_limit is not None:
+                fraction = (time.time() - start_time) / self.time_limit if self.time_limit else 1
+            else:
+                fraction = playouts / self.playouts
+            if fraction >= 1 or (stop_event is not None and stop_event.is_set()):
+                break
+            self.iterate(root)
+            playouts += 1
+            if progress is not None and playouts % PROGRESS_INTERVAL == 0:
+                progress(fraction, None, playouts)
+        return playouts
+
+    def root_statistics(self, root):
+        return {child.move: (child.visits, child.wins) for child in root.children}
+
+    def search(self, state, progress=None, stop_event=None):
+        """Returns the move to play in `state`.
+
+        `progress(fraction, depth, playouts)` is called during the search (depth is None),
+        and the search stops early when `stop_event` is set.
+        """
+        start_time = time.time()
+        if len(state.moves) == 1:
+            return state.moves[0]
+        root = self.find_root(state)
+        self.reused_visits = root.visits
+        futures = []
+        if self.workers > 1:
+            if self.executor is None:
+                self.workers_stop_event = multiprocessing.Event()
+                self.executor = ProcessPoolExecutor(max_workers=self.workers - 1, initializer=init_worker,
+                                                    initargs=(self.workers_stop_event,))
+            self.workers_stop_event.clear()
+            encoded_game, encoded_state = encode_game(self.game), self.game.encode_state(state)
+            futures = [self.executor.submit(search_worker, encoded_game, encoded_state, self.playouts,
+                                            self.time_limit, self.exploration, self.rng.getrandbits(32))
+                       for _ in range(self.workers - 1)]
+        self.playouts_run = self.grow(root, progress, stop_event)
+        if futures and stop_event is not None and stop_event.is_set():
+            self.workers_stop_event.set()
+        statistics = self.root_statistics(root)
+        for future in futures:
+            worker_statistics, worker_playouts = future.result()
+            self.playouts_run += worker_playouts
+            for move, (visits, wins) in worker_statistics.items():
+                total_visits, total_wins = statistics.get(move, (0, 0.0))
+                statistics[move] = (total_visits + visits, total_wins + wins)
+        self.root = root
+        self.search_time = time.time() - start_time
+        if not statistics:
+            # Stopped before the first playout
+            return state.moves[0]
+        return max(statistics, key=lambda move: statistics[move][0])
+
+    def stats(self):
+        """Returns the playouts run by the last search, their rate and the visits reused from the previous tree."""
+        return {'playouts': self.playouts_run,
+                'playouts_per_second': self.playouts_run / self.search_time if self.search_time else 0.0,
+                'reused_visits': self.reused_visits,
+                'seconds': self.search_time}
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+def init_worker(stop_event):
+    global worker_stop_event
+    worker_stop_event = stop_event
+
+
+def search_worker(encoded_game, encoded_state, playouts, time_limit, exploration, seed):
+    """Searches a tree of its own in a worker process and returns (root statistics, playouts)."""
+    game = decode_game(encoded_game)
+    player = MCTS(game, playouts, time_limit, exploration, seed=seed)
+    root = Node(game.decode_state(encoded_state))
+    playouts_run = player.grow(root, stop_event=worker_stop_event)
+    return player.root_statistics(root), playouts_run
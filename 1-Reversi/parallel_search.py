@@ -0,0 +1,138 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from eval_cache import EvaluationCache
+from game import Reversi
+import search
+
+
+# Set in each worker process by `init_worker`
+shared_alpha = None
+eval_cache_path = None
+games = {}
+
+
+def encode_game(game):
+    """Returns the settings needed to rebuild a `Reversi` game in another process."""
+    return (game.is_othello, game.player_side, game.opponent_difficulty, game.is_initial,
+            game.height, game.width, game.moves_made, game.backend, game.weights)
+
+
+def decode_game(encoded_game):
+    """Returns the `Reversi` game with the encoded settings (cached per process)."""
+    game = games.get(encoded_game)
+    if game is None:
+        is_othello, player_side, opponent_difficulty, is_initial, height, width, moves_made, backend, weights = \
+            encoded_game
+        game = Reversi(is_othello=is_othello, player_side=player_side, opponent_difficulty=opponent_difficulty,
+                       height=height, width=width, moves_made=moves_made, backend=backend, weights=weights)
+        game.is_initial = is_initial
+        if eval_cache_path is not None:
+            game.eval_cache = EvaluationCache.for_game(game, eval_cache_path)
+        games[encoded_game] = game
+    return game
+
+
+def init_worker(alpha, cache_path=None):
+    global shared_alpha, eval_cache_path
+    shared_alpha = alpha
+    eval_cache_path = cache_path
+
+
+def search_move(encoded_game, encoded_state, move, d, cutoff_test=None, eval_fn=None):
+    """Searches one root move, using the best value found by any worker so far as alpha.
+
+    Returns (move, value, alpha): the value is exact if it is greater than alpha,
+    otherwise it is only an upper bound.
+    """
+    game = decode_game(encoded_game)
+    state = game.decode_state(encoded_state)
+    with shared_alpha.get_lock():
+        alpha = shared_alpha.value
+    scores = {}
+    search.alphabeta_search(None, state, game, d=d, cutoff_test=cutoff_test, eval_fn=eval_fn,
+                            ordering=search.MoveOrderer(height=game.height, width=game.width), make_unmake=True,
+                            root_actions=[move], scores=scores, alpha=alpha)
+    value = scores[move]
+    with shared_alpha.get_lock():
+        if value > shared_alpha.value:
+            shared_alpha.value = value
+    return move, value, alpha
+
+
+class ParallelSearcher:
+    """Alpha-beta search with the root moves split over a pool of worker processes.
+
+    Each root move is searched in a worker process. The best root value found so far is
+    shared between the workers (in shared memory) and used as alpha by every move searched
+    after it. With `young_brothers_wait`, the first root move is searched on its own before
+    the others are handed out, so the remaining moves start with a useful bound.
+
+    States and game settings are sent to the workers in their compact encodings
+    (`Reversi.encode_state` and `encode_game`). The move returned is the same as
+    `search.alphabeta_search` at the same depth: root moves that only got an upper bound
+    equal to the best value are re-searched to break ties in the sequential order.
+
+    Custom `cutoff_test` and `eval_fn` functions must be picklable (i.e. defined at module level).
+
+    If an `eval_cache_path` is given, every worker memory-maps the evaluation cache snapshot
+    at that path (see `EvaluationCache`) if it exists.
+    """
+
+    def __init__(self, workers=None, young_brothers_wait=True, eval_cache_path=None):
+        self.alpha = multiprocessing.Value('d', float('-infinity'))
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                            initargs=(self.alpha, eval_cache_path))
+        self.young_brothers_wait = young_brothers_wait
+
+    def search(self, state, game, d=4, cutoff_test=None, eval_fn=None):
+        actions = list(game.actions(state))
+        if len(actions) <= 1:
+            return actions[0] if actions else None
+        encoded_game = encode_game(game)
+        encoded_state = game.encode_state(state)
+        with self.alpha.get_lock():
+            self.alpha.value = float('-infinity')
+        results = {}
+        pending = actions
+        if self.young_brothers_wait:
+            first = self.executor.submit(search_move, encoded_game, encoded_state, actions[0], d,
+                                         cutoff_test, eval_fn)
+            move, value, alpha = first.result()
+            results[move] = (value, alpha)
+            pending = actions[1:]
+        futures = [self.executor.submit(search_move, encoded_game, encoded_state, a, d, cutoff_test, eval_fn)
+                   for a in pending]
+        for future in futures:
+            move, value, alpha = future.result()
+            results[move] = (value, alpha)
+        best_v = max(value for value, _ in results.values())
+        for a in actions:
+            value, alpha = results[a]
+            if value != best_v:
+                continue
+            if value > alpha:
+                return a
+            else:
+                # Only an upper bound equal to the best value, the move may tie: search it fully
+                scores = {}
+                search.alphabeta_search(None, state, game, d=d, cutoff_test=cutoff_test, eval_fn=eval_fn,
+                                        make_unmake=True, root_actions=[a], scores=scores)
+                if scores[a] == best_v:
+                    return a
+        return max(actions, key=lambda a: results[a][0])
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def parallel_alphabeta_search(state, game, d=4, workers=None, cutoff_test=None, eval_fn=None):
+    """Runs a single root-split search with a temporary pool (see `ParallelSearcher`)."""
+    with ParallelSearcher(workers) as searcher:
+        return searcher.search(state, game, d=d, cutoff_test=cutoff_test, eval_fn=eval_fn)
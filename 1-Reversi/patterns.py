@@ -0,0 +1,198 @@
+from array import array
+from functools import lru_cache
+import itertools
+
+from bitboard import as_bitboard
+from bitboard import get_geometry
+from bitboard import popcount
+
+
+EMPTY, OWN, OPPONENT = 0, 1, 2      # Digits of a square in a base-3 pattern index
+
+# Scores of the hand-tuned tables
+CORNER = 25.0           # Corner square
+STABLE = 6.0            # Disc in a run from an occupied corner (cannot be flipped along the edge)
+C_SQUARE = 8.0          # Penalty for a disc next to an empty corner on the edge
+X_SQUARE = 15.0         # Penalty for a disc diagonally next to an empty corner
+EDGE = 1.0              # Any other edge disc
+DIAGONAL = 2.0          # Disc in a run from an occupied corner along the diagonal
+INNER = 0.5             # Any other disc of a pattern
+MOBILITY = 2.0          # Per valid move more than the opponent
+WIN = 1000.0            # Bonus for a won game (on top of the disc differential)
+
+
+def anchored_bounds(digits):
+    """Returns (left, right): the positions before `left` and from `right` on are covered by runs
+    of one colour starting from an occupied end of the line."""
+    length = len(digits)
+    if EMPTY not in digits:
+        # A full line cannot be flipped along it
+        return length, 0
+    left = 0
+    if digits[0] != EMPTY:
+        while digits[left] == digits[0]:
+            left += 1
+    right = length
+    if digits[-1] != EMPTY:
+        right -= 1
+        while digits[right] == digits[-1]:
+            right -= 1
+        right += 1
+    return left, right
+
+
+def lines(length):
+    """Yields the digits of every pattern of `length` squares, in index order."""
+    return itertools.product((EMPTY, OWN, OPPONENT), repeat=length)
+
+
+def sign(digit):
+    return 1.0 if digit == OWN else -1.0 if digit == OPPONENT else 0.0
+
+
+@lru_cache(maxsize=None)
+def edge_table(length):
+    """Table of an edge (corner to corner) of `length` squares, for the player owning OWN."""
+    scores = []
+    last = length - 1
+    for digits in lines(length):
+        left, right = anchored_bounds(digits)
+        score = 0.0
+        for position, digit in enumerate(digits):
+            if digit == EMPTY:
+                continue
+            if position == 0 or position == last:
+                value = CORNER
+            elif position < left or position >= right:
+                value = STABLE
+            elif (position == 1 and digits[0] == EMPTY) or (position == last - 1 and digits[last] == EMPTY):
+                value = -C_SQUARE
+            else:
+                value = EDGE
+            score += value if digit == OWN else -value
+        scores.append(score)
+    return array('d', scores)
+
+
+@lru_cache(maxsize=None)
+def corner_table():
+    """Table of a 3 x 3 corner region (corner first, row by row away from the corner).
+
+    The corner and the edge squares are scored by the edge tables: only the X-square
+    and the inner squares are scored here.
+    """
+    scores = []
+    for digits in lines(9):
+        corner = digits[0]
+        score = 0.0
+        for position in (4, 5, 7, 8):
+            digit = digits[position]
+            if digit == EMPTY:
+                continue
+            if position == 4 and corner == EMPTY:
+                score -= sign(digit) * X_SQUARE
+            elif corner != EMPTY and digit == corner:
+                score += sign(digit) * 2 * INNER
+            else:
+                score += sign(digit) * INNER
+        scores.append(score)
+    return array('d', scores)
+
+
+@lru_cache(maxsize=None)
+def diagonal_table(length):
+    """Table of a diagonal (corner to corner) of `length` squares, without its corners and X-squares."""
+    scores = []
+    for digits in lines(length):
+        left, right = anchored_bounds(digits)
+        score = 0.0
+        for position in range(2, length - 2):
+            digit = digits[position]
+            if digit != EMPTY:
+                value = DIAGONAL if position < left or position >= right else INNER
+                score += value if digit == OWN else -value
+        scores.append(score)
+    return array('d', scores)
+
+
+class PatternEvaluator:
+    """Evaluates positions by looking up patterns of squares in precomputed tables.
+
+    The squares of each pattern (the four edges, the four 3 x 3 corner regions and the
+    two main diagonals of square boards) are read as the digits of a base-3 index (empty,
+    own, opponent disc), which selects the score of the pattern in its table. The
+    tables are computed once per pattern length and shared by all evaluators. Their
+    scores reward corners and discs that are anchored to an occupied corner, and
+    penalise the squares next to empty corners. A mobility term is added from the
+    bitboard move generation.
+    """
+
+    def __init__(self, height=8, width=8, mobility_weight=MOBILITY):
+        self.geometry = get_geometry(height, width)
+        self.mobility_weight = mobility_weight
+        self.patterns = []
+        rows = [[(x, y) for y in range(1, width + 1)] for x in (1, height)]
+        cols = [[(x, y) for x in range(1, height + 1)] for y in (1, width)]
+        for line in rows + cols:
+            self.add_pattern(line, edge_table(len(line)))
+        for corner_x, step_x in ((1, 1), (height, -1)):
+            for corner_y, step_y in ((1, 1), (width, -1)):
+                region = [(corner_x + step_x * i, corner_y + step_y * j) for i in range(3) for j in range(3)]
+                self.add_pattern(region, corner_table())
+        if height == width:
+            self.add_pattern([(i, i) for i in range(1, height + 1)], diagonal_table(height))
+            self.add_pattern([(i, width + 1 - i) for i in range(1, height + 1)], diagonal_table(height))
+
+    def add_pattern(self, squares, table):
+        self.patterns.append((tuple(self.geometry.bit(square) for square in squares), table))
+
+    def pattern_score(self, own, opponent):
+        """Returns the sum of the pattern scores for the player owning `own`."""
+        score = 0.0
+        for bits, table in self.patterns:
+            index = 0
+            for bit in bits:
+                index *= 3
+                if own & bit:
+                    index += OWN
+                elif opponent & bit:
+                    index += OPPONENT
+            score += table[index]
+        return score
+
+    def score(self, board, player):
+        """Returns the evaluation of a board for `player`."""
+        board = as_bitboard(board, self.geometry.height, self.geometry.width)
+        own, opponent = board.discs(player)
+        return self.disc_score(own, opponent)
+
+    def disc_score(self, own, opponent, own_moves=None, opponent_moves=None):
+        """Returns the evaluation for the player owning `own` (the numbers of valid moves are generated if not given)."""
+        score = self.pattern_score(own, opponent)
+        if self.mobility_weight:
+            get_moves = self.geometry.get_moves
+            if own_moves is None:
+                own_moves = popcount(get_moves(own, opponent))
+            if opponent_moves is None:
+                opponent_moves = popcount(get_moves(opponent, own))
+            score += self.mobility_weight * (own_moves - opponent_moves)
+        return score
+
+    def final_score(self, own, opponent):
+        """Returns the value of a finished game for the player owning `own`: the disc differential, plus WIN for a win."""
+        difference = popcount(own) - popcount(opponent)
+        return difference + (WIN if difference > 0 else -WIN if difference < 0 else 0.0)
+
+    def eval_fn(self, game, player):
+        """Returns an `eval_fn` for `alphabeta_search` evaluating states for `player`."""
+        height, width = self.geometry.height, self.geometry.width
+
+        def evaluate(state):
+            own, opponent = as_bitboard(state.board, height, width).discs(player)
+            moves = len(state.moves)
+            if moves == 0:
+                return self.final_score(own, opponent)
+            if state.to_move == player:
+                return self.disc_score(own, opponent, own_moves=moves)
+            return self.disc_score(own, opponent, opponent_moves=moves)
+        return evaluate
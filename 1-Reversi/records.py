@@ -0,0 +1,157 @@
+import argparse
+from collections import namedtuple
+import os
+import struct
+
+from bitboard import get_geometry
+from bitboard import popcount
+from game import Reversi
+
+
+# File layout: header, then the games one after another, each a game header and one byte per move
+MAGIC = b'RVGR'
+VERSION = 1
+HEADER = struct.Struct('<4sH')          # magic, version
+GAME = struct.Struct('<BBBhH')          # flags, height, width, result, number of moves
+OTHELLO = 1                             # Flag: Othello rules (else classic Reversi)
+WHITE_FIRST = 2                         # Flag: White moved first (classic Reversi only)
+MAX_SQUARES = 256                       # Moves are stored as one-byte square indices
+
+# A recorded game: `result` is the final disc differential for Black, `moves` the (x, y) moves played
+GameRecord = namedtuple('GameRecord', 'is_othello, height, width, first_player, result, moves')
+
+
+def encode_game(record):
+    """Returns the bytes of a `GameRecord`: its game header followed by its moves."""
+    if record.height * record.width > MAX_SQUARES:
+        raise ValueError("Boards of more than %d squares cannot be recorded" % MAX_SQUARES)
+    flags = (OTHELLO if record.is_othello else 0) | (WHITE_FIRST if record.first_player == 'O' else 0)
+    geometry = get_geometry(record.height, record.width)
+    return GAME.pack(flags, record.height, record.width, record.result, len(record.moves)) \
+        + bytes(geometry.index(move) for move in record.moves)
+
+
+def record_game(game, moves, first_player=None):
+    """Returns the `GameRecord` of `moves` played in `game`, replaying them to compute the result."""
+    if first_player is None:
+        first_player = 'X' if game.is_othello else game.player_side
+    record = GameRecord(game.is_othello, game.height, game.width, first_player, 0, tuple(moves))
+    black = white = 0
+    for black, white, _ in replay_bitboards(record):
+        pass
+    return record._replace(result=popcount(black) - popcount(white))
+
+
+class GameRecordWriter:
+    """Appends games to a record file, creating it if needed.
+
+    Games are only ever appended, so several runs (or a crashed one) leave a valid file
+    behind; each game is written with a single `write` call.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION))
+        self.games = 0
+
+    def write(self, record):
+        self.file.write(encode_game(record))
+        self.games += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_records(path):
+    """Yields the `GameRecord`s of a record file one at a time, reading the file sequentially."""
+    with open(path, 'rb') as record_file:
+        magic, version = HEADER.unpack(record_file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a game record file (version %d)" % (path, VERSION))
+        while True:
+            header = record_file.read(GAME.size)
+            if len(header) < GAME.size:
+                # End of file (a truncated last game is ignored)
+                return
+            flags, height, width, result, length = GAME.unpack(header)
+            indices = record_file.read(length)
+            if len(indices) < length:
+                return
+            coordinates = get_geometry(height, width).coordinates
+            yield GameRecord(bool(flags & OTHELLO), height, width, 'O' if flags & WHITE_FIRST else 'X',
+                             result, tuple(coordinates[index] for index in indices))
+
+
+def replay_bitboards(record):
+    """Yields the (black, white, mover) bitmasks after each move of a record (mover is 'X' or 'O').
+
+    The moves are assumed legal (they are not validated), which makes this the fast
+    path for extracting training positions.
+    """
+    geometry = get_geometry(record.height, record.width)
+    initial = Reversi.put_initial_discs(record.height, record.width) if record.is_othello else {}
+    black = white = 0
+    for move, disc in initial.items():
+        if disc == 'X':
+            black |= geometry.bit(move)
+        else:
+            white |= geometry.bit(move)
+    player = record.first_player
+    for move in record.moves:
+        bit = geometry.bit(move)
+        if player == 'X':
+            flips = geometry.get_flips(black, white, bit)
+            black, white = black | bit | flips, white & ~flips
+        else:
+            flips = geometry.get_flips(white, black, bit)
+            black, white = black & ~flips, white | bit | flips
+        yield black, white, player
+        player = 'O' if player == 'X' else 'X'
+
+
+def replay(record, backend='bitboard', opponent_difficulty=0):
+    """Yields the `GameState`s of a record, from the initial state to the final one.
+
+    The moves are replayed with `Reversi.result` (as played by `environment.py`), so an
+    illegal move raises ValueError.
+    """
+    game = Reversi(is_othello=record.is_othello, player_side=record.first_player,
+                   opponent_difficulty=opponent_difficulty, height=record.height, width=record.width,
+                   backend=backend)
+    state = game.initial
+    yield state
+    for move in record.moves:
+        if move not in state.moves:
+            raise ValueError("Illegal move %s in recorded game" % (move,))
+        game.moves_made += 1
+        state = game.result(state, move)
+        yield state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarises game record files.")
+    parser.add_argument('paths', nargs='+', help="game record files")
+    args = parser.parse_args()
+    for path in args.paths:
+        games = plies = black_wins = white_wins = 0
+        for record in read_records(path):
+            games += 1
+            plies += len(record.moves)
+            black_wins += record.result > 0
+            white_wins += record.result < 0
+        print("%s: %d games (%d bytes), %d moves, Black won %d, White won %d, %d draws" % (
+            path, games, os.path.getsize(path), plies, black_wins, white_wins, games - black_wins - white_wins))
+
+
+if __name__ == '__main__':
+    main()
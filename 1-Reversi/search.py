@@ -1,52 +1,506 @@
+import math
 import time
 
+from game import MutableState
+from heuristics import CornerCaptivity
+from transposition import EXACT
+from transposition import LOWERBOUND
+from transposition import UPPERBOUND
+from transposition import TranspositionTable
+
 TIME_LIMIT = 5          # Max time (in seconds) for AI to make move
+ENDGAME_SHARE = 0.5     # Share of the time limit given to the endgame solver before searching instead
+
+
+class SearchTimeout(Exception):
+    """Raised inside the game tree when the time limit of the search has been reached."""
+
+
+class MoveOrderer:
+    """Orders the moves of each node so that alpha-beta finds its cutoffs early.
+
+    Moves are tried in the following order:
+    *  The best move previously stored for the position (e.g. in the transposition table);
+    *  The killer moves of the ply, i.e. the latest moves that produced a cutoff at that depth;
+    *  The remaining moves by static square priority: corners first, the squares adjacent
+       to corners (the ones `CornerCaptivity` gives negative weight) last;
+    *  Ties are broken by the history heuristic, which adds depth^2 to a move's score each
+       time it produces a cutoff.
+
+    The orderer also counts how often the first move tried produces the cutoff.
+    """
 
-def alphabeta_search(self, state, game, d=4, cutoff_test=None, eval_fn=None):
+    def __init__(self, killers_per_ply=2, height=8, width=8):
+        self.killers_per_ply = killers_per_ply
+        self.priorities = {}
+        for corner, adjacent_locs in CornerCaptivity(height, width).corners.items():
+            self.priorities[corner] = 1
+            for adjacent in adjacent_locs:
+                self.priorities[adjacent] = -1
+        self.killers = {}
+        self.history = {}
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def order(self, moves, depth, player, best_move=None):
+        """Returns the moves sorted from most to least promising."""
+        history = self.history
+        priorities = self.priorities
+        ordered = sorted(moves, key=lambda move: (priorities.get(move, 0), history.get((player, move), 0)),
+                         reverse=True)
+        for killer in reversed(self.killers.get(depth, ())):
+            if killer in moves:
+                ordered.remove(killer)
+                ordered.insert(0, killer)
+        if best_move is not None and best_move in moves:
+            ordered.remove(best_move)
+            ordered.insert(0, best_move)
+        return ordered
+
+    def record_cutoff(self, move, depth, player, remaining_depth, index):
+        """Updates the killer moves and history table after `move` (tried `index`-th) caused a cutoff."""
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        killers = self.killers.setdefault(depth, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[self.killers_per_ply:]
+        key = (player, move)
+        self.history[key] = self.history.get(key, 0) + remaining_depth * remaining_depth
+
+    def clear(self):
+        """Forgets the killer moves, history and statistics (e.g. when a new game starts)."""
+        self.killers.clear()
+        self.history.clear()
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def stats(self):
+        return {'cutoffs': self.cutoffs,
+                'first_move_cutoffs': self.first_move_cutoffs,
+                'first_move_cutoff_rate': self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0}
+
+
+class SearchStats:
+    """Counters and timings of `alphabeta_search`, recorded when passed as its `stats` argument.
+
+    The following are recorded:
+    *  Nodes visited (including the nodes of an endgame solve, also counted on their
+       own), leaf evaluations, beta cutoffs and the rate of cutoffs produced by the
+       first move tried;
+    *  Time spent making moves (`result`, or `make_move` and `undo_move`, which generate
+       the valid moves of the new state) and evaluating positions (the evaluation
+       function). Each is timed where the search calls it, so neither includes the other
+       and the game itself is left untouched;
+    *  The depth, nodes, time, best move and value of every completed iteration,
+       which are also passed to `callback` (if given) as soon as the iteration ends.
+    The search does no extra work when no `SearchStats` is given.
+    """
+
+    # Timings recorded in `method_time`
+    timed_methods = ('make_move', 'evaluation')
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.clear()
+
+    def clear(self):
+        self.nodes = 0
+        self.endgame_nodes = 0
+        self.leaf_evaluations = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.elapsed = 0.0
+        self.method_time = dict.fromkeys(self.timed_methods, 0.0)
+        self.iterations = []
+
+    def record_cutoff(self, index):
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+
+    def record_iteration(self, depth, nodes, elapsed, best_move, value):
+        iteration = {'depth': depth, 'nodes': nodes, 'time': elapsed, 'best_move': best_move, 'value': value}
+        self.iterations.append(iteration)
+        if self.callback is not None:
+            self.callback(iteration)
+
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def effective_branching_factor(self):
+        """Returns the growth in nodes between the last two iterations, or the depth-th root
+        of the nodes searched if there was a single iteration."""
+        if len(self.iterations) >= 2 and self.iterations[-2]['nodes']:
+            return self.iterations[-1]['nodes'] / self.iterations[-2]['nodes']
+        if self.iterations and self.iterations[-1]['depth'] > 0:
+            return self.iterations[-1]['nodes'] ** (1 / self.iterations[-1]['depth'])
+        return 0.0
+
+    def to_dict(self):
+        return {'nodes': self.nodes,
+                'endgame_nodes': self.endgame_nodes,
+                'leaf_evaluations': self.leaf_evaluations,
+                'cutoffs': self.cutoffs,
+                'first_move_cutoff_rate': self.first_move_cutoff_rate(),
+                'effective_branching_factor': self.effective_branching_factor(),
+                'time': self.elapsed,
+                'nodes_per_second': self.nodes / self.elapsed if self.elapsed else 0.0,
+                'method_time': dict(self.method_time),
+                'iterations': list(self.iterations)}
+
+    def write_jsonl(self, stream):
+        """Writes the stats of the search as one JSON line to an open text file."""
+        import json     # Only imported when needed, to keep `import search` fast for command line use
+
+        stream.write(json.dumps(self.to_dict()) + '\n')
+
+
+def alphabeta_search(self, state, game, d=4, cutoff_test=None, eval_fn=None, time_limit=None,
+                     table=None, ordering=None, make_unmake=False, root_actions=None, scores=None,
+                     alpha=float('-infinity'), stop_event=None, endgame=None, stats=None,
+                     algorithm='alphabeta'):
     """Search the game space to determine the best action.
 
     The game tree is searched using alpha-beta pruning. Moves are selected
     using an evaluation function and a set of heuristics.
     Credit: [AIMA Chapter 6: Games, or Adversarial Search (`games.py`).]
+
+    If `time_limit` (in seconds) is given, the search is run as iterative deepening:
+    depths 1, 2, ..., d are searched in turn, each iteration trying the best moves
+    of the previous one first, and the best move of the last completed iteration is
+    returned once the time limit has been reached.
+
+    If a `TranspositionTable` is given as `table`, the value bounds and best move of
+    every searched position are stored in it under the state's Zobrist `key`. Positions
+    found in the table are cut off or have their window narrowed, and their stored best
+    move is tried first. The table can be passed to successive searches of the same side.
+
+    If a `MoveOrderer` is given as `ordering`, it sorts the moves of every node (with the
+    stored best move first) and records the cutoffs they produce.
+
+    If `make_unmake` is True, a single `MutableState` is updated in place along the
+    searched line with `game.make_move` and `game.undo_move` instead of creating a
+    new state with `game.result` for every node.
+
+    The root can be restricted to the moves in `root_actions` (searched in that order)
+    and given a lower bound `alpha`: moves that cannot do better than `alpha` are only
+    given an upper bound. If a `scores` dict is given, it is filled with the value of
+    each root move (of the last completed iteration when iterative deepening).
+
+    The search is cancelled as soon as `stop_event` (a `threading.Event`) is set, in which
+    case the best move found so far is returned. If `self` is given, its `update_progress`
+    method is called after each root move with the fraction of the search done, the
+    current depth and the number of nodes searched so far.
+
+    If an `EndgameSolver` is given as `endgame`, positions with few enough empty squares
+    are solved exactly to the end of the game instead. Under a time limit, the solve is
+    given `ENDGAME_SHARE` of it and the search falls back on iterative deepening for the
+    rest if the solve does not finish; setting `stop_event` cancels both.
+
+    If a `SearchStats` is given as `stats`, it is cleared and filled with the node counts,
+    cutoffs and timings of the search.
+
+    The `algorithm` searching the tree is one of:
+    *  'alphabeta': full-window alpha-beta (default);
+    *  'pvs':       principal variation search (NegaScout), which searches the first move
+                    of every node with the full window and the others with a null window,
+                    re-searching them only if they turn out to be better;
+    *  'mtdf':      MTD(f), which finds the value of the root with a series of null-window
+                    searches from a first guess (the value of the previous iteration),
+                    using the transposition table (a new one if `table` is None) as memory.
+                    `root_actions` and `alpha` are not supported, `scores` only gets the
+                    value of the best move, and moves of equal value may be chosen differently.
+    `pvs_search` and `mtdf_search` are shorthands for the last two.
     """
 
     player = game.to_move(state)
+    start_time = time.time()
+    deadline = None if time_limit is None else start_time + time_limit
+    nodes = 0
+
+    def should_stop():
+        return (deadline is not None and time.time() > deadline) or \
+               (stop_event is not None and stop_event.is_set())
+
+    def probe(state, alpha, beta, depth):
+        """Returns (value, alpha, beta, best move) using the table entry of a state, if any."""
+        entry = table.lookup(state.key)
+        if entry is None:
+            return None, alpha, beta, None
+        if entry.depth >= depth_limit - depth:
+            if entry.flag == EXACT:
+                return entry.value, alpha, beta, entry.move
+            elif entry.flag == LOWERBOUND:
+                alpha = max(alpha, entry.value)
+            else:
+                beta = min(beta, entry.value)
+            if alpha >= beta:
+                return entry.value, alpha, beta, entry.move
+        return None, alpha, beta, entry.move
+
+    def ordered_actions(state, depth, best_move):
+        """Returns the actions of a state in the order they should be searched."""
+        actions = game.actions(state)
+        if ordering is not None:
+            return ordering.order(actions, depth, state.to_move, best_move)
+        if best_move is None or best_move not in actions:
+            return actions
+        return [best_move] + [a for a in actions if a != best_move]
+
+    def store(state, v, alpha, beta, depth, best_move):
+        flag = UPPERBOUND if v <= alpha else LOWERBOUND if v >= beta else EXACT
+        table.store(state.key, depth_limit - depth, v, flag, best_move)
+
+    def child_value(value_fn, state, a, alpha, beta, depth):
+        """Returns the value of the state that results from making move `a`."""
+        if not make_unmake:
+            return value_fn(game.result(state, a), alpha, beta, depth)
+        game.make_move(a, state)
+        try:
+            return value_fn(state, alpha, beta, depth)
+        finally:
+            game.undo_move(state)
+
     def max_value(state, alpha, beta, depth):
+        nonlocal nodes
+        nodes += 1
+        if can_stop and should_stop():
+            raise SearchTimeout
         if cutoff_test(state, depth):
             return eval_fn(state)
+        best_move = None
+        if table is not None:
+            v, alpha, beta, best_move = probe(state, alpha, beta, depth)
+            if v is not None:
+                return v
+        window = (alpha, beta)
         v = float('-infinity')
-        for a in game.actions(state):
-            v = max(v, min_value(game.result(state, a), alpha, beta, depth+1))
+        for i, a in enumerate(ordered_actions(state, depth, best_move)):
+            if pvs and i > 0:
+                child_v = child_value(min_value, state, a, alpha, math.nextafter(alpha, beta), depth+1)
+                if alpha < child_v < beta:
+                    child_v = child_value(min_value, state, a, alpha, beta, depth+1)
+            else:
+                child_v = child_value(min_value, state, a, alpha, beta, depth+1)
+            if child_v > v:
+                v = child_v
+                best_move = a
             if v >= beta:
-                return v
+                if ordering is not None:
+                    ordering.record_cutoff(a, depth, state.to_move, depth_limit - depth, i)
+                if stats is not None:
+                    stats.record_cutoff(i)
+                break
             alpha = max(alpha, v)
+        if table is not None:
+            store(state, v, *window, depth, best_move)
         return v
 
     def min_value(state, alpha, beta, depth):
+        nonlocal nodes
+        nodes += 1
+        if can_stop and should_stop():
+            raise SearchTimeout
         if cutoff_test(state, depth):
             return eval_fn(state)
+        best_move = None
+        if table is not None:
+            v, alpha, beta, best_move = probe(state, alpha, beta, depth)
+            if v is not None:
+                return v
+        window = (alpha, beta)
         v = float('infinity')
-        for a in game.actions(state):
-            v = min(v, max_value(game.result(state, a), alpha, beta, depth+1))
+        for i, a in enumerate(ordered_actions(state, depth, best_move)):
+            if pvs and i > 0:
+                child_v = child_value(max_value, state, a, math.nextafter(beta, alpha), beta, depth+1)
+                if alpha < child_v < beta:
+                    child_v = child_value(max_value, state, a, alpha, beta, depth+1)
+            else:
+                child_v = child_value(max_value, state, a, alpha, beta, depth+1)
+            if child_v < v:
+                v = child_v
+                best_move = a
             if v <= alpha:
-                return v
+                if ordering is not None:
+                    ordering.record_cutoff(a, depth, state.to_move, depth_limit - depth, i)
+                if stats is not None:
+                    stats.record_cutoff(i)
+                break
             beta = min(beta, v)
+        if table is not None:
+            store(state, v, *window, depth, best_move)
         return v
+
+    def report_progress(fraction):
+        """Passes the progress of the search (`fraction` of the current depth, or of the time limit) to `self`."""
+        if self is not None:
+            if deadline is not None:
+                fraction = min(1.0, (time.time() - start_time) / time_limit)
+            self.update_progress(fraction, depth_limit, nodes)
+
+    def mtdf_root(guess, scores):
+        """Converges on the value of the root with null-window searches, starting from `guess`."""
+        g = guess
+        lower, upper = float('-infinity'), float('infinity')
+        best_a = None
+        while lower < upper:
+            beta = g if g != lower else math.nextafter(g, math.inf)
+            g = max_value(state, math.nextafter(beta, -math.inf), beta, 0)
+            if g < beta:
+                upper = g
+            else:
+                lower = g
+                # A fail-high pass has found a move at least as good as the root value
+                entry = table.lookup(state.key)
+                if entry is not None and entry.move in actions:
+                    best_a = entry.move
+            report_progress(1.0 if lower >= upper else 0.5)
+        if best_a is not None:
+            scores[best_a] = g
+        return best_a
+
+    def root_search(actions, scores):
+        """Searches each root move in turn, recording its value in `scores`."""
+        best_v = float('-infinity')
+        best_a = None
+        for i, a in enumerate(actions):
+            window_alpha = max(best_v, alpha)
+            if pvs and i > 0:
+                v = child_value(min_value, state, a, window_alpha, math.nextafter(window_alpha, math.inf), 1)
+                if v > window_alpha:
+                    v = child_value(min_value, state, a, window_alpha, float('infinity'), 1)
+            else:
+                v = child_value(min_value, state, a, window_alpha, float('infinity'), 1)
+            scores[a] = v
+            if v > best_v:
+                best_v = v
+                best_a = a
+            report_progress((i + 1) / len(actions))
+        if table is not None and best_a is not None and best_v > alpha and root_actions is None:
+            table.store(state.key, depth_limit, best_v, EXACT, best_a)
+        return best_a
+
     # Body of alphabeta_search starts here:
+    if algorithm not in SEARCH_ALGORITHMS:
+        raise ValueError("Unknown search algorithm: %r" % algorithm)
+    pvs = algorithm == 'pvs'
+    if algorithm == 'mtdf':
+        if root_actions is not None:
+            raise ValueError("MTD(f) searches every root move")
+        if table is None:
+            table = TranspositionTable()
     # The default test cuts off at depth d or at a terminal state
-    cutoff_test = (cutoff_test or
-                  (lambda state, depth: depth > d or game.terminal_test(state)))
+    depth_limit = d
+    if cutoff_test is None:
+        cutoff_test = lambda state, depth: depth > depth_limit or game.terminal_test(state)
+    elif deadline is not None:
+        # Iterative deepening needs to control the depth of a custom test as well
+        custom_cutoff = cutoff_test
+        cutoff_test = lambda state, depth: depth > depth_limit or custom_cutoff(state, depth)
     eval_fn = eval_fn or (lambda state: game.utility(state, player))
-    best_v = float('-infinity')
+    if stats is not None:
+        stats.clear()
+        method_time = stats.method_time
+        leaf_eval_fn = eval_fn
+
+        def eval_fn(state):
+            stats.leaf_evaluations += 1
+            eval_start = time.perf_counter()
+            try:
+                return leaf_eval_fn(state)
+            finally:
+                method_time['evaluation'] += time.perf_counter() - eval_start
+
+        def child_value(value_fn, state, a, alpha, beta, depth):
+            """The `child_value` above, also timing the moves made."""
+            move_start = time.perf_counter()
+            if not make_unmake:
+                child = game.result(state, a)
+                method_time['make_move'] += time.perf_counter() - move_start
+                return value_fn(child, alpha, beta, depth)
+            game.make_move(a, state)
+            method_time['make_move'] += time.perf_counter() - move_start
+            try:
+                return value_fn(state, alpha, beta, depth)
+            finally:
+                move_start = time.perf_counter()
+                game.undo_move(state)
+                method_time['make_move'] += time.perf_counter() - move_start
+    if make_unmake:
+        state = MutableState(state)
+    actions = list(game.actions(state) if root_actions is None else root_actions)
+    if table is not None:
+        # Try the best move of an earlier search of this position first
+        entry = table.lookup(state.key)
+        if entry is not None and entry.move in actions:
+            actions.remove(entry.move)
+            actions.insert(0, entry.move)
+    if scores is None:
+        scores = {}
+    can_stop = deadline is not None or stop_event is not None
     best_a = None
-    start_time = time.time()
-    # TODO: Cut off search after time limit
-    # while time.time() < start_time + TIME_LIMIT:
-    for a in game.actions(state):
-        # TODO: Update progress bar
-        # self.update_progress(time.time())
-        v = min_value(state=state, alpha=float('-infinity'), beta=float('infinity'), depth=0)
-        if v > best_v:
-            best_v = v
-            best_a = a
+    try:
+        if endgame is not None and root_actions is None and endgame.applies(state):
+            solve_deadline = None if deadline is None else start_time + ENDGAME_SHARE * time_limit
+
+            def should_stop_solve():
+                return (solve_deadline is not None and time.time() > solve_deadline) or \
+                       (stop_event is not None and stop_event.is_set())
+            try:
+                solved_a, _ = endgame.solve(state, should_stop_solve if can_stop else None)
+            except SearchTimeout:
+                solved_a = None
+            finally:
+                if stats is not None:
+                    stats.endgame_nodes = endgame.nodes
+            if solved_a in actions:
+                return solved_a
+        if deadline is None:
+            depth_limits = [d]
+        else:
+            # Iterative deepening: searching deeper than the number of empty squares changes nothing
+            empty_squares = game.height * game.width - len(state.board)
+            depth_limits = range(1, max(1, min(d, empty_squares)) + 1)
+        for depth_limit in depth_limits:
+            iteration_scores = {}
+            iteration_start, iteration_nodes = time.time(), nodes
+            try:
+                if algorithm == 'mtdf':
+                    best_a = mtdf_root(scores.get(best_a, 0), iteration_scores) or best_a
+                else:
+                    best_a = root_search(actions, iteration_scores)
+            except SearchTimeout:
+                if best_a is None and iteration_scores:
+                    # No iteration completed, fall back on the best fully searched root move
+                    best_a = max(iteration_scores, key=iteration_scores.get)
+                break
+            scores.clear()
+            scores.update(iteration_scores)
+            if stats is not None:
+                stats.record_iteration(depth_limit, nodes - iteration_nodes, time.time() - iteration_start,
+                                       best_a, scores.get(best_a))
+            # Order the next iteration using the values found in this one
+            actions.sort(key=lambda a: scores.get(a, float('-infinity')), reverse=True)
+    finally:
+        if stats is not None:
+            stats.nodes = nodes + stats.endgame_nodes
+            stats.elapsed = time.time() - start_time
+    if best_a is None and actions:
+        best_a = actions[0]
     return best_a
+
+
+def pvs_search(self, state, game, d=4, **kwargs):
+    """Principal variation search, see `alphabeta_search`."""
+    return alphabeta_search(self, state, game, d, algorithm='pvs', **kwargs)
+
+
+def mtdf_search(self, state, game, d=4, **kwargs):
+    """MTD(f) search, see `alphabeta_search`."""
+    return alphabeta_search(self, state, game, d, algorithm='mtdf', **kwargs)
+
+
+# Search functions by algorithm, all called like `alphabeta_search`
+SEARCH_ALGORITHMS = {'alphabeta': alphabeta_search, 'pvs': pvs_search, 'mtdf': mtdf_search}
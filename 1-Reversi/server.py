@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+from collections import deque
+import itertools
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from book import OpeningBook
+from endgame import EndgameSolver
+from game import Reversi
+from mcts import MCTS
+from parallel_search import decode_game
+from parallel_search import encode_game
+from patterns import PatternEvaluator
+import search
+
+
+DEFAULT_PORT = 7777
+AI_TIME_LIMIT = 1.0     # Time limit (in seconds) of the Hard difficulty searches
+MAX_LINE = 2 ** 16      # Longest request line accepted
+MAX_SAMPLES = 100000    # Latencies kept for the percentiles (the most recent ones)
+MIN_SIZE, MAX_SIZE = 4, 16  # Board sizes accepted for new games
+
+# Opened in each worker process on the first Hard move
+opening_book = None
+
+
+def ai_move(encoded_game, encoded_state, time_limit=AI_TIME_LIMIT):
+    """Returns the move of the computer opponent (run in a worker process).
+
+    The difficulties play as in `environment.py`: Medium searches 2 plies, Hard consults
+    the opening book then runs a time-limited pattern search with the endgame solver,
+    and MCTS runs Monte Carlo Tree Search for the time limit (without tree reuse, as the
+    moves of a game may be searched by different workers).
+    """
+    global opening_book
+    game = decode_game(encoded_game)
+    state = game.decode_state(encoded_state)
+    if game.opponent_difficulty == 2:
+        return search.alphabeta_search(None, state, game, d=2,
+                                       ordering=search.MoveOrderer(height=game.height, width=game.width),
+                                       make_unmake=True)
+    if game.opponent_difficulty == 4:
+        return MCTS(game, time_limit=time_limit).search(state)
+    if opening_book is None:
+        opening_book = OpeningBook.open_default() or False
+    if opening_book and opening_book.covers(game):
+        book_move = opening_book.lookup(state)
+        if book_move is not None:
+            return book_move
+    evaluator = PatternEvaluator(game.height, game.width)
+    return search.alphabeta_search(None, state, game, d=game.height * game.width,
+                                   eval_fn=evaluator.eval_fn(game, state.to_move), time_limit=time_limit,
+                                   ordering=search.MoveOrderer(height=game.height, width=game.width),
+                                   make_unmake=True, endgame=EndgameSolver(game))
+
+
+def percentiles(samples, points=(50, 90, 99)):
+    """Returns {'p50': ..., ...} of the samples (nearest-rank), or an empty dict without samples."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {'p%d' % point: ordered[min(len(ordered) - 1, max(0, -(-point * len(ordered) // 100) - 1))]
+            for point in points}
+
+
+class Session:
+    """A game hosted by the server: the `Reversi` game, its current state and the moves played."""
+
+    def __init__(self, game, opponent):
+        self.game = game
+        self.opponent = opponent
+        self.state = game.initial
+        self.moves = []
+        self.lock = asyncio.Lock()
+
+    def play(self, move):
+        """Plays a move (as `environment.py` does), raising ValueError if it is not valid."""
+        if move not in self.state.moves:
+            raise ValueError("Invalid move %s" % (move,))
+        self.game.moves_made += 1
+        self.state = self.game.result(self.state, move)
+        self.moves.append(move)
+
+    def over(self):
+        return self.game.terminal_test(self.state)
+
+    def to_dict(self):
+        board = self.state.board
+        score = self.game.calc_score(board)
+        return {'to_move': self.state.to_move,
+                'board': [''.join(board.get((x, y), '.') for y in range(1, self.game.width + 1))
+                          for x in range(1, self.game.height + 1)],
+                'moves': [list(move) for move in self.state.moves],
+                'score': score,
+                'over': self.over()}
+
+
+class GameServer:
+    """Hosts many concurrent headless games over a JSON-lines protocol.
+
+    Each request is a JSON object on one line, answered by one line:
+    *  {"op": "new", "othello": true, "side": "X", "opponent": "computer", "difficulty": 2, "size": 8}
+       (difficulty 1 to 4: Easy, Medium, Hard, MCTS) starts a game (the computer moves first if the player chose White) and returns its id;
+    *  {"op": "move", "game": id, "move": [x, y]} plays a move, then the computer's reply;
+    *  {"op": "state", "game": id}, {"op": "close", "game": id} and {"op": "stats"}.
+    Responses are {"ok": true, ...} with the game state, or {"ok": false, "error": message}.
+    Board sizes range from `MIN_SIZE` to `MAX_SIZE`.
+
+    Moves are validated against the state's valid moves and played with `Reversi.result`.
+    The computer's searches run in a pool of `workers` processes, with at most
+    `max_pending` searches queued, so the event loop never blocks on `alphabeta_search`.
+    """
+
+    def __init__(self, workers=None, max_pending=None, time_limit=AI_TIME_LIMIT, executor=None):
+        self.executor = executor if executor is not None else ProcessPoolExecutor(max_workers=workers)
+        self.pending = asyncio.Semaphore(max_pending or 2 * (workers or 4))
+        self.time_limit = time_limit
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        self.rng = random.Random()
+        self.latencies = deque(maxlen=MAX_SAMPLES)
+        self.ai_latencies = deque(maxlen=MAX_SAMPLES)
+        self.games_finished = 0
+        self.start_time = time.time()
+
+    async def computer_move(self, session):
+        """Plays the computer's move, searched in the worker pool."""
+        game, state = session.game, session.state
+        start_time = time.time()
+        if game.opponent_difficulty == 1:
+            move = self.rng.choice(state.moves)
+        else:
+            async with self.pending:
+                move = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, ai_move, encode_game(game), game.encode_state(state), self.time_limit)
+        self.ai_latencies.append(time.time() - start_time)
+        session.play(move)
+        return move
+
+    async def new_game(self, request):
+        size = int(request.get('size', 8))
+        if not MIN_SIZE <= size <= MAX_SIZE:
+            raise ValueError("The board size must be between %d and %d" % (MIN_SIZE, MAX_SIZE))
+        opponent = request.get('opponent', 'computer')
+        game = Reversi(is_othello=request.get('othello', True), player_side=request.get('side', 'X'),
+                       opponent_type=opponent, opponent_difficulty=int(request.get('difficulty', 2)),
+                       height=size, width=size, backend='packed')
+        if opponent == 'computer' and game.opponent_difficulty not in (1, 2, 3, 4):
+            raise ValueError("Unknown difficulty %r" % game.opponent_difficulty)
+        session = Session(game, opponent)
+        session_id = next(self.ids)
+        self.sessions[session_id] = session
+        response = {'game': session_id}
+        if opponent == 'computer' and session.state.to_move != game.player_side:
+            async with session.lock:
+                response['computer_move'] = list(await self.computer_move(session))
+        return response, session
+
+    async def play_move(self, session, request):
+        async with session.lock:
+            session.play(tuple(request['move']))
+            response = {}
+            if session.opponent == 'computer' and not session.over():
+                response['computer_move'] = list(await self.computer_move(session))
+        if session.over():
+            self.games_finished += 1
+        return response
+
+    async def handle(self, request):
+        """Returns the response to one request."""
+        if not isinstance(request, dict):
+            raise ValueError("Requests must be JSON objects")
+        op = request.get('op')
+        if op == 'stats':
+            return dict(ok=True, **self.stats())
+        if op == 'new':
+            response, session = await self.new_game(request)
+        else:
+            session_id = request.get('game')
+            session = self.sessions.get(session_id)
+            if session is None:
+                raise ValueError("Unknown game %r" % session_id)
+            if op == 'move':
+                response = await self.play_move(session, request)
+            elif op == 'state':
+                response = {}
+            elif op == 'close':
+                del self.sessions[session_id]
+                return {'ok': True}
+            else:
+                raise ValueError("Unknown op %r" % op)
+        return dict(ok=True, state=session.to_dict(), **response)
+
+    async def serve_client(self, reader, writer):
+        """Answers the requests of one connection until it is closed."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                start_time = time.time()
+                try:
+                    response = await self.handle(json.loads(line))
+                except (ValueError, KeyError, TypeError) as error:
+                    response = {'ok': False, 'error': str(error)}
+                self.latencies.append(time.time() - start_time)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        """Starts listening and returns the `asyncio.Server` (port 0 picks a free port)."""
+        self.start_time = time.time()
+        return await asyncio.start_server(self.serve_client, host, port, limit=MAX_LINE)
+
+    def stats(self):
+        """Returns the request and computer move latency percentiles (in ms) and the games finished per second."""
+        elapsed = time.time() - self.start_time
+        return {'games': len(self.sessions),
+                'games_finished': self.games_finished,
+                'games_per_second': self.games_finished / elapsed if elapsed else 0.0,
+                'requests': len(self.latencies),
+                'latency_ms': {point: 1000 * value for point, value in percentiles(self.latencies).items()},
+                'computer_move_ms': {point: 1000 * value for point, value in percentiles(self.ai_latencies).items()}}
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+async def play_client(host, port, games, difficulty=2, size=8, seed=None):
+    """Plays `games` random-move games against the server's computer and returns the move latencies."""
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+
+    async def request(message):
+        writer.write(json.dumps(message).encode() + b'\n')
+        await writer.drain()
+        return json.loads(await reader.readline())
+
+    latencies = []
+    for _ in range(games):
+        response = await request({'op': 'new', 'difficulty': difficulty, 'size': size,
+                                  'side': rng.choice('XO')})
+        game_id, state = response['game'], response['state']
+        while not state['over']:
+            start_time = time.time()
+            response = await request({'op': 'move', 'game': game_id, 'move': rng.choice(state['moves'])})
+            latencies.append(time.time() - start_time)
+            state = response['state']
+        await request({'op': 'close', 'game': game_id})
+    writer.close()
+    await writer.wait_closed()
+    return latencies
+
+
+async def load_test(host, port, clients=8, games=4, difficulty=2, size=8):
+    """Runs `clients` concurrent clients playing `games` games each and returns the throughput report."""
+    start_time = time.time()
+    results = await asyncio.gather(*(play_client(host, port, games, difficulty, size, seed)
+                                     for seed in range(clients)))
+    elapsed = time.time() - start_time
+    latencies = [latency for client_latencies in results for latency in client_latencies]
+    return {'games': clients * games,
+            'seconds': elapsed,
+            'games_per_second': clients * games / elapsed,
+            'moves': len(latencies),
+            'move_ms': {point: 1000 * value for point, value in percentiles(latencies).items()}}
+
+
+async def serve(args):
+    game_server = GameServer(args.workers, time_limit=args.time)
+    server = await game_server.start(args.host, args.port)
+    print("Serving Reversi games on %s:%d" % (args.host, server.sockets[0].getsockname()[1]))
+    try:
+        if args.load_clients:
+            report = await load_test(args.host, server.sockets[0].getsockname()[1], args.load_clients,
+                                     args.load_games, args.difficulty, args.size)
+            print(json.dumps({'load_test': report, 'server': game_server.stats()}, indent=2))
+        else:
+            await server.serve_forever()
+    finally:
+        server.close()
+        game_server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves headless Reversi games over a JSON-lines protocol.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=None, help="search worker processes (default: one per core)")
+    parser.add_argument('--time', type=float, default=AI_TIME_LIMIT, help="time limit of the Hard searches")
+    parser.add_argument('--load-clients', type=int, default=0,
+                        help="run a local load test with this many clients, then exit")
+    parser.add_argument('--load-games', type=int, default=4, help="games per load test client")
+    parser.add_argument('--difficulty', type=int, default=2, help="computer difficulty of the load test games")
+    parser.add_argument('--size', type=int, default=8, help="board size of the load test games")
+    args = parser.parse_args()
+    asyncio.run(serve(args))
+
+
+if __name__ == '__main__':
+    main()
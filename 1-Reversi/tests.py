@@ -1,8 +1,51 @@
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
-from game2 import Reversi
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from book import BookBuilder
+from book import OpeningBook
+import benchmark
+from bitboard import BitBoard
+from bitboard import as_bitboard
+from bitboard import popcount
+from endgame import EndgameSolver
+import engine
+from mcts import MCTS
+from eval_cache import EvaluationCache
+import search
+from parallel_search import ParallelSearcher
+from patterns import PatternEvaluator
+import records
+from game import FrontierBoard
+from game import MutableState
+from game import PackedState
+from game import Reversi
+from game import load_weights
+import server
+import tournament
+from transposition import EXACT
+from transposition import LOWERBOUND
+from transposition import TranspositionTable
+from heuristics import ADJACENT_PENALTY
 from heuristics import CornerCaptivity
 from heuristics import CoinParity
 from heuristics import Mobility
+try:
+    import numpy as np
+    import batch_heuristics
+    import tuning
+except ImportError:
+    # NumPy is only needed for batch evaluation and weight tuning
+    np = batch_heuristics = tuning = None
 
 
 class TestCornerHeuristic(unittest.TestCase):
@@ -342,5 +385,1076 @@ class TestMobilityHeuristic(unittest.TestCase):
         self.assertEqual(mobility_score, 0)
 
 
+@unittest.skipIf(batch_heuristics is None, "NumPy is not installed")
+class TestBatchHeuristics(unittest.TestCase):
+
+    def test_batch_matches_heuristics(self):
+        """Evaluates that batch scores equal the heuristics evaluated one board at a time."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard')
+        boards = []
+        for seed in range(5):
+            rng = random.Random(seed)
+            state = game.initial
+            while state.moves:
+                state = game.result(state, rng.choice(state.moves))
+                boards.append(state.board)
+        positions = batch_heuristics.boards_to_array(boards)
+        packed = batch_heuristics.bitboards_to_array([board.black for board in boards],
+                                                     [board.white for board in boards])
+        self.assertTrue((positions == packed).all())
+        for player in ('X', 'O'):
+            scores = batch_heuristics.heuristic_scores(positions, player)
+            for board, (corner, mobility, parity) in zip(boards, scores):
+                self.assertEqual(corner, CornerCaptivity().get_score(board, player))
+                self.assertAlmostEqual(mobility, Mobility().get_score(game, board, player))
+                self.assertAlmostEqual(parity, CoinParity().get_score(board, player))
+
+    def test_larger_board(self):
+        """Evaluates that batch scores of larger boards use the corners and squares of the board size."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, height=10, width=10)
+        rng = random.Random(4)
+        state = game.initial
+        boards = []
+        while state.moves:
+            state = game.result(state, rng.choice(state.moves))
+            boards.append(state.board)
+        for player in ('X', 'O'):
+            scores = batch_heuristics.heuristic_scores(boards, player, height=10, width=10)
+            for board, (corner, mobility, parity) in zip(boards, scores):
+                self.assertEqual(corner, CornerCaptivity(10, 10).get_score(board, player))
+                self.assertAlmostEqual(mobility, Mobility().get_score(game, board, player))
+                self.assertAlmostEqual(parity, CoinParity().get_score(board, player))
+            self.assertEqual(len(batch_heuristics.utility_scores(boards, player, height=10, width=10)), len(boards))
+
+
+@unittest.skipIf(tuning is None, "NumPy is not installed")
+class TestTuning(unittest.TestCase):
+
+    def test_self_play_features(self):
+        """Evaluates that the batch features match the heuristics of the player who has just moved."""
+        black, white, movers, results = tuning.self_play(seed=1, games=3)
+        self.assertEqual(len({len(black), len(white), len(movers), len(results)}), 1)
+        features = tuning.extract_features(black, white, movers)
+        game = Reversi(is_othello=True, backend='bitboard')
+        for b, w, mover, (corners, adjacent, mobility, parity) in zip(black, white, movers, features):
+            board = BitBoard(int(b), int(w))
+            player = 'X' if mover == 1 else 'O'
+            self.assertAlmostEqual(mobility, Mobility().get_score(game, board, player))
+            self.assertAlmostEqual(parity, CoinParity().get_score(board, player))
+            self.assertAlmostEqual(25 * corners - 0.25 * ADJACENT_PENALTY * adjacent,
+                                   CornerCaptivity().get_score(board, player), delta=2)
+
+    def test_record_positions(self):
+        """Evaluates that recorded games are replayed into position arrays in chunks."""
+        record, states = TestGameRecords.random_game(5)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'games.rvgr')
+            with records.GameRecordWriter(path) as writer:
+                writer.write(record)
+                writer.write(record)
+            chunks = list(tuning.record_positions(path, chunk_size=len(record.moves)))
+        self.assertEqual(len(chunks), 2)
+        black, white, movers, results = chunks[0]
+        self.assertEqual(list(black), [state.board.black for state in states[1:]])
+        self.assertEqual(list(movers), [1 if state.to_move == 'X' else -1 for state in states[:-1]])
+        self.assertTrue((results == record.result).all())
+
+    def test_fit_weights(self):
+        """Evaluates that known weights are recovered from noiseless labels."""
+        rng = np.random.default_rng(0)
+        features = rng.normal(size=(1000, 4))
+        weights = np.array([0.7 * 25, -0.7 * 0.25 * 20.0, 0.2, 0.1])
+        discs = rng.integers(5, 65, size=1000)
+        phases = tuning.fit_weights(features, features @ weights, discs, phase_discs=(64,))
+        self.assertEqual(phases[0]['max_discs'], 64)
+        np.testing.assert_allclose(phases[0]['weights'], [0.7, 0.2, 0.1])
+        self.assertAlmostEqual(phases[0]['adjacent_penalty'], 20.0)
+        logistic = tuning.fit_weights(features, features @ weights, discs, phase_discs=(64,), method='logistic')
+        self.assertGreater(logistic[0]['weights'][0], 0)
+
+    def test_weight_file(self):
+        """Evaluates that compute_utility uses the weights of the game phase loaded from a weight file."""
+        phases = [{'max_discs': 64, 'weights': [0.7, 0.2, 0.1], 'adjacent_penalty': 33.33}]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'weights.json')
+            tuning.write_weights(path, phases)
+            weights = load_weights(path)
+        self.assertEqual(weights, ((64, 0.7, 0.2, 0.1, 33.33),))
+        default_game = Reversi(is_othello=True, opponent_difficulty=3)
+        tuned_game = Reversi(is_othello=True, opponent_difficulty=3, weights=weights)
+        state = default_game.result(default_game.initial, default_game.initial.moves[0])
+        self.assertEqual(tuned_game.utility(state, 'X'), default_game.utility(state, 'X'))
+        coin_game = Reversi(is_othello=True, opponent_difficulty=3, weights=((10, 0, 0, 1, 0), (64, 0, 0, 0, 0)))
+        self.assertEqual(coin_game.utility(state, 'X'), CoinParity().get_score(state.board, 'X'))
+
+
+class TestGameRecords(unittest.TestCase):
+
+    @staticmethod
+    def random_game(seed, is_othello=True, size=8, player_side='X'):
+        """Plays a random game and returns its `GameRecord` and states."""
+        rng = random.Random(seed)
+        game = Reversi(is_othello=is_othello, player_side=player_side, height=size, width=size, backend='bitboard')
+        state = game.initial
+        states, moves = [state], []
+        while state.moves:
+            move = rng.choice(state.moves)
+            moves.append(move)
+            game.moves_made += 1
+            state = game.result(state, move)
+            states.append(state)
+        return records.record_game(game, moves), states
+
+    def test_round_trip(self):
+        """Evaluates that games are written one byte per move and read back identical."""
+        games = [self.random_game(0), self.random_game(1, is_othello=False, player_side='O'),
+                 self.random_game(2, size=10)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'games.rvgr')
+            with records.GameRecordWriter(path) as writer:
+                writer.write(games[0][0])
+            with records.GameRecordWriter(path) as writer:
+                writer.write(games[1][0])
+                writer.write(games[2][0])
+            expected_size = records.HEADER.size + sum(records.GAME.size + len(record.moves) for record, _ in games)
+            self.assertEqual(os.path.getsize(path), expected_size)
+            self.assertEqual(list(records.read_records(path)), [record for record, _ in games])
+            # A truncated last game is skipped
+            with open(path, 'r+b') as record_file:
+                record_file.truncate(expected_size - 1)
+            self.assertEqual(len(list(records.read_records(path))), 2)
+            self.assertRaises(ValueError, records.GameRecordWriter(path).write,
+                              games[0][0]._replace(height=20, width=20))
+
+    def test_replay(self):
+        """Evaluates that replaying a record reproduces the states of the game."""
+        for record, states in (self.random_game(3), self.random_game(4, is_othello=False)):
+            replayed = list(records.replay(record, backend='dict'))
+            self.assertEqual([state.board for state in replayed], [state.board.to_dict() for state in states])
+            self.assertEqual(replayed[-1].moves, [])
+            positions = list(records.replay_bitboards(record))
+            self.assertEqual([(black, white) for black, white, _ in positions],
+                             [(state.board.black, state.board.white) for state in states[1:]])
+            self.assertEqual([mover for _, _, mover in positions], [state.to_move for state in states[:-1]])
+        illegal = record._replace(moves=((1, 1),))
+        self.assertRaises(ValueError, list, records.replay(illegal))
+
+
+class TestLazyUtility(unittest.TestCase):
+
+    def test_utility_deferred(self):
+        """Evaluates that result() defers evaluation until the utility is read."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard')
+        rng = random.Random(2)
+        state = game.initial
+        for _ in range(8):
+            state = game.result(state, rng.choice(state.moves))
+        self.assertIsNone(state.utility)
+        # The last move was made by the opponent of the player to move
+        expected = game.compute_utility(state.board, state.moves, 'O' if state.to_move == 'X' else 'X')
+        self.assertEqual(game.utility(state, 'X'), expected)
+        self.assertEqual(game.utility(state, 'O'), -expected)
+
+    def test_mobility_reuses_moves(self):
+        """Evaluates the same mobility score when the opponent's moves are passed in."""
+        game = Reversi(is_othello=True, opponent_difficulty=3)
+        state = game.result(game.initial, game.initial.moves[0])
+        mobility = Mobility()
+        self.assertEqual(mobility.get_score(game, state.board, 'X'),
+                         mobility.get_score(game, state.board, 'X', opponent_moves=state.moves))
+
+
+class TestBitboardBackend(unittest.TestCase):
+
+    def play_random_games(self, is_othello, games=20, backend='bitboard', height=8, width=8):
+        """Plays random games with both backends and checks moves and boards stay identical."""
+        for seed in range(games):
+            rng = random.Random(seed)
+            dict_game = Reversi(is_othello=is_othello, backend='dict', height=height, width=width)
+            bit_game = Reversi(is_othello=is_othello, backend=backend, height=height, width=width)
+            dict_state, bit_state = dict_game.initial, bit_game.initial
+            while dict_state.moves:
+                self.assertEqual(dict_state.moves, bit_state.moves)
+                move = rng.choice(dict_state.moves)
+                dict_state = dict_game.result(dict_state, move)
+                bit_state = bit_game.result(bit_state, move)
+                self.assertEqual(dict_state.board, bit_state.board.to_dict())
+                self.assertEqual(dict_state.utility, bit_state.utility)
+            self.assertEqual(bit_state.moves, [])
+
+    def test_othello_games(self):
+        """Evaluates identical legal moves and results for Othello games."""
+        self.play_random_games(is_othello=True)
+
+    def test_classic_games(self):
+        """Evaluates identical legal moves and results for classic Reversi games."""
+        self.play_random_games(is_othello=False)
+
+    def test_packed_games(self):
+        """Evaluates identical legal moves and results with packed states."""
+        self.play_random_games(is_othello=True, games=10, backend='packed')
+        self.play_random_games(is_othello=False, games=10, backend='packed')
+
+    def test_packed_state_conversion(self):
+        """Evaluates that a packed state converts to and from the dict form."""
+        dict_game = Reversi(is_othello=True, backend='dict')
+        packed_game = Reversi(is_othello=True, backend='packed')
+        state = dict_game.result(dict_game.initial, (3, 4))
+        packed = packed_game.result(packed_game.initial, (3, 4))
+        self.assertIsInstance(packed, PackedState)
+        self.assertEqual(PackedState.from_state(state), packed)
+        self.assertEqual(packed.to_game_state(), state)
+        self.assertEqual(packed.key, state.key)
+        self.assertIs(packed_game.result(packed, (1, 1)), packed)
+        self.assertEqual(search.alphabeta_search(None, packed, packed_game, d=3, make_unmake=True),
+                         search.alphabeta_search(None, state, dict_game, d=3))
+
+    def test_mapping_interface(self):
+        """Evaluates that the bitboard can be read like the dict board."""
+        game = Reversi(is_othello=True, backend='bitboard')
+        board = game.initial.board
+        self.assertEqual(len(board), 4)
+        self.assertEqual(board.get((4, 5)), 'X')
+        self.assertEqual(board.get((4, 4)), 'O')
+        self.assertIsNone(board.get((1, 1)))
+        self.assertIsNone(board.get((0, 9)))
+        self.assertIn((5, 5), board)
+        self.assertEqual(game.calc_score(board), {'X': 2, 'O': 2})
+
+
+class TestFrontierBoard(unittest.TestCase):
+
+    @staticmethod
+    def frontier(board):
+        """Recomputes the frontier of a board from scratch."""
+        return {(x + dx, y + dy) for (x, y) in board for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                if 1 <= x + dx <= 8 and 1 <= y + dy <= 8 and (x + dx, y + dy) not in board}
+
+    def test_incremental_frontier(self):
+        """Evaluates that the frontier stays exact through moves made, undone and copied."""
+        rng = random.Random(7)
+        game = Reversi(is_othello=True, backend='dict')
+        state = game.initial
+        mutable_state = MutableState(state)
+        while state.moves:
+            move = rng.choice(state.moves)
+            state = game.result(state, move)
+            self.assertEqual(state.board.frontier, self.frontier(state.board))
+            game.make_move(move, mutable_state)
+            if mutable_state.moves:
+                # Try a reply and take it back
+                game.make_move(mutable_state.moves[0], mutable_state)
+                self.assertEqual(mutable_state.board.frontier, self.frontier(mutable_state.board))
+                game.undo_move(mutable_state)
+            self.assertEqual(mutable_state.board, state.board)
+            self.assertEqual(mutable_state.board.frontier, state.board.frontier)
+
+    def test_flips_match_flank_opponent(self):
+        """Evaluates that the ray tables flip the same discs as `flank_opponent`."""
+        rng = random.Random(8)
+        game = Reversi(is_othello=True, backend='dict')
+        state = game.initial
+        while state.moves:
+            for move in state.moves:
+                expected = set()
+                for direction in ((0, 1), (1, 0), (1, -1), (1, 1)):
+                    expected.update(Reversi.flank_opponent(state.board, move, state.to_move, direction))
+                self.assertEqual(set(game.valid_move(state.board, move, state.to_move)), expected)
+            state = game.result(state, rng.choice(state.moves))
+
+    def test_plain_dict(self):
+        """Evaluates that plain dict boards are still accepted."""
+        game = Reversi(is_othello=True, backend='dict')
+        board = dict(game.initial.board)
+        self.assertNotIsInstance(board, FrontierBoard)
+        self.assertEqual(game.get_valid_moves(board, 'X'), game.initial.moves)
+
+
+class TestLargerBoards(unittest.TestCase):
+
+    def test_initial_discs(self):
+        """Evaluates that the opening discs and classic opening moves are in the centre of the board."""
+        game = Reversi(is_othello=True, height=10, width=10)
+        self.assertEqual(dict(game.initial.board), {(5, 6): 'X', (6, 5): 'X', (5, 5): 'O', (6, 6): 'O'})
+        self.assertEqual(game.initial.moves, [(4, 5), (5, 4), (6, 7), (7, 6)])
+        classic_game = Reversi(is_othello=False, height=12, width=12)
+        self.assertEqual(classic_game.initial.moves, [(6, 6), (6, 7), (7, 6), (7, 7)])
+        self.assertTrue(classic_game.is_on_board(12, 12))
+        self.assertFalse(classic_game.is_on_board(13, 1))
+
+    def test_backends_agree(self):
+        """Evaluates identical legal moves and results with all backends on 10 x 10 and 12 x 12 boards."""
+        backend_test = TestBitboardBackend()
+        for size in (10, 12):
+            for backend in ('bitboard', 'packed'):
+                backend_test.play_random_games(is_othello=True, games=3, backend=backend, height=size, width=size)
+                backend_test.play_random_games(is_othello=False, games=2, backend=backend, height=size, width=size)
+
+    def test_corners(self):
+        """Evaluates that the corner heuristic and the move ordering use the corners of the board."""
+        corners = CornerCaptivity(10, 10).corners
+        self.assertEqual(corners[(10, 1)], [(9, 1), (10, 2), (9, 2)])
+        self.assertEqual(corners[(10, 10)], [(9, 10), (10, 9), (9, 9)])
+        self.assertEqual(CornerCaptivity().corners, CornerCaptivity.corners)
+        board = {(10, 10): 'X', (1, 2): 'O'}
+        self.assertEqual(CornerCaptivity(10, 10).get_score(board, 'X'), 25 + 8)
+        priorities = search.MoveOrderer(height=10, width=10).priorities
+        self.assertEqual(priorities[(10, 10)], 1)
+        self.assertEqual(priorities[(9, 9)], -1)
+
+    def test_hard_search(self):
+        """Evaluates a Hard search (patterns, endgame solver) on a 10 x 10 board."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, height=10, width=10, backend='packed')
+        state = game.initial
+        for move in ((4, 5), (4, 4), (4, 3)):
+            state = game.result(state, move)
+        evaluator = PatternEvaluator(10, 10)
+        move = search.alphabeta_search(None, state, game, d=3, eval_fn=evaluator.eval_fn(game, state.to_move),
+                                       ordering=search.MoveOrderer(height=10, width=10), make_unmake=True,
+                                       endgame=EndgameSolver(game))
+        self.assertIn(move, state.moves)
+
+
+class TestMakeUnmake(unittest.TestCase):
+
+    def test_make_move_matches_result(self):
+        """Evaluates that make_move gives the same states as result and undo_move restores them."""
+        for backend in ('dict', 'bitboard'):
+            rng = random.Random(5)
+            game = Reversi(is_othello=True, opponent_difficulty=3, backend=backend)
+            state = game.initial
+            mutable_state = MutableState(state)
+            states = [state]
+            while state.moves:
+                move = rng.choice(state.moves)
+                state = game.result(state, move)
+                game.make_move(move, mutable_state)
+                self.assertEqual(mutable_state.to_game_state(), state)
+                states.append(state)
+            for state in reversed(states[:-1]):
+                game.undo_move(mutable_state)
+                self.assertEqual(mutable_state.to_game_state(), state)
+            self.assertEqual(mutable_state.depth, 0)
+
+    def test_make_move_without_key(self):
+        """Evaluates that make_move hashes a state without a key as result does."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, backend='dict')
+        state = game.initial._replace(key=None)
+        move = state.moves[0]
+        mutable_state = game.make_move(move, MutableState(state))
+        self.assertIsNotNone(mutable_state.key)
+        self.assertEqual(mutable_state.key, game.result(state, move).key)
+        game.undo_move(mutable_state)
+        self.assertIsNone(mutable_state.key)
+
+    def test_search_with_make_unmake(self):
+        """Evaluates that searching with make/unmake chooses the same move and leaves the state unchanged."""
+        for backend in ('dict', 'bitboard'):
+            rng = random.Random(6)
+            game = Reversi(is_othello=True, opponent_difficulty=3, backend=backend)
+            state = game.initial
+            for _ in range(16):
+                state = game.result(state, rng.choice(state.moves))
+            board = state.board.copy()
+            self.assertEqual(search.alphabeta_search(None, state, game, d=3),
+                             search.alphabeta_search(None, state, game, d=3, make_unmake=True))
+            self.assertEqual(state.board, board)
+
+
+class TestAlphaBetaSearch(unittest.TestCase):
+
+    def test_root_moves_evaluated(self):
+        """Evaluates that each root move is scored by the state it results in."""
+        player_discs = dict.fromkeys([(1, 1)], 'X')
+        opponent_discs = dict.fromkeys([(1, 2), (2, 1), (3, 1)], 'O')
+        board = {**player_discs, **opponent_discs}
+        game = Reversi(is_othello=False, player_side='X', is_initial=False, board=board, moves_made=4)
+        state = game.initial
+        self.assertEqual(state.moves, [(1, 3), (4, 1)])
+        # Expect (4, 1) since it flips two discs, (1, 3) only one
+        disc_count = lambda state: game.calc_score(state.board)['X']
+        self.assertEqual(search.alphabeta_search(None, state, game, d=0, eval_fn=disc_count), (4, 1))
+
+    def test_iterative_deepening_matches_fixed_depth(self):
+        """Evaluates that iterative deepening with ample time plays the fixed-depth move."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard')
+        state = game.initial
+        for depth in range(1, 4):
+            self.assertEqual(search.alphabeta_search(None, state, game, d=depth),
+                             search.alphabeta_search(None, state, game, d=depth, time_limit=60))
+
+    def test_time_limit(self):
+        """Evaluates that the search returns a legal move once the time limit is reached."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard')
+        state = game.initial
+        start_time = time.time()
+        move = search.alphabeta_search(None, state, game, d=60, time_limit=0.2)
+        self.assertLess(time.time() - start_time, 1)
+        self.assertIn(move, state.moves)
+        self.assertIn(search.alphabeta_search(None, state, game, d=60, time_limit=0), state.moves)
+
+    def test_stop_event(self):
+        """Evaluates that a cancelled search stops and still returns a legal move."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard')
+        state = game.initial
+        stop_event = threading.Event()
+        stop_event.set()
+        self.assertIn(search.alphabeta_search(None, state, game, d=60, stop_event=stop_event), state.moves)
+
+    def test_progress_reported(self):
+        """Evaluates that the search reports its progress after each root move."""
+        class Listener:
+            def __init__(self):
+                self.updates = []
+
+            def update_progress(self, value, depth=None, nodes=None):
+                self.updates.append((value, depth, nodes))
+
+        game = Reversi(is_othello=True, backend='bitboard')
+        listener = Listener()
+        search.alphabeta_search(listener, game.initial, game, d=2)
+        self.assertEqual(len(listener.updates), len(game.initial.moves))
+        self.assertEqual(listener.updates[-1][:2], (1.0, 2))
+        self.assertGreater(listener.updates[-1][2], listener.updates[0][2])
+
+
+class TestEndgameSolver(unittest.TestCase):
+
+    @staticmethod
+    def brute_force(geometry, own, opponent):
+        """Plain negamax to the end of the game (when the player to move has no valid move)."""
+        moves = geometry.squares(geometry.get_moves(own, opponent))
+        if not moves:
+            return popcount(own) - popcount(opponent)
+        best = float('-infinity')
+        for move in moves:
+            bit = geometry.bit(move)
+            flips = geometry.get_flips(own, opponent, bit)
+            best = max(best, -TestEndgameSolver.brute_force(geometry, opponent & ~flips, own | flips | bit))
+        return best
+
+    def test_matches_brute_force(self):
+        """Evaluates that the solver finds the exact final score of random endgames."""
+        rng = random.Random(11)
+        game = Reversi(is_othello=True, backend='bitboard')
+        solver = EndgameSolver(game)
+        for empties in (3, 5, 7):
+            for _ in range(3):
+                state = game.initial
+                while game.height * game.width - len(state.board) > empties and state.moves:
+                    state = game.result(state, rng.choice(state.moves))
+                if not state.moves:
+                    continue
+                board = as_bitboard(state.board, game.height, game.width)
+                own, opponent = board.discs(state.to_move)
+                move, value = solver.solve(state)
+                self.assertIn(move, state.moves)
+                self.assertEqual(value, self.brute_force(board.geometry, own, opponent))
+                flips = board.geometry.get_flips(own, opponent, board.geometry.bit(move))
+                bit = board.geometry.bit(move)
+                self.assertEqual(value, -self.brute_force(board.geometry, opponent & ~flips, own | flips | bit))
+                self.assertGreater(solver.stats()['nodes'], 0)
+
+    def test_no_valid_move(self):
+        """Evaluates that the game ends when the side to move has no valid move, as in `terminal_test`."""
+        board = dict.fromkeys([(1, 1), (1, 2)], 'X')
+        board[1, 3] = 'O'
+        game = Reversi(is_othello=False, player_side='X', is_initial=False, board=board, moves_made=3)
+        state = game.initial._replace(to_move='O', moves=[])
+        # White cannot move (Black could, on (1, 4)): the game is over with the discs on the board
+        self.assertTrue(game.terminal_test(state))
+        self.assertEqual(EndgameSolver(game).solve(state), (None, -1))
+
+    def test_search_uses_solver(self):
+        """Evaluates that the search plays the solver's move close to the end of the game."""
+        rng = random.Random(3)
+        game = Reversi(is_othello=True, backend='bitboard')
+        state = game.initial
+        while game.height * game.width - len(state.board) > 8:
+            state = game.result(state, rng.choice(state.moves))
+        solver = EndgameSolver(game)
+        move = search.alphabeta_search(None, state, game, d=1, endgame=solver)
+        _, value = solver.solve(state)
+        result = game.result(state, move)
+        board = as_bitboard(result.board, game.height, game.width)
+        own, opponent = board.discs(result.to_move)
+        self.assertEqual(-self.brute_force(board.geometry, own, opponent), value)
+
+    def test_cancelled(self):
+        """Evaluates that a solve is cancelled by the time limit and stop event of the search."""
+        rng = random.Random(5)
+        game = Reversi(is_othello=True, backend='bitboard')
+        state = game.initial
+        while game.height * game.width - len(state.board) > 12:
+            state = game.result(state, rng.choice(state.moves))
+        solver = EndgameSolver(game)
+        with self.assertRaises(search.SearchTimeout):
+            solver.solve(state, should_stop=lambda: True)
+        stop_event = threading.Event()
+        stop_event.set()
+        self.assertIn(search.alphabeta_search(None, state, game, endgame=solver, stop_event=stop_event), state.moves)
+        self.assertIn(search.alphabeta_search(None, state, game, endgame=solver, time_limit=0), state.moves)
+        self.assertLess(solver.stats()['solve_time'], 1)
+
+    def test_timed_out_solve_falls_back_on_search(self):
+        """Evaluates that a solve cut off by the time limit leaves time for iterative deepening."""
+        rng = random.Random(5)
+        game = Reversi(is_othello=True, backend='bitboard')
+        state = game.initial
+        while game.height * game.width - len(state.board) > 24:
+            state = game.result(state, rng.choice(state.moves))
+        solver = EndgameSolver(game, empties=24)
+        stats = search.SearchStats()
+        move = search.alphabeta_search(None, state, game, d=60, time_limit=0.3, endgame=solver, stats=stats)
+        self.assertLess(solver.stats()['solve_time'], 0.3 * search.ENDGAME_SHARE + 0.1)
+        self.assertTrue(stats.iterations)
+        self.assertEqual(move, stats.iterations[-1]['best_move'])
+
+
+class TestPatternEvaluator(unittest.TestCase):
+
+    def evaluate(self, board, player='X'):
+        return PatternEvaluator(mobility_weight=0).score(board, player)
+
+    def test_antisymmetric(self):
+        """Evaluates that a position scores the opposite for the opponent."""
+        rng = random.Random(17)
+        game = Reversi(is_othello=True, backend='bitboard')
+        state = game.initial
+        evaluator = PatternEvaluator()
+        while state.moves:
+            self.assertAlmostEqual(evaluator.score(state.board, 'X'), -evaluator.score(state.board, 'O'))
+            state = game.result(state, rng.choice(state.moves))
+
+    def test_symmetric_corners(self):
+        """Evaluates that the four corners are scored the same."""
+        scores = {self.evaluate({corner: 'X'}) for corner in CornerCaptivity.corners}
+        self.assertEqual(len(scores), 1)
+        self.assertGreater(scores.pop(), 0)
+
+    def test_squares_next_to_empty_corner(self):
+        """Evaluates the penalty of the squares next to an empty corner, lifted once the corner is taken."""
+        self.assertLess(self.evaluate({(2, 2): 'X'}), 0)
+        self.assertLess(self.evaluate({(1, 2): 'X'}), 0)
+        self.assertGreater(self.evaluate({(1, 1): 'X', (1, 2): 'X', (2, 2): 'X'}), self.evaluate({(1, 1): 'X'}))
+
+    def test_eval_fn(self):
+        """Evaluates that finished games are scored by their result and searches use the evaluator."""
+        board = dict.fromkeys([(1, 1), (1, 2)], 'X')
+        game = Reversi(is_othello=False, player_side='X', is_initial=False, board=board, moves_made=4,
+                       backend='bitboard')
+        evaluate = PatternEvaluator().eval_fn(game, 'X')
+        self.assertGreater(evaluate(game.initial), 1000)
+        game = Reversi(is_othello=True, backend='packed')
+        move = search.alphabeta_search(None, game.initial, game, d=3,
+                                       eval_fn=PatternEvaluator().eval_fn(game, 'X'))
+        self.assertIn(move, game.initial.moves)
+
+
+class TestMCTS(unittest.TestCase):
+
+    def test_playout(self):
+        """Evaluates that playouts end with the winner of the final position."""
+        game = Reversi(is_othello=True, backend='packed')
+        player = MCTS(game, seed=3)
+        rng = random.Random(3)
+        for _ in range(5):
+            state = game.initial
+            while state.moves:
+                state = game.result(state, rng.choice(state.moves))
+            score = game.calc_score(state.board)
+            winner = 'X' if score['X'] > score['O'] else 'O' if score['O'] > score['X'] else None
+            self.assertEqual(player.playout(state), winner)
+        # Classic rules: the centre squares are filled first
+        classic_game = Reversi(is_othello=False, backend='packed')
+        self.assertIn(MCTS(classic_game, seed=3).playout(classic_game.initial), ('X', 'O', None))
+
+    def test_search(self):
+        """Evaluates that the search plays a valid move and reuses its tree on the next move."""
+        game = Reversi(is_othello=True, backend='packed')
+        player = MCTS(game, playouts=300, seed=1)
+        state = game.initial
+        move = player.search(state)
+        self.assertIn(move, state.moves)
+        self.assertEqual(player.root.visits, 300)
+        self.assertEqual(player.stats()['playouts'], 300)
+        state = game.result(state, move)
+        state = game.result(state, state.moves[0])
+        self.assertIn(player.search(state), state.moves)
+        self.assertGreater(player.stats()['reused_visits'], 0)
+        self.assertEqual(player.root.visits, 300 + player.stats()['reused_visits'])
+
+    def test_stopped_before_playouts(self):
+        """Evaluates that a search stopped before its first playout still plays a valid move."""
+        game = Reversi(is_othello=True, backend='packed')
+        stop_event = threading.Event()
+        stop_event.set()
+        self.assertIn(MCTS(game, seed=3).search(game.initial, stop_event=stop_event), game.initial.moves)
+        self.assertIn(MCTS(game, time_limit=0, seed=3).search(game.initial), game.initial.moves)
+
+    def test_parallel_search(self):
+        """Evaluates that the root statistics of the worker trees are summed."""
+        game = Reversi(is_othello=True, backend='packed')
+        player = MCTS(game, playouts=100, workers=2, seed=2)
+        try:
+            self.assertIn(player.search(game.initial), game.initial.moves)
+            self.assertEqual(player.stats()['playouts'], 200)
+        finally:
+            player.close()
+
+    def test_parallel_search_stopped(self):
+        """Evaluates that setting the stop event also stops the searches of the worker processes."""
+        game = Reversi(is_othello=True, backend='packed')
+        player = MCTS(game, time_limit=30, workers=2, seed=2)
+        stop_event = threading.Event()
+        timer = threading.Timer(0.5, stop_event.set)
+        try:
+            start_time = time.time()
+            timer.start()
+            self.assertIn(player.search(game.initial, stop_event=stop_event), game.initial.moves)
+            self.assertLess(time.time() - start_time, 10)
+        finally:
+            timer.cancel()
+            player.close()
+
+
+class TestSearchAlgorithms(unittest.TestCase):
+
+    @staticmethod
+    def positions(count, seed=5):
+        """Returns Othello positions reached with random moves."""
+        rng = random.Random(seed)
+        game = Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard')
+        positions = []
+        while len(positions) < count:
+            state = game.initial
+            for _ in range(rng.randrange(4, 30)):
+                state = game.result(state, rng.choice(state.moves))
+                if not state.moves:
+                    break
+            if state.moves:
+                positions.append(state)
+        return game, positions
+
+    def test_same_root_value(self):
+        """Evaluates that PVS and MTD(f) find the alpha-beta value of the root."""
+        game, positions = self.positions(4)
+        for state in positions:
+            scores = {}
+            best_a = search.alphabeta_search(None, state, game, d=3, scores=scores)
+            pvs_scores = {}
+            self.assertEqual(search.pvs_search(None, state, game, d=3, scores=pvs_scores), best_a)
+            self.assertAlmostEqual(pvs_scores[best_a], scores[best_a])
+            stats = search.SearchStats()
+            move = search.mtdf_search(None, state, game, d=3, stats=stats)
+            self.assertAlmostEqual(stats.iterations[-1]['value'], scores[best_a])
+            self.assertAlmostEqual(scores[move], scores[best_a])
+
+    def test_time_limit(self):
+        """Evaluates that every algorithm returns a legal move under a time limit."""
+        game, (state,) = self.positions(1)
+        for search_fn in search.SEARCH_ALGORITHMS.values():
+            self.assertIn(search_fn(None, state, game, d=60, time_limit=0.1, ordering=search.MoveOrderer()),
+                          state.moves)
+
+    def test_unknown_algorithm(self):
+        game = Reversi(is_othello=True)
+        self.assertRaises(ValueError, search.alphabeta_search, None, game.initial, game, d=1, algorithm='sss')
+
+
+class TestSearchStats(unittest.TestCase):
+
+    def test_fixed_depth_stats(self):
+        """Evaluates the counters recorded by a fixed-depth search."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard')
+        state = game.initial
+        stats = search.SearchStats()
+        move = search.alphabeta_search(None, state, game, d=3, stats=stats)
+        self.assertEqual(move, search.alphabeta_search(None, state, game, d=3))
+        self.assertGreater(stats.nodes, stats.leaf_evaluations)
+        self.assertGreater(stats.leaf_evaluations, 0)
+        self.assertGreater(stats.cutoffs, 0)
+        self.assertEqual(len(stats.iterations), 1)
+        self.assertEqual(stats.iterations[0]['nodes'], stats.nodes)
+        self.assertGreater(stats.method_time['make_move'], 0)
+        self.assertGreater(stats.method_time['evaluation'], 0)
+        self.assertGreater(stats.effective_branching_factor(), 1)
+        # The game is not modified to time its methods
+        self.assertEqual(set(vars(game)), set(vars(Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard'))))
+
+    def test_endgame_nodes(self):
+        """Evaluates that the nodes searched by the endgame solver are counted."""
+        rng = random.Random(3)
+        game = Reversi(is_othello=True, backend='bitboard')
+        state = game.initial
+        while game.height * game.width - len(state.board) > 8:
+            state = game.result(state, rng.choice(state.moves))
+        solver = EndgameSolver(game)
+        stats = search.SearchStats()
+        search.alphabeta_search(None, state, game, d=1, endgame=solver, stats=stats)
+        self.assertGreater(stats.endgame_nodes, 0)
+        self.assertEqual(stats.nodes, solver.nodes)
+        self.assertEqual(stats.to_dict()['endgame_nodes'], solver.nodes)
+
+    def test_iteration_callback_and_export(self):
+        """Evaluates the per-iteration callback and the JSON-lines export."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard')
+        iterations = []
+        stats = search.SearchStats(callback=iterations.append)
+        search.alphabeta_search(None, game.initial, game, d=3, time_limit=60, stats=stats)
+        self.assertEqual([iteration['depth'] for iteration in iterations], [1, 2, 3])
+        self.assertEqual(sum(iteration['nodes'] for iteration in iterations), stats.nodes)
+        stream = io.StringIO()
+        stats.write_jsonl(stream)
+        stats.write_jsonl(stream)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])['nodes'], stats.nodes)
+
+
+class TestEvaluationCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        """Evaluates that the least recently used evaluations are evicted first."""
+        cache = EvaluationCache(max_entries=2)
+        cache.store(1, 1.0)
+        cache.store(2, 2.0)
+        self.assertEqual(cache.lookup(1), 1.0)
+        cache.store(3, 3.0)
+        self.assertIsNone(cache.lookup(2))
+        self.assertEqual(cache.lookup(1), 1.0)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_cached_utility(self):
+        """Evaluates that cached utilities equal the computed ones and survive a snapshot."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, backend='packed')
+        cached_game = Reversi(is_othello=True, opponent_difficulty=3, backend='packed')
+        states = [game.result(game.initial, move) for move in game.initial.moves]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.bin')
+            cached_game.eval_cache = EvaluationCache.for_game(cached_game, path)
+            for state in states:
+                self.assertEqual(cached_game.utility(state, 'X'), game.utility(state, 'X'))
+            cached_game.eval_cache.snapshot(path)
+            cached_game.eval_cache.close()
+            cache = EvaluationCache.for_game(cached_game, path)
+            self.assertEqual(len(cache), len(states))
+            cached_game.eval_cache = cache
+            for state in states:
+                self.assertEqual(cached_game.utility(state, 'O'), game.utility(state, 'O'))
+            self.assertEqual(cache.stats()['hits'], len(states))
+            cache.close()
+            # A snapshot of other heuristic weights is refused
+            other_game = Reversi(is_othello=True, opponent_difficulty=3, weights=(1, 0, 0))
+            self.assertRaises(ValueError, EvaluationCache.for_game, other_game, path)
+
+
+class TestMoveOrderer(unittest.TestCase):
+
+    def test_static_priorities(self):
+        """Evaluates that corners are tried first and squares adjacent to corners last."""
+        orderer = search.MoveOrderer()
+        moves = [(2, 2), (3, 4), (1, 1)]
+        self.assertEqual(orderer.order(moves, 1, 'X'), [(1, 1), (3, 4), (2, 2)])
+
+    def test_killer_and_best_move(self):
+        """Evaluates that the stored best move comes first, followed by the killer moves."""
+        orderer = search.MoveOrderer()
+        moves = [(1, 1), (3, 4), (4, 3), (5, 6)]
+        orderer.record_cutoff((4, 3), 2, 'X', 3, 1)
+        self.assertEqual(orderer.order(moves, 2, 'X')[:2], [(4, 3), (1, 1)])
+        self.assertEqual(orderer.order(moves, 2, 'X', best_move=(5, 6))[:3], [(5, 6), (4, 3), (1, 1)])
+        # Killer moves are kept per ply
+        self.assertEqual(orderer.order(moves, 3, 'X')[0], (1, 1))
+        self.assertEqual(orderer.stats()['first_move_cutoffs'], 0)
+
+    def test_search_with_ordering(self):
+        """Evaluates that move ordering does not change the move chosen at a fixed depth."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard')
+        rng = random.Random(1)
+        state = game.initial
+        for _ in range(10):
+            state = game.result(state, rng.choice(state.moves))
+        orderer = search.MoveOrderer()
+        self.assertEqual(search.alphabeta_search(None, state, game, d=3),
+                         search.alphabeta_search(None, state, game, d=3, ordering=orderer))
+        self.assertGreater(orderer.cutoffs, 0)
+
+
+class TestOpeningBook(unittest.TestCase):
+
+    def test_build_and_lookup(self):
+        """Evaluates that book moves are the searched moves and unknown positions are not found."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard')
+        builder = BookBuilder(game)
+        builder.add_lines(game.initial, plies=2, branching=2, d=1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'book.bin')
+            builder.save(path)
+            with OpeningBook(path) as book:
+                self.assertEqual(len(book), len(builder.entries))
+                state = game.initial
+                self.assertEqual(book.lookup(state), search.alphabeta_search(None, state, game, d=1))
+                state = game.result(state, book.lookup(state))
+                self.assertIn(book.lookup(state), state.moves)
+                # Lines are two moves long
+                self.assertIsNone(book.lookup(game.result(state, state.moves[0])))
+
+
+class TestParallelSearch(unittest.TestCase):
+
+    def test_encode_state(self):
+        """Evaluates that a state is rebuilt from its compact encoding."""
+        for backend in ('dict', 'bitboard'):
+            game = Reversi(is_othello=True, backend=backend)
+            state = game.result(game.initial, game.initial.moves[0])
+            decoded = game.decode_state(game.encode_state(state))
+            self.assertEqual(decoded.board, state.board)
+            self.assertIs(type(decoded.board), type(state.board))
+            self.assertEqual((decoded.to_move, decoded.moves, decoded.key), (state.to_move, state.moves, state.key))
+            if backend == 'dict':
+                self.assertEqual(decoded.board.frontier, state.board.frontier)
+
+    def test_same_move_as_sequential(self):
+        """Evaluates that the root-split search chooses the same move as the sequential search."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard')
+        with ParallelSearcher(workers=2) as searcher:
+            for seed in range(3):
+                rng = random.Random(seed)
+                state = game.initial
+                for _ in range(10):
+                    state = game.result(state, rng.choice(state.moves))
+                self.assertEqual(searcher.search(state, game, d=2),
+                                 search.alphabeta_search(None, state, game, d=2))
+
+
+class TestTranspositionTable(unittest.TestCase):
+
+    def test_incremental_hash(self):
+        """Evaluates that the incrementally updated hash equals the hash of the full board."""
+        for backend in ('dict', 'bitboard'):
+            rng = random.Random(3)
+            game = Reversi(is_othello=True, backend=backend)
+            state = game.initial
+            while state.moves:
+                self.assertEqual(state.key, game.zobrist.hash_board(state.board, state.to_move))
+                state = game.result(state, rng.choice(state.moves))
+
+    def test_replacement_and_eviction(self):
+        """Evaluates that deeper entries are kept and the least recently used entry is evicted."""
+        table = TranspositionTable(max_entries=2)
+        table.store(1, 3, 10, EXACT, (1, 1))
+        table.store(1, 2, 20, LOWERBOUND, (1, 2))
+        self.assertEqual(table.lookup(1).value, 10)
+        table.store(2, 1, 5, EXACT, (2, 2))
+        table.lookup(1)
+        table.store(3, 1, 7, EXACT, (3, 3))
+        self.assertIsNone(table.lookup(2))
+        self.assertEqual(table.lookup(3).move, (3, 3))
+        self.assertEqual((table.hits, table.misses, table.evictions), (3, 1, 1))
+
+    def test_search_with_table(self):
+        """Evaluates that the table does not change the move chosen at a fixed depth."""
+        game = Reversi(is_othello=True, opponent_difficulty=3, backend='bitboard')
+        rng = random.Random(1)
+        state = game.initial
+        for _ in range(10):
+            state = game.result(state, rng.choice(state.moves))
+        table = TranspositionTable()
+        self.assertEqual(search.alphabeta_search(None, state, game, d=3),
+                         search.alphabeta_search(None, state, game, d=3, table=table))
+        self.assertGreater(table.hits, 0)
+
+
+class TestEngine(unittest.TestCase):
+
+    START = '...........................OX......XO........................... X'
+
+    def test_position_strings(self):
+        """Evaluates that position strings are parsed and formatted back."""
+        board, to_move, height, width = engine.parse_position(self.START)
+        self.assertEqual(board, dict(Reversi(is_othello=True).initial.board))
+        self.assertEqual((to_move, height, width), ('X', 8, 8))
+        self.assertEqual(engine.format_position(board, to_move), self.START)
+        board, _, height, width = engine.parse_position('.... ..XO ..OX .... o', 4, 4)
+        self.assertEqual((height, width, board[(2, 3)]), (4, 4, 'X'))
+        self.assertRaises(ValueError, engine.parse_position, self.START[:-1])
+        self.assertRaises(ValueError, engine.parse_position, '..... X')
+        self.assertRaises(ValueError, engine.parse_position, self.START.replace('X', 'B', 1))
+
+    def test_analyse(self):
+        """Evaluates the searched and exactly solved analyses of positions."""
+        analysis = engine.analyse(self.START, depth=2)
+        self.assertIn(analysis.move, [(3, 4), (4, 3), (5, 6), (6, 5)])
+        self.assertEqual((analysis.depth, analysis.exact), (2, False))
+        rng = random.Random(12)
+        game = Reversi(is_othello=True, backend='bitboard')
+        state = game.initial
+        while len(state.board) < 56:
+            state = game.result(state, rng.choice(state.moves))
+        position = engine.format_position(state.board, state.to_move)
+        analysis = engine.analyse(position)
+        self.assertTrue(analysis.exact)
+        self.assertEqual((analysis.move, analysis.score), EndgameSolver(game).solve(state))
+
+    def test_command_line(self):
+        """Evaluates the command line output and that it starts without importing the engine modules."""
+        output = io.StringIO()
+        with redirect_stdout(output):
+            engine.main(['--depth', '1', self.START, 'X' * 64 + ' O'])
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn(lines[0].split()[:2], [['3', '4'], ['4', '3'], ['5', '6'], ['6', '5']])
+        self.assertEqual(lines[1], 'game over')
+        output = io.StringIO()
+        with redirect_stdout(output):
+            engine.main(['--time', '0', self.START])
+        self.assertEqual(output.getvalue().split()[2], '?')
+        modules = subprocess.run([sys.executable, '-c', 'import engine, sys; print(sorted(set(sys.modules) & '
+                                  '{"game", "search", "kivy", "numpy"}))'],
+                                 cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+        self.assertEqual(modules.stdout.strip(), '[]')
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_corpus(self):
+        """Evaluates that the benchmark positions are the same for every backend and run."""
+        positions = benchmark.corpus()
+        self.assertEqual(set(positions), set(benchmark.PHASES))
+        packed_positions = benchmark.corpus('packed')
+        for phase, states in positions.items():
+            self.assertEqual(len(states), benchmark.POSITIONS_PER_PHASE)
+            self.assertEqual([state.key for state in states], [state.key for state in packed_positions[phase]])
+
+    def test_regressions(self):
+        """Evaluates that only the benchmarks slower than the tolerance are reported."""
+        results = benchmark.run_benchmarks('CoinParity', min_time=0.01, rounds=1)
+        self.assertEqual(list(results), ['CoinParity.get_score'])
+        self.assertGreater(results['CoinParity.get_score']['ops_per_second'], 0)
+        self.assertGreater(results['CoinParity.get_score']['relative'], 0)
+        baseline = {'a': {'relative': 1.0}, 'b': {'relative': 1.0}}
+        measured = {'a': {'relative': 0.85}, 'b': {'relative': 0.75}, 'c': {'relative': 0.01}}
+        self.assertEqual([name for name, _, _ in benchmark.compare(measured, baseline, tolerance=0.2)], ['b'])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            benchmark.save_baseline(results, path)
+            self.assertEqual(benchmark.load_baseline(path), results)
+
+
+class TestGameServer(unittest.TestCase):
+
+    def run_server(self, client):
+        """Runs `client(port, game_server)` against a server searching in a thread pool."""
+        async def run():
+            game_server = server.GameServer(executor=ThreadPoolExecutor(2), max_pending=2)
+            tcp_server = await game_server.start(port=0)
+            try:
+                return await client(tcp_server.sockets[0].getsockname()[1], game_server)
+            finally:
+                tcp_server.close()
+                game_server.close()
+        return asyncio.run(run())
+
+    def test_protocol(self):
+        """Evaluates that moves are validated and answered by the computer."""
+        async def client(port, game_server):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+
+            async def request(message):
+                writer.write(json.dumps(message).encode() + b'\n')
+                return json.loads(await reader.readline())
+
+            new = await request({'op': 'new', 'difficulty': 2})
+            invalid = await request({'op': 'move', 'game': new['game'], 'move': [1, 1]})
+            move = await request({'op': 'move', 'game': new['game'], 'move': new['state']['moves'][0]})
+            unknown = await request({'op': 'state', 'game': 99})
+            malformed = [await request(message) for message in ([], 1, {'op': 'new', 'size': 10 ** 6})]
+            stats = await request({'op': 'stats'})
+            writer.close()
+            await writer.wait_closed()
+            return new, invalid, move, unknown, malformed, stats
+
+        new, invalid, move, unknown, malformed, stats = self.run_server(client)
+        self.assertEqual(new['state']['board'][3], '...OX...')
+        self.assertEqual(new['state']['moves'], [[3, 4], [4, 3], [5, 6], [6, 5]])
+        self.assertFalse(invalid['ok'])
+        self.assertTrue(move['ok'])
+        self.assertEqual(move['state']['to_move'], 'X')
+        self.assertEqual(sum(move['state']['score'].values()), 6)
+        self.assertIn('computer_move', move)
+        self.assertFalse(unknown['ok'])
+        for response in malformed:
+            self.assertFalse(response['ok'])
+            self.assertIn('error', response)
+        self.assertEqual(stats['requests'], 7)
+        self.assertEqual(set(stats['latency_ms']), {'p50', 'p90', 'p99'})
+
+    def test_load_test(self):
+        """Evaluates that concurrent clients play their games to the end."""
+        async def client(port, game_server):
+            report = await server.load_test('127.0.0.1', port, clients=3, games=1, difficulty=1)
+            return report, game_server.stats()
+
+        report, stats = self.run_server(client)
+        self.assertEqual(report['games'], 3)
+        self.assertEqual(stats['games_finished'], 3)
+        self.assertEqual(stats['games'], 0)
+        self.assertGreater(report['moves'], 0)
+
+    def test_percentiles(self):
+        self.assertEqual(server.percentiles(range(1, 101)), {'p50': 50, 'p90': 90, 'p99': 99})
+        self.assertEqual(server.percentiles([]), {})
+
+
+class TestTournament(unittest.TestCase):
+
+    def test_parse_engine(self):
+        """Evaluates the engine specification format of the command line."""
+        self.assertEqual(tournament.parse_engine('random'), tournament.Engine('random'))
+        engine = tournament.parse_engine('tuned:depth=3,time=0.5,weights=0.5/0.3/0.2,endgame=10')
+        self.assertEqual(engine, tournament.Engine('tuned', 3, 0.5, (0.5, 0.3, 0.2), 10))
+        self.assertEqual(tournament.parse_engine('scout:depth=2,algorithm=pvs').algorithm, 'pvs')
+        self.assertEqual(tournament.parse_engine('p:depth=2,evaluation=patterns').evaluation, 'patterns')
+        self.assertRaises(ValueError, tournament.parse_engine, 'bad:speed=1')
+
+    def test_schedule_swaps_colours(self):
+        """Evaluates that every opening is played once with each engine as Black."""
+        engines = [tournament.Engine('a'), tournament.Engine('b'), tournament.Engine('c')]
+        tasks = tournament.schedule(engines, games_per_pair=4)
+        self.assertEqual(len(tasks), 12)
+        for first, second in zip(tasks[::2], tasks[1::2]):
+            self.assertEqual((first[0], first[1], first[3]), (second[1], second[0], second[3]))
+
+    def test_play_game(self):
+        """Evaluates that a game is played to the end and its search effort recorded."""
+        result = tournament.play_game(tournament.Engine('random'), tournament.Engine('search', depth=1), seed=1)
+        self.assertEqual(result.black_discs + result.white_discs, result.plies + 4)
+        self.assertEqual(len(result.moves), result.plies)
+        record = records.record_game(tournament.engine_game(tournament.Engine('random')), result.moves)
+        self.assertEqual(record.result, result.black_discs - result.white_discs)
+        self.assertEqual(result.nodes[0], 0)
+        self.assertGreater(result.nodes[1], 0)
+
+    def test_run_tournament(self):
+        """Evaluates the standings of a small tournament played in this process."""
+        engines = [tournament.Engine('random'), tournament.Engine('search', depth=1)]
+        results = tournament.run_tournament(engines, games_per_pair=2, workers=1)
+        standings = results.standings()
+        self.assertEqual(len(results.results), 2)
+        self.assertEqual(standings['random']['wins'], standings['search']['losses'])
+        self.assertEqual(standings['random']['games'], 2)
+        self.assertGreater(results.games_per_second(), 0)
+        self.assertIn('search', results.report())
+
+    def test_elo(self):
+        """Evaluates that the ratings follow the results and average to the mean rating."""
+        win = tournament.GameResult('strong', 'weak', 40, 24, 60, (0, 0), (0.0, 0.0))
+        draw = tournament.GameResult('weak', 'strong', 32, 32, 60, (0, 0), (0.0, 0.0))
+        ratings = tournament.TournamentResults(['strong', 'weak'], [win, win, draw], 1.0).elo()
+        self.assertGreater(ratings['strong'], ratings['weak'])
+        self.assertAlmostEqual(ratings['strong'] + ratings['weak'], 3000)
+
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,267 @@
+import argparse
+import itertools
+import math
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from endgame import EndgameSolver
+from game import HEURISTIC_WEIGHTS
+from game import Reversi
+from game import load_weights
+from patterns import PatternEvaluator
+from records import GameRecordWriter
+from records import record_game
+import search
+from transposition import TranspositionTable
+
+
+# An engine plays random moves if its depth is 0, otherwise it runs `alphabeta_search`
+# (iterative deepening if it has a time limit) with the given algorithm and evaluation:
+# 'heuristics' (`Reversi.compute_utility` with the given weights) or 'patterns' (`PatternEvaluator`)
+Engine = namedtuple('Engine', 'name, depth, time_limit, weights, endgame, algorithm, evaluation',
+                    defaults=(0, None, HEURISTIC_WEIGHTS, None, 'alphabeta', 'heuristics'))
+EVALUATIONS = ('heuristics', 'patterns')
+GameResult = namedtuple('GameResult', 'black, white, black_discs, white_discs, plies, nodes, think_time, moves',
+                        defaults=((),))
+
+
+def engine_game(engine):
+    return Reversi(is_othello=True, opponent_difficulty=3, backend='packed', weights=engine.weights)
+
+
+def engine_evaluator(engine, game):
+    """Returns the `PatternEvaluator` of an engine evaluating with 'patterns', else None."""
+    return PatternEvaluator(game.height, game.width) if engine.evaluation == 'patterns' else None
+
+
+def select_move(engine, game, state, rng, table, ordering, evaluator=None):
+    """Returns (move, nodes searched) for the engine to move in `state` (using `evaluator` if given)."""
+    if engine.depth == 0:
+        return rng.choice(state.moves), 0
+    stats = search.SearchStats()
+    eval_fn = evaluator.eval_fn(game, state.to_move) if evaluator is not None else None
+    endgame = EndgameSolver(game, empties=engine.endgame) if engine.endgame else None
+    move = search.alphabeta_search(None, state, game, d=engine.depth, eval_fn=eval_fn, time_limit=engine.time_limit,
+                                   table=table, ordering=ordering, make_unmake=True, endgame=endgame,
+                                   stats=stats, algorithm=engine.algorithm)
+    return move, stats.nodes
+
+
+def play_game(black, white, opening_plies=4, seed=None):
+    """Plays one game of Othello between two engines and returns its `GameResult`.
+
+    The first `opening_plies` moves are played at random (from `seed`) so that games
+    between deterministic engines differ. As in `Reversi`, the game ends as soon as
+    the player to move has no valid move.
+    """
+    rng = random.Random(seed)
+    engines = {'X': black, 'O': white}
+    games = {side: engine_game(engine) for side, engine in engines.items()}
+    tables = {side: TranspositionTable() for side in engines}
+    orderings = {side: search.MoveOrderer() for side in engines}
+    evaluators = {side: engine_evaluator(engine, games[side]) for side, engine in engines.items()}
+    nodes = {'X': 0, 'O': 0}
+    think_time = {'X': 0.0, 'O': 0.0}
+    referee = games['X']
+    state = referee.initial
+    moves = []
+    plies = 0
+    while not referee.terminal_test(state):
+        side = state.to_move
+        if plies < opening_plies:
+            move = rng.choice(state.moves)
+        else:
+            start_time = time.time()
+            move, searched = select_move(engines[side], games[side], state, rng, tables[side], orderings[side],
+                                         evaluators[side])
+            think_time[side] += time.time() - start_time
+            nodes[side] += searched
+        state = referee.result(state, move)
+        moves.append(move)
+        plies += 1
+    score = referee.calc_score(state.board)
+    return GameResult(black.name, white.name, score['X'], score['O'], plies,
+                      (nodes['X'], nodes['O']), (think_time['X'], think_time['O']), tuple(moves))
+
+
+def play_game_task(task):
+    return play_game(*task)
+
+
+def schedule(engines, games_per_pair=2, opening_plies=4, seed=2019):
+    """Returns the (black, white, opening plies, seed) tasks of a round-robin tournament.
+
+    Every opening is played twice per pair, once with each engine as Black.
+    """
+    rng = random.Random(seed)
+    tasks = []
+    for first, second in itertools.combinations(engines, 2):
+        for _ in range((games_per_pair + 1) // 2):
+            game_seed = rng.getrandbits(32)
+            tasks.append((first, second, opening_plies, game_seed))
+            tasks.append((second, first, opening_plies, game_seed))
+    return tasks
+
+
+def run_tournament(engines, games_per_pair=2, workers=None, opening_plies=4, seed=2019):
+    """Plays a round-robin tournament between the engines and returns its `TournamentResults`.
+
+    Games are played in parallel over a pool of `workers` processes (one per core by
+    default), or one after another in this process if `workers` is 1.
+    """
+    if len({engine.name for engine in engines}) != len(engines):
+        raise ValueError("Engine names must be unique")
+    tasks = schedule(engines, games_per_pair, opening_plies, seed)
+    start_time = time.time()
+    if workers == 1:
+        results = [play_game_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(play_game_task, tasks))
+    return TournamentResults([engine.name for engine in engines], results, time.time() - start_time)
+
+
+class TournamentResults:
+    """Game results of a tournament, with throughput, win rate and Elo rating reports."""
+
+    def __init__(self, names, results, elapsed):
+        self.names = names
+        self.results = results
+        self.elapsed = elapsed
+
+    def games_per_second(self):
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+    def scores(self):
+        """Returns {(engine, opponent): [wins, draws, losses]} from the engine's point of view."""
+        scores = {}
+        for result in self.results:
+            black_record = scores.setdefault((result.black, result.white), [0, 0, 0])
+            white_record = scores.setdefault((result.white, result.black), [0, 0, 0])
+            if result.black_discs > result.white_discs:
+                black_record[0] += 1
+                white_record[2] += 1
+            elif result.black_discs < result.white_discs:
+                black_record[2] += 1
+                white_record[0] += 1
+            else:
+                black_record[1] += 1
+                white_record[1] += 1
+        return scores
+
+    def standings(self):
+        """Returns {engine: {'games', 'wins', 'draws', 'losses', 'win_rate', 'nodes_per_second'}}."""
+        standings = {name: {'games': 0, 'wins': 0, 'draws': 0, 'losses': 0, 'nodes': 0, 'think_time': 0.0}
+                     for name in self.names}
+        for (name, _), (wins, draws, losses) in self.scores().items():
+            entry = standings[name]
+            entry['games'] += wins + draws + losses
+            entry['wins'] += wins
+            entry['draws'] += draws
+            entry['losses'] += losses
+        for result in self.results:
+            for name, nodes, think_time in zip((result.black, result.white), result.nodes, result.think_time):
+                standings[name]['nodes'] += nodes
+                standings[name]['think_time'] += think_time
+        for entry in standings.values():
+            entry['win_rate'] = (entry['wins'] + 0.5 * entry['draws']) / entry['games'] if entry['games'] else 0.0
+            entry['nodes_per_second'] = entry['nodes'] / entry['think_time'] if entry['think_time'] else 0.0
+        return standings
+
+    def elo(self, iterations=200, mean_rating=1500):
+        """Returns the Elo rating of each engine, fitted to all the games of the tournament.
+
+        The ratings are the maximum likelihood Bradley-Terry strengths (draws count as
+        half a win), computed with minorization-maximization. One virtual draw per pair
+        keeps the ratings of engines that won or lost every game finite.
+        """
+        games = {}
+        wins = dict.fromkeys(self.names, 0.0)
+        for (name, opponent), (won, drawn, lost) in self.scores().items():
+            games[name, opponent] = won + drawn + lost + 1
+            wins[name] += won + 0.5 * drawn + 0.5
+        strength = dict.fromkeys(self.names, 1.0)
+        for _ in range(iterations):
+            for name in self.names:
+                total = sum(n / (strength[name] + strength[opponent])
+                            for (player, opponent), n in games.items() if player == name)
+                if total:
+                    strength[name] = wins[name] / total
+            # Normalise so that the geometric mean strength is 1
+            scale = math.exp(sum(math.log(s) for s in strength.values()) / len(strength))
+            strength = {name: s / scale for name, s in strength.items()}
+        return {name: mean_rating + 400 * math.log10(s) for name, s in strength.items()}
+
+    def report(self):
+        """Returns the results as a printable table."""
+        standings = self.standings()
+        ratings = self.elo()
+        lines = ["%d games in %.1fs (%.2f games/s)" % (len(self.results), self.elapsed, self.games_per_second()),
+                 "%-16s %6s %6s %6s %6s %8s %6s %12s" % ('engine', 'games', 'wins', 'draws', 'losses',
+                                                         'win rate', 'elo', 'nodes/s')]
+        for name in sorted(self.names, key=ratings.get, reverse=True):
+            entry = standings[name]
+            lines.append("%-16s %6d %6d %6d %6d %7.1f%% %6.0f %12.0f" % (
+                name, entry['games'], entry['wins'], entry['draws'], entry['losses'],
+                100 * entry['win_rate'], ratings[name], entry['nodes_per_second']))
+        return "\n".join(lines)
+
+
+def parse_engine(spec):
+    """Parses an engine given as `name[:depth=D,time=T,weights=C/M/P|FILE.json,endgame=E,algorithm=A,evaluation=V]`.
+
+    Engines with depth 0 (the default) play random moves.
+    """
+    name, _, options = spec.partition(':')
+    settings = {}
+    for option in filter(None, options.split(',')):
+        key, _, value = option.partition('=')
+        if key == 'depth':
+            settings['depth'] = int(value)
+        elif key == 'time':
+            settings['time_limit'] = float(value)
+        elif key == 'weights':
+            if value.endswith('.json'):
+                settings['weights'] = load_weights(value)
+            else:
+                settings['weights'] = tuple(float(weight) for weight in value.split('/'))
+        elif key == 'endgame':
+            settings['endgame'] = int(value)
+        elif key == 'algorithm':
+            if value not in search.SEARCH_ALGORITHMS:
+                raise ValueError("Unknown search algorithm %r in %r" % (value, spec))
+            settings['algorithm'] = value
+        elif key == 'evaluation':
+            if value not in EVALUATIONS:
+                raise ValueError("Unknown evaluation %r in %r" % (value, spec))
+            settings['evaluation'] = value
+        else:
+            raise ValueError("Unknown engine option %r in %r" % (key, spec))
+    return Engine(name, **settings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays a headless round-robin tournament between engines.")
+    parser.add_argument('--engine', action='append', dest='engines',
+                        help="engine as name[:depth=D,time=T,weights=C/M/P|FILE.json,endgame=E,algorithm=alphabeta|pvs|mtdf,"
+                             "evaluation=heuristics|patterns] (repeat for each engine)")
+    parser.add_argument('--games', type=int, default=10, help="games per pair of engines")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--opening-plies', type=int, default=4, help="random moves played at the start of each game")
+    parser.add_argument('--seed', type=int, default=2019, help="seed of the random openings")
+    parser.add_argument('--record', default=None, help="game record file to append the games to (see records.py)")
+    args = parser.parse_args()
+    engines = [parse_engine(spec) for spec in args.engines or ['random', 'depth2:depth=2']]
+    results = run_tournament(engines, args.games, args.workers, args.opening_plies, args.seed)
+    print(results.report())
+    if args.record:
+        game = engine_game(engines[0])
+        with GameRecordWriter(args.record) as writer:
+            for result in results.results:
+                writer.write(record_game(game, result.moves))
+
+
+if __name__ == '__main__':
+    main()
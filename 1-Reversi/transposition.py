@@ -0,0 +1,108 @@
+import random
+from collections import namedtuple
+from collections import OrderedDict
+
+
+# Bound types of the values stored in the transposition table
+EXACT = 0
+LOWERBOUND = 1
+UPPERBOUND = 2
+
+TableEntry = namedtuple('TableEntry', 'depth, value, flag, move')
+
+
+class ZobristHasher:
+    """Computes Zobrist hashes of game states.
+
+    Every (square, disc colour) pair is given a random 64-bit key and the hash of a
+    board is the XOR of the keys of its discs, XOR-ed with an extra key when White
+    is to move. Since XOR is its own inverse, the hash of a successor state is
+    computed from its parent by toggling only the keys of the squares that changed.
+    """
+
+    def __init__(self, height=8, width=8, seed=2019):
+        rng = random.Random(seed)
+        self.keys = {}
+        for x in range(1, height + 1):
+            for y in range(1, width + 1):
+                self.keys[(x, y)] = {'X': rng.getrandbits(64), 'O': rng.getrandbits(64)}
+        self.white_to_move = rng.getrandbits(64)
+
+    def hash_board(self, board, to_move):
+        """Returns the full hash of a board and the player to move."""
+        key = self.white_to_move if to_move == 'O' else 0
+        for move, disc in board.items():
+            key ^= self.keys[move][disc]
+        return key
+
+    def update(self, key, move, flips, player):
+        """Returns the hash after `player` places a disc on `move` and flips the discs in `flips`."""
+        keys = self.keys
+        key ^= keys[move][player] ^ self.white_to_move
+        for flipped in flips:
+            square_keys = keys[flipped]
+            key ^= square_keys['X'] ^ square_keys['O']
+        return key
+
+
+class TranspositionTable:
+    """Stores search results of previously visited positions, keyed by their Zobrist hash.
+
+    Each entry records the remaining search depth, the value and its bound type
+    (`EXACT`, `LOWERBOUND` or `UPPERBOUND`) and the best move found. The table holds
+    at most `max_entries` entries:
+    *  Replacement: a result for an already stored position only replaces it if it
+       was searched at least as deep;
+    *  Eviction: when the table is full, the least recently used entry is removed.
+
+    Values are stored from the point of view of the searching player, so a table should
+    only be reused by searches made for the same side (e.g. by `Board.make_move_ai`).
+    """
+
+    def __init__(self, max_entries=2**18):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, key):
+        """Returns the entry stored for `key`, or None if the position has not been searched."""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key, depth, value, flag, move):
+        """Stores a search result, keeping any deeper result already held for the position."""
+        existing = self.entries.get(key)
+        if existing is not None:
+            self.entries.move_to_end(key)
+            if existing.depth > depth:
+                return
+        self.entries[key] = TableEntry(depth, value, flag, move)
+        self.stores += 1
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Removes all entries and resets the counters."""
+        self.entries.clear()
+        self.hits = self.misses = self.stores = self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'stores': self.stores,
+                'evictions': self.evictions}
@@ -0,0 +1,212 @@
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_heuristics import bitboards_to_array
+from batch_heuristics import valid_moves
+from bitboard import BitBoard
+from bitboard import popcount
+from game import WEIGHTS_FILE
+from game import Reversi
+from heuristics import ADJACENT_PENALTY
+from heuristics import CornerCaptivity
+from records import read_records
+from records import replay_bitboards
+
+
+FEATURES = ('corners', 'adjacent', 'mobility', 'parity')
+PHASE_DISCS = (20, 36, 52, 64)      # Last number of discs on the board of each game phase
+CHUNK_SIZE = 100000                 # Positions per batch of feature extraction
+
+
+def self_play(seed, games):
+    """Plays random Othello games on bitboards and returns the positions after every move.
+
+    Returns the (black, white, mover, result) arrays: the position bitmasks, +1/-1 for the
+    player who has just moved (Black/White), and the final disc differential for Black.
+    As in `Reversi`, a game ends as soon as the player to move has no valid move.
+    """
+    rng = random.Random(seed)
+    initial = BitBoard.from_dict(Reversi.put_initial_discs())
+    geometry = initial.geometry
+    black, white, movers, results = [], [], [], []
+    for _ in range(games):
+        own, opponent = initial.black, initial.white
+        mover = 1
+        start = len(black)
+        while True:
+            moves = geometry.get_moves(own, opponent)
+            if not moves:
+                break
+            bits = []
+            while moves:
+                bit = moves & -moves
+                bits.append(bit)
+                moves ^= bit
+            bit = rng.choice(bits)
+            flips = geometry.get_flips(own, opponent, bit)
+            own, opponent = own | bit | flips, opponent & ~flips
+            black.append(own if mover == 1 else opponent)
+            white.append(opponent if mover == 1 else own)
+            movers.append(mover)
+            own, opponent = opponent, own
+            mover = -mover
+        final = popcount(black[-1]) - popcount(white[-1]) if len(black) > start else 0
+        results.extend([final] * (len(black) - start))
+    return (np.array(black, dtype=np.uint64), np.array(white, dtype=np.uint64),
+            np.array(movers, dtype=np.int8), np.array(results, dtype=np.int8))
+
+
+def generate_positions(games, workers=None, seed=2019, games_per_task=500):
+    """Plays `games` random games over a pool of worker processes and concatenates their positions."""
+    rng = random.Random(seed)
+    tasks = [(rng.getrandbits(32), min(games_per_task, games - start))
+             for start in range(0, games, games_per_task)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parts = list(executor.map(self_play, *zip(*tasks)))
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+
+def record_positions(path, chunk_size=CHUNK_SIZE):
+    """Yields the positions of the 8 x 8 Othello games of a record file (see `records.py`) in chunks.
+
+    The chunks are (black, white, mover, result) arrays as returned by `self_play`, so
+    files of any size are replayed without being loaded at once.
+    """
+    black, white, movers, results = [], [], [], []
+    for record in read_records(path):
+        if not record.is_othello or (record.height, record.width) != (8, 8):
+            continue
+        for black_discs, white_discs, mover in replay_bitboards(record):
+            black.append(black_discs)
+            white.append(white_discs)
+            movers.append(1 if mover == 'X' else -1)
+            results.append(record.result)
+        if len(black) >= chunk_size:
+            yield (np.array(black, dtype=np.uint64), np.array(white, dtype=np.uint64),
+                   np.array(movers, dtype=np.int8), np.array(results, dtype=np.int8))
+            black, white, movers, results = [], [], [], []
+    if black:
+        yield (np.array(black, dtype=np.uint64), np.array(white, dtype=np.uint64),
+               np.array(movers, dtype=np.int8), np.array(results, dtype=np.int8))
+
+
+def extract_features(black, white, movers, height=8, width=8):
+    """Returns the N x 4 `FEATURES` of positions, from the point of view of the player who has just moved.
+
+    *  corners:  corner discs (own - opponent);
+    *  adjacent: discs next to an empty corner (own - opponent), see `CornerCaptivity`;
+    *  mobility: `Mobility.get_score`;
+    *  parity:   `CoinParity.get_score`.
+    """
+    features = np.empty((len(black), len(FEATURES)))
+    corner_squares = CornerCaptivity(height, width).corners
+    for start in range(0, len(black), CHUNK_SIZE):
+        end = start + CHUNK_SIZE
+        positions = bitboards_to_array(black[start:end], white[start:end], height, width)
+        sign = movers[start:end].astype(np.float64)
+        discs = positions.astype(np.float64)
+        corners = np.zeros(len(positions))
+        adjacent = np.zeros(len(positions))
+        for (cx, cy), adjacent_locs in corner_squares.items():
+            in_corner = discs[:, cx - 1, cy - 1]
+            corners += in_corner
+            adjacent += np.where(in_corner == 0, sum(discs[:, x - 1, y - 1] for (x, y) in adjacent_locs), 0)
+        black_moves = valid_moves(positions, 'X').reshape(len(positions), -1).sum(axis=1)
+        white_moves = valid_moves(positions, 'O').reshape(len(positions), -1).sum(axis=1)
+        total_moves = black_moves + white_moves
+        mobility = np.divide(100.0 * (black_moves - white_moves), total_moves,
+                             out=np.zeros(len(positions)), where=total_moves != 0)
+        count = np.count_nonzero(positions.reshape(len(positions), -1), axis=1)
+        parity = 100.0 * discs.reshape(len(positions), -1).sum(axis=1) / count
+        features[start:end] = np.stack([corners, adjacent, mobility, parity], axis=1) * sign[:, None]
+    return features
+
+
+def fit_least_squares(features, labels):
+    return np.linalg.lstsq(features, labels, rcond=None)[0]
+
+
+def fit_logistic(features, labels, iterations=25, regularization=1e-3):
+    """Fits the win probability with logistic regression (Newton's method, draws count as half a win).
+
+    The coefficients are then rescaled so that they predict the disc differential, the
+    unit of the other utilities of `compute_utility`.
+    """
+    scale = features.std(axis=0)
+    scale[scale == 0] = 1.0
+    x = features / scale
+    targets = (labels > 0) + 0.5 * (labels == 0)
+    coefficients = np.zeros(x.shape[1])
+    for _ in range(iterations):
+        p = 1 / (1 + np.exp(-(x @ coefficients)))
+        gradient = x.T @ (p - targets) + regularization * coefficients
+        hessian = (x * (p * (1 - p))[:, None]).T @ x + regularization * np.eye(x.shape[1])
+        coefficients -= np.linalg.solve(hessian, gradient)
+    logits = x @ coefficients
+    calibration = (logits @ labels) / (logits @ logits) if logits.any() else 0.0
+    return calibration * coefficients / scale
+
+
+def fit_weights(features, labels, discs, phase_discs=PHASE_DISCS, method='lstsq'):
+    """Fits the `compute_utility` weights of each game phase and returns them as weight file phases."""
+    fit = fit_least_squares if method == 'lstsq' else fit_logistic
+    phases = []
+    low = 0
+    for max_discs in phase_discs:
+        in_phase = (discs > low) & (discs <= max_discs)
+        low = max_discs
+        if not in_phase.any():
+            continue
+        corners, adjacent, mobility, parity = fit(features[in_phase], labels[in_phase])
+        # `CornerCaptivity` scores a corner 25 and an adjacent disc -0.25 * adjacent penalty
+        corner_weight = corners / 25
+        adjacent_penalty = -100 * adjacent / corners if corners > 0 else ADJACENT_PENALTY
+        phases.append({'max_discs': max_discs,
+                       'weights': [float(corner_weight), float(mobility), float(parity)],
+                       'adjacent_penalty': float(adjacent_penalty),
+                       'positions': int(in_phase.sum())})
+    return phases
+
+
+def write_weights(path, phases, **info):
+    with open(path, 'w') as weights_file:
+        json.dump({'features': ['corner_captivity', 'mobility', 'coin_parity'], **info, 'phases': phases},
+                  weights_file, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tunes the heuristic weights of compute_utility from self-play.")
+    parser.add_argument('--games', type=int, default=20000, help="random self-play games to generate")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--method', choices=('lstsq', 'logistic'), default='lstsq', help="regression method")
+    parser.add_argument('--seed', type=int, default=2019, help="seed of the self-play games")
+    parser.add_argument('--output', default=WEIGHTS_FILE, help="weight file to write")
+    parser.add_argument('--records', default=None, help="fit the games of a game record file instead of self-play")
+    args = parser.parse_args()
+    start_time = time.time()
+    if args.records:
+        chunks = record_positions(args.records)
+    else:
+        chunks = [generate_positions(args.games, args.workers, args.seed)]
+        print("Generated %d positions in %.1fs" % (len(chunks[0][0]), time.time() - start_time))
+    features, labels, discs = [], [], []
+    for black, white, movers, results in chunks:
+        features.append(extract_features(black, white, movers))
+        labels.append(results.astype(np.float64) * movers)
+        discs.append(np.bitwise_count(black | white))
+    features, labels, discs = np.concatenate(features), np.concatenate(labels), np.concatenate(discs)
+    phases = fit_weights(features, labels, discs, method=args.method)
+    print("Extracted features and fitted weights of %d positions in %.1fs" % (len(labels), time.time() - start_time))
+    source = {'records': args.records} if args.records else {'games': args.games}
+    write_weights(args.output, phases, method=args.method, positions=len(labels), **source)
+    for phase in phases:
+        print("discs <= %(max_discs)2d: weights %(weights)s, adjacent penalty %(adjacent_penalty).2f" % phase)
+
+
+if __name__ == '__main__':
+    main()